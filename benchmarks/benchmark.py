@@ -0,0 +1,244 @@
+"""
+Vehicle Dynamic Model - Benchmark Suite
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Measures the tick throughput of VehicleDynamics, the cost of each module, the recorder overhead,
+the StaticParameters load and package import times and the peak memory of a long run, on the
+Braking example and on synthetic manoeuvres. The results are written as JSON so runs of
+different versions can be compared:
+
+    python benchmark.py --output results.json
+    python benchmark.py --compare old.json results.json
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from vehicle_dynamics.VehicleDynamics import VehicleDynamics
+from vehicle_dynamics.structures.Manoeuvre import Manoeuvre
+from vehicle_dynamics.structures.StateVector import StateVector
+from vehicle_dynamics.structures.OutputRecorder import OutputRecorder
+from vehicle_dynamics.utils.StaticParameters import StaticParameters
+from vehicle_dynamics.utils.columnar_data import open_data
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAR_PARAMETERS_PATH = os.path.join(ROOT, "bmw_m8.yaml")
+BRAKING_PATH = os.path.join(ROOT, "example_data", "Braking.pickle")
+SYNTHETIC = ("acceleration", "slalom", "stop_and_go")
+
+
+def synthetic_manoeuvre(kind, duration=10., frequency=1000):
+    """
+        Manoeuvre from standstill
+            acceleration: throttle ramped to 1 in 1 s and held
+            slalom: throttle 0.4, steering 0.02 rad sine at 0.5 Hz
+            stop_and_go: throttle 0.6 and brake 0.5 alternating every 5 s
+    """
+    time_stamps = np.arange(1, int(round(duration * frequency)) + 1) / frequency
+    zeros = np.zeros(len(time_stamps))
+    if kind == "acceleration":
+        return Manoeuvre(zeros, np.minimum(time_stamps, 1.), zeros, time_stamps)
+    if kind == "slalom":
+        return Manoeuvre(0.02 * np.sin(np.pi * time_stamps), np.full(len(time_stamps), 0.4), zeros, time_stamps)
+    if kind == "stop_and_go":
+        going = (time_stamps // 5) % 2 == 0
+        return Manoeuvre(zeros, np.where(going, 0.6, 0.), np.where(going, 0., 0.5), time_stamps)
+    raise ValueError(f"unknown synthetic manoeuvre {kind}, expected one of {SYNTHETIC}")
+
+
+def load_braking(path=BRAKING_PATH):
+    """ Braking example as (manoeuvre, initial_state) """
+    data = open_data(path)
+    manoeuvre = Manoeuvre(data["steering"], data["throttle"], data["brake"], data["time"])
+    initial_state = StateVector(x=data["Rel_pos_x"][0], y=data["Rel_pos_y"][0], vx=data["Velocity_X"][0], yaw=data["Yaw"][0])
+    return manoeuvre, initial_state
+
+
+def _vehicle_dynamics(initial_state=None, frequency=1000):
+    vehicle_dynamics = VehicleDynamics(initial_state=StateVector() if initial_state is None else initial_state, initial_gear=1,
+                                       frequency=frequency, car_parameters_path=CAR_PARAMETERS_PATH)
+    vehicle_dynamics.logger.setLevel("WARNING")
+    return vehicle_dynamics
+
+
+def _inputs(manoeuvre):
+    return list(zip(np.asarray(manoeuvre.throttle, dtype=float).tolist(), np.asarray(manoeuvre.brake, dtype=float).tolist(),
+                    np.asarray(manoeuvre.steering, dtype=float).tolist()))
+
+
+def bench_tick(manoeuvre, initial_state=None, repeat=3):
+    """ ticks per second of VehicleDynamics.tick over the manoeuvre, best of repeat runs """
+    inputs = _inputs(manoeuvre)
+    elapsed = []
+    for _ in range(repeat):
+        vehicle_dynamics = _vehicle_dynamics(initial_state)
+        tick = vehicle_dynamics.tick
+        start = time.perf_counter()
+        for throttle, brake, steering in inputs:
+            tick(throttle, brake, steering)
+        elapsed.append(time.perf_counter() - start)
+    return {"ticks": len(inputs), "seconds": min(elapsed), "ticks_per_second": len(inputs) / min(elapsed)}
+
+
+def bench_modules(manoeuvre, initial_state=None):
+    """ mean cost per call of Powertrain.powertrain, Wheels.wheels and Body.body, timed inside a full run """
+    vehicle_dynamics = _vehicle_dynamics(initial_state)
+    totals = {}
+
+    def timed(name, function):
+        totals[name] = 0.
+
+        def wrapper(*args):
+            start = time.perf_counter()
+            result = function(*args)
+            totals[name] += time.perf_counter() - start
+            return result
+        return wrapper
+
+    vehicle_dynamics.powertrain.powertrain = timed("powertrain", vehicle_dynamics.powertrain.powertrain)
+    vehicle_dynamics.wheels.wheels = timed("wheels", vehicle_dynamics.wheels.wheels)
+    vehicle_dynamics.body.body = timed("body", vehicle_dynamics.body.body)
+    inputs = _inputs(manoeuvre)
+    start = time.perf_counter()
+    for throttle, brake, steering in inputs:
+        vehicle_dynamics.tick(throttle, brake, steering)
+    elapsed = time.perf_counter() - start
+    results = {name: {"seconds": total, "microseconds_per_call": 1e6 * total / len(inputs), "share": total / elapsed}
+               for name, total in totals.items()}
+    results["tick_overhead"] = {"seconds": elapsed - sum(totals.values()), "share": 1. - sum(totals.values()) / elapsed}
+    return results
+
+
+def bench_recorder(calls=20000, repeat=3):
+    """ cost per call of OutputRecorder.set_states, recording the initial CurrentStates """
+    current_states = _vehicle_dynamics().current_states
+    best = np.inf
+    for _ in range(repeat):
+        recorder = OutputRecorder(calls)
+        set_states = recorder.set_states
+        start = time.perf_counter()
+        for _ in range(calls):
+            set_states(current_states)
+        best = min(best, time.perf_counter() - start)
+    return {"calls": calls, "microseconds_per_call": 1e6 * best / calls}
+
+
+def bench_static_parameters(repeat=20):
+    """ time to load the YAML into StaticParameters, to get the compiled one from the cache and to derive it with a new mass """
+    elapsed = {"load": [], "compiled": [], "derive": []}
+    compiled = StaticParameters.compile(CAR_PARAMETERS_PATH, 1000)
+    for _ in range(repeat):
+        for name, function in (("load", lambda: StaticParameters(CAR_PARAMETERS_PATH, 1000)),
+                               ("compiled", lambda: StaticParameters.compile(CAR_PARAMETERS_PATH, 1000)),
+                               ("derive", lambda: compiled.derive({"body.mass": 1.1 * compiled.body.mass}))):
+            start = time.perf_counter()
+            function()
+            elapsed[name].append(time.perf_counter() - start)
+    return {name: {"milliseconds_min": 1e3 * min(times), "milliseconds_median": 1e3 * float(np.median(times))}
+            for name, times in elapsed.items()}
+
+
+def bench_import(repeat=5):
+    """ best import time of the core modules in a fresh interpreter, on top of numpy (import_budget.py) """
+    from import_budget import CORE_MODULES, measure_import
+    results = {}
+    for module in CORE_MODULES:
+        milliseconds, forbidden = measure_import(module, repeat)
+        results[module] = {"milliseconds_min": milliseconds, "heavy_dependencies": len(forbidden)}
+    return results
+
+
+def bench_memory(duration=60., frequency=1000, kind="slalom"):
+    """ peak traced memory of simulating a synthetic manoeuvre of duration seconds with the default recorder """
+    manoeuvre = synthetic_manoeuvre(kind, duration, frequency)
+    vehicle_dynamics = _vehicle_dynamics(frequency=frequency)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    output_states, ticks, error = vehicle_dynamics.simulate(manoeuvre)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"duration": duration, "frequency": frequency, "ticks": ticks, "error": None if error is None else str(error),
+            "peak_megabytes": (peak - baseline) / 2 ** 20, "recorder_megabytes": output_states.rows.nbytes / 2 ** 20}
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=ROOT).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    try:
+        from importlib.metadata import version
+        package_version = version("vehicle_dynamics")
+    except Exception:
+        package_version = None
+    return {"version": package_version, "commit": commit, "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(), "processor": platform.processor()}
+
+
+def run(duration=10., memory_duration=60., repeat=3):
+    """ every benchmark, as a JSON serialisable dict """
+    braking, braking_state = load_braking()
+    manoeuvres = {"braking": (braking, braking_state)}
+    manoeuvres.update({kind: (synthetic_manoeuvre(kind, duration), None) for kind in SYNTHETIC})
+    results = {"tick": {name: bench_tick(manoeuvre, state, repeat) for name, (manoeuvre, state) in manoeuvres.items()},
+               "modules": {name: bench_modules(manoeuvre, state) for name, (manoeuvre, state) in manoeuvres.items()},
+               "recorder": bench_recorder(repeat=repeat),
+               "static_parameters": bench_static_parameters(),
+               "import": bench_import(),
+               "memory": bench_memory(memory_duration)}
+    return {"metadata": metadata(), "results": results}
+
+
+def _flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(old, new):
+    """ lines with every numeric result of two benchmark JSON files and their ratio new / old """
+    old_results, new_results = _flatten(old["results"]), _flatten(new["results"])
+    lines = [f"{old['metadata'].get('commit')} -> {new['metadata'].get('commit')}"]
+    for key, value in new_results.items():
+        if key in old_results and old_results[key]:
+            lines.append(f"{key:55s} {old_results[key]:14.6g} {value:14.6g} {value / old_results[key]:8.3f}x")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="vehicle_dynamics benchmarks")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file for the results")
+    parser.add_argument("--duration", type=float, default=10., help="seconds of the synthetic manoeuvres")
+    parser.add_argument("--memory-duration", type=float, default=60., help="seconds of the manoeuvre of the memory benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files instead of running")
+    arguments = parser.parse_args()
+
+    if arguments.compare:
+        with open(arguments.compare[0]) as old, open(arguments.compare[1]) as new:
+            print("\n".join(compare(json.load(old), json.load(new))))
+        return
+    results = run(arguments.duration, arguments.memory_duration, arguments.repeat)
+    with open(arguments.output, "w") as file:
+        json.dump(results, file, indent=2)
+    for name, result in results["results"]["tick"].items():
+        print(f"{name:15s} {result['ticks_per_second']:10.0f} ticks/s")
+    print(f"results written to {arguments.output}")
+
+
+if __name__ == '__main__':
+    main()
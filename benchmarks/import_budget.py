@@ -0,0 +1,64 @@
+"""
+Vehicle Dynamic Model - Import Budget
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Checks that the simulation core imports within a time budget and without the heavy optional
+dependencies (plotting, tables, progress bars, optimization), each module in a fresh interpreter.
+numpy is imported before the clock starts, as every user of the package pays for it anyway.
+Exits with status 1 when a module is over budget or loads a forbidden dependency:
+
+    python import_budget.py --budget 150
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORE_MODULES = ("vehicle_dynamics", "vehicle_dynamics.VehicleDynamics", "vehicle_dynamics.BatchVehicleDynamics",
+                "vehicle_dynamics.modules.powertrain", "vehicle_dynamics.modules.wheels", "vehicle_dynamics.modules.body")
+FORBIDDEN = ("matplotlib", "pandas", "scipy", "tqdm")
+BUDGET_MS = 150.
+
+
+def measure_import(module, repeat=5):
+    """ (best import time in ms over repeat fresh interpreters, forbidden modules it loaded) """
+    code = ("import json, sys, time; import numpy; start = time.perf_counter(); "
+            f"import {module}; elapsed = time.perf_counter() - start; "
+            f"print(json.dumps([elapsed, [name for name in {FORBIDDEN!r} if name in sys.modules]]))")
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (ROOT, os.environ.get("PYTHONPATH")))))
+    best, forbidden = float("inf"), []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ROOT, env=environment).stdout
+        elapsed, forbidden = json.loads(output)
+        best = min(best, 1e3 * elapsed)
+    return best, forbidden
+
+
+def check(budget=BUDGET_MS, repeat=5, modules=CORE_MODULES):
+    """ {module: (milliseconds, forbidden modules, passed)} """
+    results = {}
+    for module in modules:
+        milliseconds, forbidden = measure_import(module, repeat)
+        results[module] = (milliseconds, forbidden, milliseconds <= budget and not forbidden)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="import time budget of the simulation core")
+    parser.add_argument("--budget", type=float, default=BUDGET_MS, help="milliseconds per module on top of numpy")
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args()
+
+    results = check(arguments.budget, arguments.repeat)
+    for module, (milliseconds, forbidden, passed) in results.items():
+        print(f"{'ok  ' if passed else 'FAIL'} {module:40s} {milliseconds:7.1f} ms" + (f"  loads {', '.join(forbidden)}" if forbidden else ""))
+    sys.exit(0 if all(passed for _, _, passed in results.values()) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Vehicle Dynamic Model Batch Class
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+
+from vehicle_dynamics.structures.CurrentStates import CurrentStates, VALIDATION_MODES
+from vehicle_dynamics.structures.StaticParameters import StaticParameters
+from vehicle_dynamics.structures.BatchCurrentStates import BatchCurrentStates
+from vehicle_dynamics.structures.BatchStaticParameters import BatchStaticParameters
+
+from vehicle_dynamics.modules.LocalLogger import LocalLogger
+
+from vehicle_dynamics.modules.batch_powertrain import BatchPowertrain
+from vehicle_dynamics.modules.batch_wheels import BatchWheels
+from vehicle_dynamics.modules.batch_body import BatchBody
+
+import numpy as np
+
+
+class BatchVehicleDynamics(object):
+    """ Lockstep version of VehicleDynamics: advances N vehicles per tick.
+
+    Every member has its own StaticParameters, initial StateVector and gear; the
+    states are kept as struct-of-arrays in a BatchCurrentStates and the three
+    modules run as vectorized kernels over all the running members at once.
+
+    Members stop advancing when they are masked out in tick(), when their manoeuvre
+    ended in run(), or when they failed: their engine_w left the torque table or a
+    channel became NaN/inf (the cases where VehicleDynamics raises a ValueError).
+    The failure tick of every member is kept in failure_tick (-1 while healthy).
+
+    The NaN/inf check is already one vectorized check at the end of the tick, so "strict"
+    and "end_of_tick" validation behave the same; "off" skips it.
+    """
+
+    def __init__(self, initial_states, initial_gears=1, frequency=1000, car_parameters_path="", validation="end_of_tick"):
+        self.logger = LocalLogger("BatchLogger").logger
+        self.logger.setLevel("INFO")
+
+        members = len(initial_states)
+        if isinstance(car_parameters_path, str) or not isinstance(car_parameters_path, (list, tuple)):
+            car_parameters_path = [car_parameters_path] * members
+        if validation not in VALIDATION_MODES:
+            raise ValueError(f"validation must be one of {VALIDATION_MODES}, got {validation}")
+        self.validation = validation
+        if np.ndim(initial_gears) == 0:
+            initial_gears = [initial_gears] * members
+        if not len(car_parameters_path) == len(initial_gears) == members:
+            raise ValueError(f"expected {members} parameter sets and gears, got {len(car_parameters_path)} and {len(initial_gears)}")
+
+        # members sharing a YAML share the same compiled StaticParameters instance
+        static_parameters = []
+        for parameters in car_parameters_path:
+            if isinstance(parameters, str):
+                parameters = StaticParameters.compile(parameters, frequency)
+            static_parameters.append(parameters)
+        self.static_parameters = static_parameters
+        self.parameters = BatchStaticParameters(static_parameters)
+        self.logger.info(f"Imported YAML car parameters for {members} members")
+
+        self.current_states = BatchCurrentStates.from_current_states(
+            [CurrentStates(sp, frequency, initial_state, gear, self.logger)
+             for sp, initial_state, gear in zip(static_parameters, initial_states, initial_gears)])
+
+        self.powertrain = BatchPowertrain()
+        self.wheels = BatchWheels()
+        self.body = BatchBody()
+        self.CUT_VALUE = 0.2
+
+        self.iteration = 0
+        self.failure_tick = np.full(members, -1)
+        self._subset_index = None
+        self._subset_parameters = None
+
+    def __len__(self):
+        return len(self.current_states)
+
+    @property
+    def failed(self):
+        return self.failure_tick >= 0
+
+    def _parameters_for(self, index):
+        if self._subset_index is None or not np.array_equal(self._subset_index, index):
+            self._subset_index = index
+            self._subset_parameters = self.parameters.take(index)
+        return self._subset_parameters
+
+    def tick(self, throttle, brake, steering_angle, active=None):
+        """ advances every running member by one time_step
+
+        Required Arguments:
+            1. throttle, brake, steering_angle: (N,) arrays
+            2. active: optional (N,) mask, members set to False keep their state
+
+        Returns: current_states (BatchCurrentStates)
+        """
+        running = ~self.failed
+        if active is not None:
+            running &= active
+        index = np.flatnonzero(running)
+        if index.size == 0:
+            self.iteration += 1
+            return self.current_states
+
+        throttle = np.asarray(throttle, dtype=float)[index]
+        brake = np.asarray(brake, dtype=float)[index]
+        steering_angle = np.asarray(steering_angle, dtype=float)[index]
+
+        full = index.size == len(self)
+        states = self.current_states if full else self.current_states.take(index)
+        parameters = self.parameters if full else self._parameters_for(index)
+
+        with np.errstate(all="ignore"):
+            throttle = np.where(self.CUT_VALUE > np.any(states.slip_x, axis=1), throttle / 2, throttle)
+            states, failed = self.powertrain.powertrain(states, parameters, throttle, brake)
+            states = self.wheels.wheels(states, parameters, steering_angle)
+            states = self.body.body(states, parameters)
+            if self.validation != "off":
+                failed |= ~states.finite()
+
+        if not full:
+            self.current_states.put(index, states)
+        if failed.any():
+            self.failure_tick[index[failed]] = self.iteration
+            self.logger.warning(f"members {index[failed].tolist()} failed at tick {self.iteration}")
+
+        self.iteration += 1
+        return self.current_states
+
+    def run(self, manoeuvres, channels=("x", "y", "yaw", "vx", "vy", "wz", "engine_w", "gear")):
+        """ simulates one manoeuvre per member, each for its own length
+
+        Required Arguments:
+            1. manoeuvres: list of N Manoeuvre
+            2. channels: BatchCurrentStates channels to record
+
+        Returns: dict channel -> array of shape (T, N, ...) with T the longest manoeuvre.
+            Ticks after the end of a manoeuvre (or after a failure) repeat the last
+            recorded value of the member, as OutputStates.padding does.
+        """
+        if len(manoeuvres) != len(self):
+            raise ValueError(f"expected {len(self)} manoeuvres, got {len(manoeuvres)}")
+        lengths = np.array([len(manoeuvre) for manoeuvre in manoeuvres])
+        points = lengths.max()
+
+        def pad(values, length):
+            values = np.asarray(values, dtype=float)[:length]
+            return np.concatenate([values, np.zeros(points - length)])
+
+        throttle = np.stack([pad(manoeuvre.throttle, length) for manoeuvre, length in zip(manoeuvres, lengths)], axis=1)
+        brake = np.stack([pad(manoeuvre.brake, length) for manoeuvre, length in zip(manoeuvres, lengths)], axis=1)
+        steering = np.stack([pad(manoeuvre.steering, length) for manoeuvre, length in zip(manoeuvres, lengths)], axis=1)
+
+        start = self.iteration
+        recording = {name: np.zeros((points,) + getattr(self.current_states, name).shape, dtype=getattr(self.current_states, name).dtype) for name in channels}
+        for i in range(points):
+            states = self.tick(throttle[i], brake[i], steering[i], active=i < lengths)
+            for name, values in recording.items():
+                values[i] = getattr(states, name)
+
+        # hold the last good value after a failure
+        for member in np.flatnonzero(self.failed):
+            last = self.failure_tick[member] - start - 1
+            for values in recording.values():
+                values[last + 1:, member] = values[last, member] if last >= 0 else values[0, member]
+        return recording
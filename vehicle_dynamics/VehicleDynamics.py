@@ -13,6 +13,7 @@ from vehicle_dynamics.structures.Displacement import Displacement
 from vehicle_dynamics.structures.WheelHubForce import WheelHubForce
 from vehicle_dynamics.structures.AngularWheelPosition import AngularWheelPosition
 from vehicle_dynamics.structures.OutputStates import OutputStates
+from vehicle_dynamics.structures.OutputRecorder import OutputRecorder
 from vehicle_dynamics.structures.CurrentStates import CurrentStates
 from vehicle_dynamics.structures.StaticParameters import StaticParameters
 
@@ -21,39 +22,231 @@ from vehicle_dynamics.modules.LocalLogger import LocalLogger
 from vehicle_dynamics.modules.powertrain import Powertrain
 from vehicle_dynamics.modules.wheels import Wheels
 from vehicle_dynamics.modules.body import Body
+from vehicle_dynamics.modules.vehicle_model import VehicleModel
+from vehicle_dynamics.modules.integrators import get_integrator
+from vehicle_dynamics.modules.multirate import MultiRate
+from vehicle_dynamics.utils.Profiler import Profiler
 
 
-from scipy.interpolate import interp1d
 from numpy.linalg import inv
+from collections import namedtuple
 import numpy as np
-import yaml
 import math
+import struct
+
+SimulationResult = namedtuple('SimulationResult', 'output_states ticks error')
+
+# checkpoint blob: header (magic, version, time_step, state buffer size), state buffer, then
+# iteration, CUT_VALUE and the Powertrain.COUNTERS, all float64
+CHECKPOINT_MAGIC = b"VDCP"
+CHECKPOINT_VERSION = 1
+CHECKPOINT_HEADER = struct.Struct("<4sHdQ")
 
 
 class VehicleDynamics(object):
     """ This Class does the grunt of calculating VehicleDynamics!!
     Calculate longitudinal and lateral dynamics with desired values 
     of brake, steer and thorttle positons.
+
+    validation is the NaN/inf check mode of the CurrentStates: "strict" (every setter),
+    "end_of_tick" (one check of the packed state after body()) or "off".
+
+    integrator selects how Wheels and Body are advanced: "euler" runs the modules as they are
+    (explicit Euler at time_step), "explicit_euler", "semi_implicit_euler", "heun" and "rk4"
+    integrate their continuous form (VehicleModel) with modules/integrators.py, holding the
+    powertrain torque and steering during the step. See the Integrators section of the README
+    for the accuracy of each one against the step size.
+
+    substeps runs the powertrain and the wheel spin and tire loop several times per chassis step,
+    e.g. frequency=200, substeps={"wheels": 5} steps the wheels at 1000 Hz and Body at 200 Hz
+    (modules/multirate.py). Only with the "euler" integrator.
+
+    static_parameters can be given instead of car_parameters_path, e.g. a StaticParameters derived
+    from the compiled one by the parameter estimation; its time_step must be 1/frequency. From a path
+    the parameters are StaticParameters.compile'd, shared by every VehicleDynamics of the same YAML.
+
+    tire_model replaces the Magic Formula of the wheels, e.g. a CombinedSlipMagicFormula or its
+    TireForceTable (modules/tire_model.py); None uses MagicFormula.from_static_parameters.
+
+    road is the height map of the road under the wheels, a TiledHeightMap (modules/road.py);
+    None is a flat road. With an integrator the heights are read at the start of the step and held.
+
+    friction scales the peak friction of the tires under each wheel, a FrictionMap or FrictionGrid
+    (modules/friction.py); None keeps the friction of the YAML everywhere.
+
+    profile=True (or enable_profiling()) times every tick, the powertrain, wheels and body calls
+    (integrate with an integrator) and the recorder with a Profiler (utils/Profiler.py), see
+    self.profiler.table(). Without it the loop is not instrumented at all.
     """
 
-    def __init__(self, initial_state = np.zeros(15), initial_gear = 1, frequency=1000, car_parameters_path = ""):
+    def __init__(self, initial_state = np.zeros(15), initial_gear = 1, frequency=1000, car_parameters_path = "", validation = "strict", integrator = "euler", substeps = None, static_parameters = None, profile = False, tire_model = None, road = None, friction = None):
         self.logger = LocalLogger("MainLogger").logger
         self.logger.setLevel("INFO")
 
-        self.static_parameters = StaticParameters(car_parameters_path, frequency)
-
-        self.logger.info("Imported YAML car self")    
-        self.current_states = CurrentStates(self.static_parameters, frequency, initial_state, initial_gear, self.logger)
+        if static_parameters is None:
+            self.static_parameters = StaticParameters.compile(car_parameters_path, frequency)
+            self.logger.info("Imported YAML car self")    
+        else:
+            if static_parameters.time_step != 1. / frequency:
+                raise ValueError(f"static_parameters.time_step {static_parameters.time_step} does not match the frequency {frequency}")
+            self.static_parameters = static_parameters
+        self.current_states = CurrentStates(self.static_parameters, frequency, initial_state, initial_gear, self.logger, validation)
+        self.check_end_of_tick = validation == "end_of_tick"
         self.powertrain = Powertrain(self.static_parameters, self.logger)
-        self.wheels = Wheels(self.static_parameters, self.logger)
-        self.body = Body(self.static_parameters, self.logger)
+        self.wheels = Wheels(self.static_parameters, self.logger, tire_model=tire_model, friction=friction)
+        self.body = Body(self.static_parameters, self.logger, road)
+        if integrator == "euler":
+            self.integrator = None
+        else:
+            self.integrator = get_integrator(integrator)
+            self.model = VehicleModel(self.static_parameters, tire_model, friction)
+        self.multirate = None
+        if substeps is not None:
+            if self.integrator is not None:
+                raise ValueError(f"substeps are only supported with the 'euler' integrator, got {integrator}")
+            self.multirate = MultiRate(self.static_parameters, self.logger, substeps, tire_model, road, friction)
+            self.powertrain, self.wheels, self.body = self.multirate.powertrain, self.multirate.wheels, self.multirate.body
         self.CUT_VALUE = 0.2
+        self.iteration = 0
+        self.profiler = None
+        self.profiling = False
+        if profile:
+            self.enable_profiling()
+
+    def checkpoint(self):
+        """ every mutable state of the simulation as bytes, for restore() on this or an identically configured VehicleDynamics """
+        extras = np.array([self.iteration, self.CUT_VALUE] + self.powertrain.counters(), dtype=float)
+        buffer = self.current_states.buffer
+        return CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, self.static_parameters.time_step, buffer.size) + buffer.tobytes() + extras.tobytes()
+
+    def restore(self, checkpoint):
+        """ continues from a checkpoint(), the following ticks match the checkpointed run bit for bit """
+        checkpoint = memoryview(checkpoint)
+        if len(checkpoint) < CHECKPOINT_HEADER.size:
+            raise ValueError("checkpoint is too short")
+        magic, version, time_step, size = CHECKPOINT_HEADER.unpack_from(checkpoint)
+        if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+            raise ValueError(f"not a version {CHECKPOINT_VERSION} checkpoint")
+        if time_step != self.static_parameters.time_step or size != self.current_states.buffer.size:
+            raise ValueError(f"checkpoint of a time_step {time_step} run with {size} states, "
+                             f"this one has {self.static_parameters.time_step} and {self.current_states.buffer.size}")
+        values = np.frombuffer(checkpoint, dtype=float, offset=CHECKPOINT_HEADER.size)
+        if values.size != size + 2 + len(self.powertrain.COUNTERS):
+            raise ValueError("checkpoint has the wrong length")
+        self.current_states.buffer[:] = values[:size]
+        iteration, self.CUT_VALUE, *counters = values[size:].tolist()
+        self.iteration = int(iteration)
+        self.powertrain.set_counters(counters)
+
+    def enable_profiling(self, profiler=None):
+        """ wraps tick and its stages with a Profiler (a new one unless given), returns it """
+        self.disable_profiling()
+        self.profiler = Profiler() if profiler is None else profiler
+        self.tick = self.profiler.wrap("tick", type(self).tick.__get__(self))
+        self.powertrain.powertrain = self.profiler.wrap("powertrain", type(self.powertrain).powertrain.__get__(self.powertrain))
+        if self.integrator is None:
+            self.wheels.wheels = self.profiler.wrap("wheels", type(self.wheels).wheels.__get__(self.wheels))
+            self.body.body = self.profiler.wrap("body", type(self.body).body.__get__(self.body))
+        else:
+            self.integrate = self.profiler.wrap("integrate", type(self).integrate.__get__(self))
+        self.profiling = True
+        return self.profiler
+
+    def disable_profiling(self):
+        """ removes the wrappers of enable_profiling, the Profiler and its samples stay in self.profiler """
+        for instance, name in ((self, "tick"), (self, "integrate"), (self.powertrain, "powertrain"), (self.wheels, "wheels"), (self.body, "body")):
+            instance.__dict__.pop(name, None)
+        self.profiling = False
 
     def tick(self, throttle, brake, steering_angle):
-        if self.CUT_VALUE > np.any(self.current_states.slip_x):
-            throttle=throttle/2
-        self.current_states = self.powertrain.powertrain(self.current_states, throttle, brake)
-        self.current_states = self.wheels.wheels(self.current_states, steering_angle)
-        self.current_states = self.body.body(self.current_states) 
+        try:
+            if self.CUT_VALUE > np.any(self.current_states.slip_x):
+                throttle=throttle/2
+            if self.multirate is not None:
+                self.current_states = self.multirate.step(self.current_states, throttle, brake, steering_angle)
+            else:
+                self.current_states = self.powertrain.powertrain(self.current_states, throttle, brake)
+                if self.integrator is None:
+                    self.current_states = self.wheels.wheels(self.current_states, steering_angle)
+                    self.current_states = self.body.body(self.current_states) 
+                else:
+                    self.current_states = self.integrate(self.current_states, steering_angle)
+            if self.check_end_of_tick:
+                self.current_states.check_finite()
+        except ValueError as error:
+            raise ValueError(f"{error} at tick {self.iteration}") from error
+        self.iteration += 1
 
         return self.current_states
+
+    def integrate(self, current_states, steering_angle):
+        """ advances the Wheels and Body states by one time_step with the selected integrator """
+        if self.body.road_map is not None:
+            current_states = self.body.road(current_states)
+        inputs = self.model.inputs(current_states, steering_angle)
+        y = self.integrator.step(self.model, self.model.pack(current_states), self.static_parameters.time_step, inputs)
+        return self.model.store(current_states, self.model.project(y), inputs)
+
+    def simulate(self, manoeuvre, recorder=None, progress=False, on_error="pad"):
+        """ Runs the whole manoeuvre, tick by tick.
+
+        Throttle, brake and steering are read once from the manoeuvre as contiguous
+        arrays, so no ManoeuvreState is built per tick.
+
+        Required Arguments:
+            1. manoeuvre: Manoeuvre
+            2. recorder: OutputRecorder or OutputStates to fill. None creates an
+               OutputRecorder sized to the manoeuvre, False records nothing.
+            3. progress: shows a tqdm progress bar
+            4. on_error: what to do when a tick raises a ValueError (NaN/inf state,
+               engine speed out of the torque table):
+                "pad"      stops and pads the recording with the last state up to the manoeuvre length
+                "truncate" stops and keeps only the ticks simulated so far
+                "raise"    re-raises the ValueError
+
+        The recorder can end the run early by raising StopIteration from set_states (after
+        recording the tick), e.g. estimation.channels.FitMetrics over its cost budget; the run
+        then returns as completed, with the ticks simulated so far.
+
+        Returns: SimulationResult(output_states, ticks, error)
+            ticks is the number of completed ticks and error the ValueError or None.
+        """
+        if on_error not in ("pad", "truncate", "raise"):
+            raise ValueError(f"on_error must be 'pad', 'truncate' or 'raise', got {on_error}")
+        if recorder is None:
+            recorder = OutputRecorder(len(manoeuvre))
+        points = len(manoeuvre)
+        throttle = np.ascontiguousarray(manoeuvre.throttle[:points], dtype=float).tolist()
+        brake = np.ascontiguousarray(manoeuvre.brake[:points], dtype=float).tolist()
+        steering = np.ascontiguousarray(manoeuvre.steering[:points], dtype=float).tolist()
+
+        inputs = zip(throttle, brake, steering)
+        if progress:
+            import tqdm
+            inputs = tqdm.tqdm(inputs, total=points)
+
+        tick = self.tick
+        record = recorder.set_states if recorder is not False else None
+        if record is not None and self.profiling:
+            record = self.profiler.wrap("recorder", record)
+        ticks = 0
+        try:
+            if record is None:
+                for throttle_i, brake_i, steering_i in inputs:
+                    tick(throttle_i, brake_i, steering_i)
+                    ticks += 1
+            else:
+                for throttle_i, brake_i, steering_i in inputs:
+                    record(tick(throttle_i, brake_i, steering_i))
+                    ticks += 1
+        except StopIteration:
+            return SimulationResult(recorder, ticks + 1, None)
+        except ValueError as error:
+            self.logger.error(f"simulation stopped: {error}")
+            if on_error == "raise":
+                raise
+            if on_error == "pad" and record is not None and len(recorder) > 0:
+                recorder.padding(points - len(recorder))
+            return SimulationResult(recorder if record is not None else None, ticks, error)
+
+        return SimulationResult(recorder if record is not None else None, ticks, None)
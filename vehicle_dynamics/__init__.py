@@ -1,3 +1,16 @@
-from vehicle_dynamics.modules import *
-from vehicle_dynamics.structures import *
-from vehicle_dynamics.utils import *
+import importlib
+
+# submodules of these packages are available as vehicle_dynamics.<name> as with a star import,
+# but only imported when first used, so "import vehicle_dynamics" does not load matplotlib & co
+_PACKAGES = ("modules", "structures", "utils", "estimation")
+_SUBMODULES = {name: f"vehicle_dynamics.{package}.{name}" for package in _PACKAGES
+               for name in importlib.import_module(f"vehicle_dynamics.{package}").__all__}
+__all__ = sorted(_SUBMODULES)
+
+
+def __getattr__(name):
+    if name not in _SUBMODULES:
+        raise AttributeError(f"module 'vehicle_dynamics' has no attribute {name!r}")
+    module = importlib.import_module(_SUBMODULES[name])
+    globals()[name] = module
+    return module
@@ -0,0 +1 @@
+__all__ = ["search_space", "channels", "estimator"]
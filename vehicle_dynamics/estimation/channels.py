@@ -0,0 +1,181 @@
+"""
+Vehicle Dynamic Model - Parameter Estimation Channels
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+Channel = namedtuple('Channel', 'recorded time simulated scale')
+""" recorded: keys of the recorded data (one per column), time: key of their time stamps,
+simulated: channel of the OutputRecorder ("x_a.vx", "wheel_w_vel"), scale: factor from the simulated to the recorded unit """
+
+CHANNELS = {"vx": Channel(("Velocity_X",), "time", "x_a.vx", 1.),
+            "wheel_speed": Channel(("v_wheel_fl", "v_wheel_rl", "v_wheel_fr", "v_wheel_rr"), "time", "wheel_w_vel", 1.),
+            "engine_speed": Channel(("rpm",), "car_time", "engine_w", 30 / np.pi),
+            "acc_x": Channel(("Acceleration_X",), "car_time", "x_a.acc_x", 1.),
+            "yaw_rate": Channel(("Yaw_Velocity",), "car_time", "x_a.wz", 1.),
+            "pitch": Channel(("Pitch",), "car_time", "x_a.pitch", 1.)}
+
+
+def recorded_channels(data, time, channels=CHANNELS):
+    """ recorded columns of every channel at the simulation time stamps, as (T, columns) arrays """
+    recorded = {}
+    for name, channel in channels.items():
+        columns = []
+        for key in channel.recorded:
+            columns.append(np.interp(time, np.asarray(data[channel.time], dtype=float), np.asarray(data[key], dtype=float)))
+        recorded[name] = np.stack(columns, axis=1)
+    return recorded
+
+
+def channel_errors(output_states, recorded, channels=CHANNELS):
+    """ RMS error of every channel over the recorded ticks of output_states (OutputRecorder) """
+    errors = {}
+    for name, channel in channels.items():
+        simulated = output_states.channel(channel.simulated).reshape(len(output_states), -1) * channel.scale
+        points = min(len(simulated), len(recorded[name]))
+        if points == 0:
+            errors[name] = np.inf
+            continue
+        errors[name] = float(np.sqrt(np.mean((simulated[:points] - recorded[name][:points]) ** 2)))
+    return errors
+
+
+class FitMetrics(object):
+    """
+        Errors of the channels accumulated tick by tick, passed as recorder to
+        VehicleDynamics.simulate() instead of an OutputRecorder: set_states() compares the
+        channels of the CurrentStates buffer with the recorded row of the same tick, so a run is
+        scored without storing its trace. Recorded rows past the end of the run and ticks past
+        the end of the recording are not compared, as in channel_errors.
+
+        Per channel, over all its columns and compared ticks (metrics()):
+            rmse              root mean square error, as channel_errors
+            max_error         largest absolute error
+            normalized_error  rmse divided by normalization[name] (the standard deviation of the
+                              recorded channel by default)
+
+        Every CHECK_INTERVAL ticks a run whose channels are no longer finite (a diverged state,
+        not raised with validation="off") is stopped. With a budget (reset(budget, weights)) the
+        run is also stopped as soon as its score provably exceeds it: the sums of squares only
+        grow, so the score the run would have at its end is at least the one of the errors so far
+        spread over all the recorded ticks (lower_bound()). set_states() ends the run by raising
+        StopIteration, see VehicleDynamics.simulate; stopped tells why ("diverged" or "budget").
+
+        Required Arguments:
+            1. recorded: {name: (T, columns)} from recorded_channels
+            2. channels: {name: Channel}
+            3. normalization: {name: scale}, the standard deviation of the recorded channel when None
+    """
+    CHECK_INTERVAL = 10
+
+    def __init__(self, recorded, channels=CHANNELS, normalization=None, layout=None):
+        super(FitMetrics, self).__init__()
+        if layout is None:
+            from vehicle_dynamics.structures.CurrentStates import CurrentStates
+            layout = CurrentStates.LAYOUT
+        leaves = layout.flat()
+        self.names = list(channels)
+        self.columns = {}
+        indices, scales, references = [], [], []
+        for name, channel in channels.items():
+            offset, shape = leaves[channel.simulated]
+            width = int(np.prod(shape, dtype=int))
+            reference = np.asarray(recorded[name], dtype=float).reshape(len(recorded[name]), -1)
+            if reference.shape[1] != width:
+                raise ValueError(f"channel {name}: {reference.shape[1]} recorded columns for the {width} values of {channel.simulated}")
+            self.columns[name] = slice(len(indices), len(indices) + width)
+            indices += range(offset, offset + width)
+            scales += [channel.scale] * width
+            references.append(reference)
+        self.points = min(len(reference) for reference in references) if references else 0
+        self._indices = np.array(indices, dtype=np.intp)
+        self._scales = np.array(scales)
+        self._reference = np.concatenate(references, axis=1)[:self.points] if references else np.zeros((0, 0))
+        if normalization is None:
+            normalization = {name: float(np.std(recorded[name])) or 1. for name in self.names}
+        self.normalization = {name: float(normalization[name]) for name in self.names}
+        # column -> channel, for the channel sums of squares of lower_bound()
+        self._channel_of_column = np.zeros((len(self._indices), len(self.names)))
+        for number, name in enumerate(self.names):
+            self._channel_of_column[self.columns[name], number] = 1.
+        self._widths = self._channel_of_column.sum(axis=0)
+        self.reset()
+
+    def reset(self, budget=None, weights=None):
+        """ forgets the compared ticks; budget: score above which the run is stopped, weights: {name: weight} of the score """
+        self._sum_squares = np.zeros(len(self._indices))
+        self._max_error = np.zeros(len(self._indices))
+        self._last = None
+        self._length = 0
+        self.budget = budget
+        weights = {} if weights is None else weights
+        weights = np.array([float(weights.get(name, 1.)) for name in self.names])
+        normalization = np.array([self.normalization[name] for name in self.names])
+        self._bound_weights = weights / normalization / weights.sum()
+        self.stopped = None
+
+    def __len__(self):
+        return self._length
+
+    def compare(self, simulated):
+        """ accumulates the errors of the simulated channel values (in the order of the columns) of the next tick """
+        if self._length < self.points:
+            error = simulated - self._reference[self._length]
+            self._sum_squares += error * error
+            np.maximum(self._max_error, np.abs(error), out=self._max_error)
+        self._last = simulated
+        self._length += 1
+
+    def lower_bound(self):
+        """ lowest score the run can end with, from the errors so far (nan once they are not finite) """
+        channel_squares = self._sum_squares @ self._channel_of_column
+        return float(self._bound_weights @ np.sqrt(channel_squares / (max(self.points, 1) * self._widths)))
+
+    def set_states(self, current_states):
+        self.compare(current_states.buffer[self._indices] * self._scales)
+        if self._length % self.CHECK_INTERVAL == 0:
+            bound = self.lower_bound()
+            if not np.isfinite(bound):
+                self.stopped = "diverged"
+            elif self.budget is not None and bound > self.budget:
+                self.stopped = "budget"
+            else:
+                return
+            raise StopIteration(self.stopped)
+
+    def padding(self, value):
+        """ compares the last tick again value times, as OutputRecorder.padding followed by channel_errors """
+        for _ in range(value if self._last is not None else 0):
+            self.compare(self._last)
+
+    def errors(self):
+        """ RMS error of every channel, inf when no tick was compared """
+        compared = min(self._length, self.points)
+        errors = {}
+        for name in self.names:
+            columns = self.columns[name]
+            if compared == 0:
+                errors[name] = np.inf
+                continue
+            errors[name] = float(np.sqrt(np.sum(self._sum_squares[columns]) / (compared * (columns.stop - columns.start))))
+        return errors
+
+    def metrics(self):
+        """ {name: {"rmse", "max_error", "normalized_error"}} of every channel """
+        metrics = {}
+        for name, rmse in self.errors().items():
+            max_error = float(np.max(self._max_error[self.columns[name]])) if np.isfinite(rmse) else np.inf
+            metrics[name] = {"rmse": rmse, "max_error": max_error, "normalized_error": rmse / self.normalization[name]}
+        return metrics
+
+    def score(self, weights=None):
+        """ weighted mean of the normalized errors, the score of Evaluation (of the ticks so far when stopped) """
+        weights = {} if weights is None else weights
+        errors = self.errors()
+        total = sum(float(weights.get(name, 1.)) for name in self.names)
+        return sum(float(weights.get(name, 1.)) * errors[name] / self.normalization[name] for name in self.names) / total
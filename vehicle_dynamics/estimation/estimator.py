@@ -0,0 +1,268 @@
+"""
+Vehicle Dynamic Model - Parallel Parameter Estimation
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from vehicle_dynamics.estimation.search_space import SearchSpace
+from vehicle_dynamics.estimation.channels import CHANNELS, FitMetrics, recorded_channels
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+
+Fit = namedtuple('Fit', 'values score channel_errors error ticks')
+EstimationResult = namedtuple('EstimationResult', 'parameters score channel_errors nominal evaluations ticks')
+
+
+class Evaluation(object):
+    """
+        Objective of the estimation: simulates the recorded manoeuvre with a candidate of the
+        search space and compares the simulated channels with the recorded ones.
+
+        The score is the weighted mean over the channels of the RMS error divided by the standard
+        deviation of the recorded channel, so channels of different units can be combined.
+        A simulation stopped by a ValueError scores inf, as does one whose channels are no longer
+        finite (the runs use validation="off", so a diverged state raises no ValueError). The
+        errors are accumulated during the run by FitMetrics, no trace of the simulation is recorded.
+
+        fit(values, budget) stops the run as soon as its score provably exceeds the budget (e.g.
+        the score a candidate has to beat), see FitMetrics. The stopped run scores inf, as its full score is
+        unknown; Fit.channel_errors then hold the errors of its ticks so far, for reporting only.
+        Fit.error says why a run stopped and Fit.ticks how many ticks were simulated.
+
+        Required Arguments:
+            1. car_parameters_path
+            2. data: recorded data (dict as Braking.pickle) with steering, throttle, brake, time,
+               the initial position, speed and yaw and the recorded channels
+            3. search_space: SearchSpace
+            4. channels: {name: Channel}
+            5. weights: {name: weight}, 1 for the missing channels
+            6. frequency: simulation frequency, the manoeuvre and the recorded channels are
+               resampled from data_frequency when they differ (integrators.resample)
+    """
+
+    def __init__(self, car_parameters_path, data, search_space: SearchSpace, channels=CHANNELS, weights=None, frequency=1000, initial_gear=1, data_frequency=1000):
+        super(Evaluation, self).__init__()
+        self.car_parameters_path = car_parameters_path
+        self.search_space = search_space
+        self.channels = channels
+        self.frequency = frequency
+        self.initial_gear = initial_gear
+        from vehicle_dynamics.structures.Manoeuvre import Manoeuvre
+        from vehicle_dynamics.modules.integrators import resample
+
+        time = np.asarray(data["time"], dtype=float)
+        self.manoeuvre = Manoeuvre(np.asarray(data["steering"], dtype=float), np.asarray(data["throttle"], dtype=float),
+                                   np.asarray(data["brake"], dtype=float), time)
+        if frequency != data_frequency:
+            self.manoeuvre = resample(self.manoeuvre, data_frequency, frequency)
+            time = time[np.arange(len(self.manoeuvre)) * data_frequency // frequency]
+        self.initial_state = {"x": float(data["Rel_pos_x"][0]), "y": float(data["Rel_pos_y"][0]),
+                              "vx": float(data["Velocity_X"][0]), "yaw": float(data["Yaw"][0])}
+        self.recorded = recorded_channels(data, time, channels)
+        weights = {} if weights is None else weights
+        self.weights = {name: float(weights.get(name, 1.)) for name in channels}
+        self.normalization = {name: float(np.std(values)) or 1. for name, values in self.recorded.items()}
+        self.metrics = FitMetrics(self.recorded, channels, self.normalization)
+
+    def simulate(self, values, recorder=None):
+        """ runs the manoeuvre with the candidate values into recorder (an OutputRecorder when None), returns SimulationResult """
+        from vehicle_dynamics.VehicleDynamics import VehicleDynamics
+        from vehicle_dynamics.structures.StaticParameters import StaticParameters
+        from vehicle_dynamics.structures.StateVector import StateVector
+
+        static_parameters = StaticParameters.compile(self.car_parameters_path, self.frequency).derive(self.search_space.to_dict(values))
+        vehicle_dynamics = VehicleDynamics(initial_state=StateVector(**self.initial_state), initial_gear=self.initial_gear, frequency=self.frequency,
+                                           static_parameters=static_parameters, validation="off")
+        vehicle_dynamics.logger.setLevel("WARNING")
+        return vehicle_dynamics.simulate(self.manoeuvre, recorder=recorder, on_error="truncate")
+
+    def fit(self, values, budget=None):
+        self.metrics.reset(budget, self.weights)
+        _, ticks, error = self.simulate(values, self.metrics)
+        errors = self.metrics.errors()
+        if error is not None or self.metrics.stopped is not None:
+            score = np.inf
+        else:
+            score = self.metrics.score(self.weights)
+        if not np.isfinite(score):
+            score = np.inf
+        if self.metrics.stopped == "budget":
+            error = f"stopped after {ticks} of {len(self.manoeuvre)} ticks, the score is above the budget {budget:.6g}"
+        elif self.metrics.stopped == "diverged":
+            error = f"stopped after {ticks} of {len(self.manoeuvre)} ticks, the simulated channels are not finite"
+        return Fit(np.array(values, dtype=float), float(score), errors, None if error is None else str(error), ticks)
+
+    def __call__(self, values):
+        return self.fit(values).score
+
+
+# Evaluation of the worker processes, set once by the pool initializer instead of being sent with every candidate
+_EVALUATION = None
+
+
+def _set_evaluation(evaluation):
+    global _EVALUATION
+    _EVALUATION = evaluation
+
+
+def _score(values):
+    return _EVALUATION(values)
+
+
+def _fit(values, budget=None):
+    return _EVALUATION.fit(values, budget)
+
+
+def _score_within(values, budget):
+    fit = _EVALUATION.fit(values, budget)
+    return fit.score, fit.ticks, _EVALUATION.metrics.stopped is not None
+
+
+class _BudgetMap(object):
+    """
+        map-like callable of differential_evolution (updating="deferred"): scores each generation
+        with _score_within and counts the simulated ticks. The objective passed by
+        differential_evolution is _score, replaced here by _score_within.
+
+        It follows the energies of the population as differential_evolution does: the scores of
+        the first generation, then the minimum of trial and target after each generation, with
+        the lowest one swapped to the front. With early_abort the trial i gets the energy of its
+        target i as budget, so only the trials the search would reject anyway are stopped; the
+        first generation runs without budget.
+    """
+
+    def __init__(self, pool, early_abort, points):
+        super(_BudgetMap, self).__init__()
+        self.map = map if pool is None else pool.map
+        self.early_abort = early_abort
+        self.points = points
+        self.energies = None
+        self.ticks = {"simulated": 0, "full": 0, "stopped": 0}
+
+    def __call__(self, objective, candidates):
+        candidates = list(candidates)
+        generation = self.energies is not None and len(candidates) == len(self.energies)
+        budgets = self.energies.tolist() if generation and self.early_abort else repeat(None)
+        scores = []
+        for score, ticks, stopped in self.map(_score_within, candidates, budgets):
+            scores.append(score)
+            self.ticks["simulated"] += ticks
+            self.ticks["full"] += self.points
+            self.ticks["stopped"] += stopped
+        scores_array = np.array(scores, dtype=float)
+        self.energies = np.minimum(scores_array, self.energies) if generation else scores_array
+        lowest = int(np.argmin(self.energies))
+        self.energies[[0, lowest]] = self.energies[[lowest, 0]]
+        return scores
+
+
+class ParameterEstimator(object):
+    """
+        Estimates the parameters of the search space of an Evaluation, with the candidates
+        simulated on a pool of worker processes.
+
+        evaluate() scores a given list of candidates, estimate() searches the bounds with
+        scipy's differential evolution, starting from a population that contains the nominal
+        values of the YAML. With early_abort each trial is simulated with the score of the
+        member it competes with as budget (Evaluation.fit), so a trial that would be rejected
+        stops after a fraction of the run and the search finds the same parameters as without.
+
+        Required Arguments:
+            1. evaluation: Evaluation
+            2. workers: number of processes, None for os.cpu_count(), 1 evaluates in this process
+    """
+
+    def __init__(self, evaluation: Evaluation, workers=None, logger=None):
+        super(ParameterEstimator, self).__init__()
+        self.evaluation = evaluation
+        self.workers = workers
+        self.logger = logger
+
+    def _pool(self):
+        if self.workers == 1:
+            _set_evaluation(self.evaluation)
+            return None
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_set_evaluation, initargs=(self.evaluation,))
+
+    def evaluate(self, candidates, budget=None):
+        """ Fit of every candidate (sequence of values of the search space), stopped above the budget if given """
+        pool = self._pool()
+        if pool is None:
+            return [_fit(candidate, budget) for candidate in candidates]
+        with pool:
+            return list(pool.map(_fit, candidates, repeat(budget)))
+
+    def estimate(self, maxiter=10, popsize=2, seed=None, tol=0.01, early_abort=False):
+        """
+            Required Arguments:
+                1. maxiter: generations of the differential evolution
+                2. popsize: population size as a multiple of the number of parameters
+                3. seed
+                4. early_abort: stops the trials whose score exceeds the one of the member they compete with
+
+            Returns: EstimationResult(parameters, score, channel_errors, nominal, evaluations, ticks)
+                parameters: {name: value} of the best fit, nominal: Fit of the YAML values,
+                ticks: {"simulated", "full", "stopped"} simulated ticks of the search, ticks of
+                the same evaluations run to the end and number of stopped runs
+        """
+        from scipy.optimize import differential_evolution
+
+        search_space = self.evaluation.search_space
+        pool = self._pool()
+        workers = _BudgetMap(pool, early_abort, len(self.evaluation.manoeuvre))
+        generation = [0]
+
+        def progress(intermediate_result):
+            generation[0] += 1
+            if self.logger is not None:
+                self.logger.info(f"generation {generation[0]}: best score {intermediate_result.fun:.4f}, "
+                                 f"{workers.ticks['simulated'] / workers.ticks['full']:.0%} of the ticks simulated")
+
+        try:
+            result = differential_evolution(_score, search_space.bounds, x0=search_space.nominal, maxiter=maxiter, popsize=popsize,
+                                            seed=seed, tol=tol, polish=False, updating="deferred", workers=workers, callback=progress)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        best, nominal = self.evaluate([result.x, search_space.nominal])
+        ticks = dict(workers.ticks)
+        ticks["simulated"] += best.ticks + nominal.ticks
+        ticks["full"] += 2 * len(self.evaluation.manoeuvre)
+        return EstimationResult(search_space.to_dict(best.values), best.score, best.channel_errors, nominal, result.nfev + 2, ticks)
+
+
+def report(result: EstimationResult, search_space: SearchSpace):
+    """ lines describing the best fit against the nominal parameters """
+    lines = [f"score {result.score:.4f} (nominal {result.nominal.score:.4f}) after {result.evaluations} evaluations",
+             f"  {result.ticks['simulated']} of {result.ticks['full']} ticks simulated ({result.ticks['simulated'] / result.ticks['full']:.0%}), "
+             f"{result.ticks['stopped']} runs stopped early"]
+    for parameter in search_space.parameters:
+        lines.append(f"  {parameter.name:45s} {result.parameters[parameter.name]:12.5g}   nominal {parameter.nominal:12.5g}")
+    for name, error in result.channel_errors.items():
+        lines.append(f"  RMS error {name:15s} {error:12.5g}   nominal {result.nominal.channel_errors[name]:12.5g}")
+    return lines
+
+
+def main(data, logger, maxiter=10, popsize=2, workers=None, early_abort=True):
+    car_parameters_path = "../../bmw_m8.yaml"
+    search_space = SearchSpace.from_yaml(car_parameters_path, bounds={"powertrain.gearbox.efficiency": (0.5, 1.)})
+    estimator = ParameterEstimator(Evaluation(car_parameters_path, data, search_space), workers=workers, logger=logger)
+    result = estimator.estimate(maxiter=maxiter, popsize=popsize, seed=0, early_abort=early_abort)
+    for line in report(result, search_space):
+        logger.info(line)
+    return result
+
+
+if __name__ == '__main__':
+    from vehicle_dynamics.utils.columnar_data import open_data
+    from vehicle_dynamics.utils.LocalLogger import LocalLogger
+    logger = LocalLogger("estimation").logger
+    logger.setLevel('INFO')
+
+    PATH_TO_DATA = "../../example_data/Braking.pickle"
+    data = open_data(PATH_TO_DATA)
+    main(data, logger)
@@ -0,0 +1,130 @@
+"""
+Vehicle Dynamic Model - Parameter Estimation Search Space
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from collections import namedtuple
+import re
+
+import numpy as np
+import yaml
+
+Parameter = namedtuple('Parameter', 'name path index nominal lower upper')
+
+OPTIMIZE_TAG = "#OPTIMIZE"
+_KEY = re.compile(r"^(\s*)([A-Za-z_]\w*)\s*:(.*)$")
+
+
+def optimize_paths(car_parameters_path):
+    """ dotted paths of the YAML fields tagged with #OPTIMIZE, in file order """
+    paths = []
+    parents = []
+    with open(car_parameters_path, 'r') as file:
+        for line in file:
+            match = _KEY.match(line)
+            if match is None:
+                continue
+            indent, key, rest = len(match.group(1)), match.group(2), match.group(3)
+            while parents and parents[-1][0] >= indent:
+                parents.pop()
+            parents.append((indent, key))
+            value, _, comment = rest.partition("#")
+            if value.strip() and OPTIMIZE_TAG in "#" + comment:
+                paths.append(".".join(key for _, key in parents))
+    return paths
+
+
+class SearchSpace(object):
+    """
+        Bounded search space over fields of the car parameters YAML.
+
+        Every scalar field is one dimension and every element of a list field another one, named
+        as "powertrain.bias[2]". from_yaml() builds it from the fields tagged with #OPTIMIZE, with
+        bounds relative to the nominal values unless given in bounds.
+
+        Required Arguments:
+            1. parameters: list of Parameter(name, path, index, nominal, lower, upper)
+    """
+
+    def __init__(self, parameters):
+        super(SearchSpace, self).__init__()
+        if not parameters:
+            raise ValueError("the search space has no parameters")
+        self.parameters = list(parameters)
+
+    @classmethod
+    def from_yaml(cls, car_parameters_path, relative_bounds=(0.5, 1.5), bounds=None, paths=None):
+        """
+            Required Arguments:
+                1. car_parameters_path
+                2. relative_bounds: (lower, upper) factors of the nominal value
+                3. bounds: {name or path: (lower, upper)} overriding the relative bounds
+                4. paths: fields to use instead of the #OPTIMIZE tagged ones
+        """
+        bounds = {} if bounds is None else bounds
+        with open(car_parameters_path, 'r') as file:
+            values = yaml.safe_load(file)
+        parameters = []
+        for path in (optimize_paths(car_parameters_path) if paths is None else paths):
+            value = values
+            for key in path.split("."):
+                if not isinstance(value, dict) or key not in value:
+                    raise ValueError(f"{path} is not a field of {car_parameters_path}")
+                value = value[key]
+            nominal = np.asarray(value, dtype=float)
+            for index in np.ndindex(nominal.shape):
+                name = path + "".join(f"[{i}]" for i in index)
+                lower, upper = sorted((nominal[index] * relative_bounds[0], nominal[index] * relative_bounds[1]))
+                lower, upper = bounds.get(name, bounds.get(path, (lower, upper)))
+                if not lower <= upper:
+                    raise ValueError(f"empty bounds ({lower}, {upper}) for {name}")
+                parameters.append(Parameter(name, path, index, float(nominal[index]), float(lower), float(upper)))
+        return cls(parameters)
+
+    def __len__(self):
+        return len(self.parameters)
+
+    @property
+    def names(self):
+        return [parameter.name for parameter in self.parameters]
+
+    @property
+    def nominal(self):
+        return np.array([parameter.nominal for parameter in self.parameters])
+
+    @property
+    def bounds(self):
+        return [(parameter.lower, parameter.upper) for parameter in self.parameters]
+
+    def apply(self, static_parameters, values):
+        """ writes values (one per dimension) into a StaticParameters loaded with optimization=True,
+        without updating its derived fields (StaticParameters.derive(to_dict(values)) does) """
+        if len(values) != len(self.parameters):
+            raise ValueError(f"expected {len(self.parameters)} values, got {len(values)}")
+        for parameter, value in zip(self.parameters, values):
+            *parents, key = parameter.path.split(".")
+            node = static_parameters
+            for parent in parents:
+                node = getattr(node, parent)
+            if parameter.index == ():
+                setattr(node, key, float(value))
+            else:
+                if getattr(node, key).dtype != float:
+                    setattr(node, key, getattr(node, key).astype(float))
+                getattr(node, key)[parameter.index] = value
+        return static_parameters
+
+    def to_dict(self, values):
+        return dict(zip(self.names, map(float, values)))
+
+
+def main():
+    search_space = SearchSpace.from_yaml("../../bmw_m8.yaml")
+    for parameter in search_space.parameters:
+        print(f"{parameter.name:40s} {parameter.nominal:10.4g} [{parameter.lower:.4g}, {parameter.upper:.4g}]")
+
+
+if __name__ == '__main__':
+    main()
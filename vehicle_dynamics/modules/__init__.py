@@ -1 +1 @@
-__all__ = ["powertrain", "wheels", "body","LocalLogger"]
+__all__ = ["powertrain", "wheels", "body","LocalLogger","batch_powertrain","batch_wheels","batch_body","vehicle_model","integrators","multirate","branching","cosimulation","realtime","tire_model","road","friction"]
@@ -0,0 +1,112 @@
+"""
+Vehicle Dynamic Model - Batch Body Kernel
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from vehicle_dynamics.structures.BatchCurrentStates import BatchCurrentStates
+from vehicle_dynamics.structures.BatchStaticParameters import BatchStaticParameters
+
+import numpy as np
+
+
+class BatchBody(object):
+    """
+        Vectorized version of Body.body for N members.
+
+        Wheel loads, suspension forces and the chassis translation and rotation are
+        evaluated on (N,) and (N, 4) arrays, following Body line by line.
+    """
+
+    def body(self, states: BatchCurrentStates, parameters: BatchStaticParameters):
+        time_step = parameters.time_step
+        vx = states.vx.copy()
+        vy = states.vy.copy()
+        sin_Ф = np.sin(states.roll)
+        sin_θ = np.sin(states.pitch)
+        sin_Ψ = np.sin(states.yaw)
+        cos_Ψ = np.cos(states.yaw)
+        Ψdot = states.wz.copy()
+        h = parameters.sz
+        m = parameters.mass
+        wheel_forces = states.wheel_forces_transformed_force2vehicle_sys
+
+        sum_f_wheel = np.sum(wheel_forces, axis=2)
+
+        # placeholder to consider road status
+        states.road[:] = 0.
+
+        longitudinal_distance = parameters.longitudinal_distance
+        lateral_distance = parameters.lateral_distance
+        long_f = parameters.lf[:, None]
+        long_r = parameters.lr[:, None]
+        w = (parameters.wl + parameters.wr)[:, None]
+
+        displacement_suspension = (states.z - states.reference_zCG)[:, None] - (longitudinal_distance * sin_θ[:, None]) + (lateral_distance * sin_Ф[:, None]) - states.road
+
+        states.suspension_dot = (displacement_suspension - states.suspension) / time_step
+        states.suspension = displacement_suspension
+
+        sprung_mass = parameters.sprung_mass
+
+        damping_force = -(parameters.damping_rate * states.suspension_dot)
+        spring_force = -(parameters.spring_rate * displacement_suspension)
+        anti_roll_bar_force = parameters.roll_bar_stiffness[:, None] * sin_Ф[:, None] / (2 * lateral_distance)
+
+        suspension_force = spring_force + damping_force + anti_roll_bar_force
+        states.suspension_force = suspension_force
+
+        ξ_lon = np.array([-1/2, 1/2, -1/2, 1/2])
+        ξ_lat = np.concatenate([- long_r/w, - long_f/w, long_r/w, long_f/w], axis=1)
+
+        lateral_force_transfer = ξ_lat * (m * states.acc_y * parameters.roll_centre_height / parameters.track_width)[:, None]
+        longitudinal_force_transfer = ξ_lon * (m * states.acc_x * parameters.pitch_centre_height / parameters.wheel_base)[:, None]
+
+        states.wheel_load_z = (sprung_mass + parameters.unsprung_mass) * parameters.gravity[:, None] + suspension_force + longitudinal_force_transfer + lateral_force_transfer
+        wheel_forces[:, 2, :] = states.wheel_load_z
+
+        # CHASSIS
+        fx_fl, fx_rl, fx_fr, fx_rr = wheel_forces[:, 0, 0], wheel_forces[:, 0, 1], wheel_forces[:, 0, 2], wheel_forces[:, 0, 3]
+        fy_fl, fy_rl, fy_fr, fy_rr = wheel_forces[:, 1, 0], wheel_forces[:, 1, 1], wheel_forces[:, 1, 2], wheel_forces[:, 1, 3]
+
+        states.acc_x = (sum_f_wheel[:, 0] - 0.5 * parameters.aerodynamics_front * vx**2) / m
+        states.vx = states.vx + (states.acc_x + vy * Ψdot) * time_step
+        stopped = states.vx <= 0.0
+        states.acc_x[stopped] = 0.0
+        states.vx[stopped] = 0.0
+
+        states.acc_y = sum_f_wheel[:, 1] / m
+        states.acc_z = np.sum(suspension_force, axis=1) / m
+
+        states.vy = states.vy + (states.acc_y - vx * Ψdot) * time_step
+        states.vz = states.vz + states.acc_z * time_step
+
+        vxx, vyx = vx * cos_Ψ, vy * -sin_Ψ
+        vxy, vyy = vx * sin_Ψ, vy * cos_Ψ
+
+        states.x = states.x + (vxx + vyx) * time_step
+        states.y = states.y + (vxy + vyy) * time_step
+        states.z = states.z + states.vz * time_step
+
+        # Chassis rotation
+        Mz = ((fy_fl + fy_fr) * parameters.lf - (fy_rl + fy_rr) * parameters.lr + (fx_rr + fx_fr) * parameters.wr + (fx_rl + fx_fl) * (-parameters.wl))
+
+        hsr = parameters.roll_centre_height - h
+        hsp = parameters.pitch_centre_height - h
+        total_sprung_mass = np.sum(sprung_mass, axis=1)
+
+        states.wx_dot = (np.sum(lateral_distance * suspension_force, axis=1) + total_sprung_mass * hsr * (states.acc_y + parameters.gravity * sin_Ф)) / parameters.i_x_s
+        states.wy_dot = ((-1) * ((np.sum(longitudinal_distance * suspension_force, axis=1) + total_sprung_mass * hsp * (states.acc_x - parameters.gravity * sin_θ)) / parameters.i_y_s))
+        states.wz_dot = Mz / parameters.i_z
+
+        states.wx = states.wx + states.wx_dot * time_step
+        states.wy = states.wy + states.wy_dot * time_step
+        states.wz = states.wz + states.wz_dot * time_step
+
+        # Angular position
+        states.roll = states.roll + states.wx * time_step
+        states.pitch = states.pitch + states.wy * time_step
+        states.yaw = states.yaw + states.wz * time_step
+
+        return states
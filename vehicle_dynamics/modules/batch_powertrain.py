@@ -0,0 +1,99 @@
+"""
+Vehicle Dynamic Model - Batch Powertrain Kernel
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from vehicle_dynamics.structures.BatchCurrentStates import BatchCurrentStates
+from vehicle_dynamics.structures.BatchStaticParameters import BatchStaticParameters
+
+import numpy as np
+
+
+class BatchPowertrain(object):
+    """
+        Vectorized version of Powertrain.powertrain for N members.
+
+        Gear selection, torque converter and brake logic follow Powertrain exactly, the
+        branches are replaced by masks. The Powertrain counters (current_sync,
+        current_grace_period, previous_throttle) live in BatchCurrentStates.
+
+        Returns: (states, failed)
+            failed is a (N,) mask of members whose engine_w left the torque table, where
+            Powertrain raises a ValueError
+    """
+
+    def powertrain(self, states: BatchCurrentStates, parameters: BatchStaticParameters, throttle, brake):
+        throttle = np.array(throttle, dtype=float)
+        brake = np.asarray(brake, dtype=float)
+        members = np.arange(len(states))
+
+        # Gearbox up or down shifting (Powertrain.gear_change_rpm)
+        grace = states.current_grace_period > 0
+        states.current_grace_period[grace] -= 1
+        throttle_row = np.round(throttle * 10).astype(int)
+        gear_max_rpm = parameters.gear_max_rpm[members, throttle_row, states.gear]
+        gear_min_rpm = parameters.gear_min_rpm[members, throttle_row, states.gear]
+        up = ~grace & (states.engine_w > gear_max_rpm)
+        down = ~grace & ~up & (states.engine_w < gear_min_rpm)
+        up &= states.gear + 1 < parameters.n_gears
+        down &= states.gear - 1 >= 1
+        changed = up | down
+        states.gear += up.astype(int) - down.astype(int)
+        states.current_grace_period[changed] = parameters.MIN_GEAR_CHANGE_INTERVAL[changed]
+        states.current_sync[changed] = parameters.CONVERTER_SYNC_TIME[changed]
+
+        syncing = states.current_sync > 0
+        states.current_sync[syncing] -= 1
+        throttle[syncing] = 0.2
+
+        # Calculate torque provided by the engine based on the engine engine_w
+        failed = parameters.torque_interpolation.out_of_range(states.engine_w)
+        torque_available = parameters.torque_interpolation(states.engine_w)
+
+        states.current_grace_period += parameters.THROTTLE_CHANGE_INTERVAL * (states.previous_throttle - throttle != 0)
+        states.previous_throttle = throttle
+
+        # checking for idle state
+        idle = states.engine_w < parameters.idle_rpm
+        states.engine_w[idle] = parameters.idle_rpm[idle]
+
+        engine_torque = throttle * torque_available
+
+        final_ratio = parameters.gear_ratio[members, states.gear] * parameters.differential_ratio
+        turbine_w = final_ratio * np.mean(states.wheel_w_vel, axis=1)
+        torque_converter_ratio = turbine_w / states.engine_w
+
+        # Clutch Mode
+        clutch = torque_converter_ratio >= parameters.lock_up_ratio
+
+        # Torque Converter
+        torque_converter_ratio = np.where(torque_converter_ratio < 0, 0, torque_converter_ratio)
+        converter_ratio = np.minimum(torque_converter_ratio, 1.)
+        k_in = parameters.k_in_funct(converter_ratio)
+        μ = parameters.μ_funct(converter_ratio)
+        torque_converter_in = k_in * (states.engine_w ** 2)
+        engine_wdot = (engine_torque - torque_converter_in) / parameters.engine_inertia
+
+        torque_converter_out = np.where(clutch, engine_torque, μ * torque_converter_in)
+        states.engine_w = np.where(clutch, turbine_w, states.engine_w + engine_wdot * parameters.time_step)
+
+        # Gillespie equation 2-7
+        traction_torque = torque_converter_out * final_ratio * parameters.gearbox_efficiency
+        wheel_torque = traction_torque[:, None] * parameters.bias
+
+        # --------------------Break Torque -------------------------
+        brake_torque = brake[:, None] * parameters.max_braking_torque[:, None] * parameters.brake_bias
+
+        # -------------------- Total Torque -------------------------
+        net_torque = wheel_torque - brake_torque
+        standstill = states.vx <= 1e-6
+        hold = (standstill & (np.mean(net_torque, axis=1) <= 0)) | (standstill & (brake > 0))
+        net_torque[hold] = 0.
+        states.powertrain_net_torque = net_torque
+
+        # Unecessary but for code safety
+        states.engine_w = np.minimum(states.engine_w, parameters.maximum_rpm)
+
+        return states, failed
@@ -0,0 +1,78 @@
+"""
+Vehicle Dynamic Model - Batch Wheels Kernel
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from vehicle_dynamics.structures.BatchCurrentStates import BatchCurrentStates
+from vehicle_dynamics.structures.BatchStaticParameters import BatchStaticParameters
+from vehicle_dynamics.modules.tire_model import MagicFormula
+
+import numpy as np
+
+
+class BatchWheels(object):
+    """
+        Vectorized version of Wheels.wheels for N members.
+
+        Steering, slip calculation, Magic Formula tire forces and wheel spin integration
+        are evaluated on (N, 4) arrays, following Wheels line by line.
+    """
+    MINIMUM_SPEED_VALUE = 15
+
+    def __init__(self):
+        super(BatchWheels, self).__init__()
+        self._tire_model = (None, None)
+
+    def tire_model(self, parameters):
+        """ MagicFormula of the members, computed once per BatchStaticParameters """
+        if self._tire_model[0] is not parameters:
+            self._tire_model = (parameters, MagicFormula.from_batch_parameters(parameters))
+        return self._tire_model[1]
+
+    def wheels(self, states: BatchCurrentStates, parameters: BatchStaticParameters, steering_input):
+        MINIMUM_SPEED_VALUE = self.MINIMUM_SPEED_VALUE
+        members = np.arange(len(states))
+        vx = states.vx[:, None]
+        vy = states.vy[:, None]
+        wz = states.wz[:, None]
+
+        # Convert Steering input [-1,1] to wheel steering (delta)
+        steering_angle = np.asarray(steering_input, dtype=float) * parameters.maximum_steering_angle
+        states.delta = steering_angle / parameters.steering_ratio
+
+        # Slip Calculation, equation 11.30 Bardini
+        wheel_speed = parameters.dynamic_radius * states.wheel_w_vel
+        low_speed = np.abs(states.vx) <= MINIMUM_SPEED_VALUE
+        slip_denominator = np.where(low_speed[:, None], MINIMUM_SPEED_VALUE, np.maximum(np.absolute(wheel_speed), np.absolute(vx)))
+        states.slip_x = (wheel_speed - vx) / slip_denominator
+
+        # Refenrence from VTI Y Slip angle
+        previous_slip_y = states.slip_y.copy()
+        wheel_delta = np.zeros((len(states), 4))
+        wheel_delta[:, [0, 2]] = states.delta[:, None]
+        low_speed = (states.vx <= MINIMUM_SPEED_VALUE) & (states.wz * -parameters.wr <= MINIMUM_SPEED_VALUE)
+        lateral_denominator = np.where(low_speed[:, None], MINIMUM_SPEED_VALUE, vx - parameters.lateral_distance * wz)
+        states.slip_y = wheel_delta - np.arctan((vy + parameters.longitudinal_distance * wz) / lateral_denominator)
+        states.slip_y_rate = (previous_slip_y - states.slip_y) / parameters.time_step
+
+        # Tire Model
+        tire_model = self.tire_model(parameters)
+        states.fx, states.fy = tire_model.forces(states.wheel_load_z, states.slip_x, states.slip_y)
+
+        states.compiled_wheel_forces = np.stack([states.fx, states.fy, states.wheel_load_z], axis=1)
+
+        force_x, force_y = tire_model.to_vehicle(states.fx, states.fy, wheel_delta)
+        states.wheel_forces_transformed_force2vehicle_sys[:, 0, :] = force_x
+        states.wheel_forces_transformed_force2vehicle_sys[:, 1, :] = force_y
+
+        final_ratio = (parameters.gear_ratio[members, states.gear] * parameters.differential_ratio)[:, None]
+        wheel_inertia = parameters.tire_inertia + parameters.gearbox_inertia[:, None] * final_ratio ** 2 + (parameters.driveshaft_inertia * parameters.differential_ratio ** 2)[:, None]
+        states.pho_r_2dot = (states.powertrain_net_torque - states.fx * parameters.dynamic_radius - parameters.rolling_resistance_coefficient[:, None] * states.wheel_load_z) / wheel_inertia
+        states.wheel_w_vel = states.wheel_w_vel + (states.pho_r_2dot * parameters.time_step)  # rad/s
+        stopped = states.wheel_w_vel <= 0.0
+        states.wheel_w_vel[stopped] = 0.0
+        states.pho_r_2dot[stopped] = 0.0
+
+        return states
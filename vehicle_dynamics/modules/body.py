@@ -14,28 +14,39 @@ from vehicle_dynamics.utils.import_data_CM import import_data_CM
 from vehicle_dynamics.utils.LocalLogger import LocalLogger
 from vehicle_dynamics.structures.OutputStates import OutputStates
 from vehicle_dynamics.structures.Manoeuvre import Manoeuvre
-from vehicle_dynamics.utils.plot_function import plot_function
+from vehicle_dynamics.modules.road import ContactPoints
 
 import numpy as np
 import logging
 from copy import copy
-import yaml
 
 
 class Body():
-    def __init__(self, static_parameters, logger: logging.Logger):
+    """
+        road: height map of the road (modules/road.py TiledHeightMap, or any object with
+        heights(xs, ys) of lists of points), read under the four wheels every tick; None is a flat road.
+    """
+
+    def __init__(self, static_parameters, logger: logging.Logger, road=None):
         self.static_parameters = static_parameters
         self.logger = logger
+        self.road_map = road
+        self.contact_points = ContactPoints(static_parameters)
 
     def access_z_road(self, x, y):
-        # TODO implement topography
-        z = 0.
-        return z
+        if self.road_map is None:
+            return 0.
+        return self.road_map.heights([x], [y])[0]
 
     def road(self, current_state):
-        for k in range(4):
-            # displacement.zs[k][2] = self.access_z_road(self.displacement.zs[k][0],self.displacement.zs[k][1])
-            current_state.displacement.road[k] = 0.
+        if self.road_map is None:
+            for k in range(4):
+                current_state.displacement.road[k] = 0.
+            return current_state
+
+        x_a = current_state.x_a
+        xs, ys = self.contact_points(x_a.x, x_a.y, x_a.sin_yaw, x_a.cos_yaw)
+        current_state.displacement.road[:] = self.road_map.heights(xs, ys)
 
         return current_state 
 
@@ -82,7 +93,7 @@ class Body():
 
         sum_f_wheel = np.sum(current_state.x_rf.wheel_forces_transformed_force2vehicle_sys, axis=1)
 
-        current_state = self.road(current_state)  # placeholder to consider road status
+        current_state = self.road(current_state)
 
         # x-position from Vehicle CoG to the front axle [m]
         long_f = self.static_parameters.body.lf
@@ -208,6 +219,7 @@ class Body():
 
 
 def main(static_parameters, current_state, data, logger, savefig=False):
+    from vehicle_dynamics.utils.plot_function import plot_function
     import yaml
     from tqdm import tqdm
 
@@ -251,15 +263,14 @@ def main(static_parameters, current_state, data, logger, savefig=False):
 
 
 if __name__ == '__main__':
-    import pickle
+    from vehicle_dynamics.utils.columnar_data import open_data
     test_function = Body
     function_name = test_function.__name__
     logger = LocalLogger(function_name).logger
     logger.setLevel('INFO')
 
     PATH_TO_DATA = "../../example_data/Braking.pickle"
-    with open(PATH_TO_DATA,"rb")as handle:
-        data=pickle.load(handle)
+    data = open_data(PATH_TO_DATA)
 
     from vehicle_dynamics.structures.StateVector import StateVector
     from vehicle_dynamics.utils.StaticParameters import StaticParameters
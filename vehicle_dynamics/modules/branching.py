@@ -0,0 +1,220 @@
+"""
+Vehicle Dynamic Model - Scenario Branching
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from vehicle_dynamics.structures.Manoeuvre import Manoeuvre
+from vehicle_dynamics.structures.OutputRecorder import OutputRecorder
+from vehicle_dynamics.structures.CurrentStates import CurrentStates
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+import numpy as np
+
+Segment = namedtuple('Segment', 'parent start rows error')
+""" ticks [start, start + len(rows)) of a branch, continuing the segment parent (None at the root) """
+
+
+def _inputs(manoeuvre):
+    """ (T, 3) throttle, brake, steering array of a manoeuvre, the values VehicleDynamics.tick receives """
+    points = len(manoeuvre)
+    return np.stack([np.asarray(manoeuvre.throttle[:points], dtype=float), np.asarray(manoeuvre.brake[:points], dtype=float),
+                     np.asarray(manoeuvre.steering[:points], dtype=float)], axis=1)
+
+
+def common_prefix(inputs, members, start):
+    """ end of the ticks from start on where every member has the same inputs """
+    end = min(len(inputs[member]) for member in members)
+    reference = inputs[members[0]][start:end]
+    for member in members[1:]:
+        differs = np.any(inputs[member][start:end] != reference, axis=1)
+        if differs.any():
+            end = start + int(np.argmax(differs))
+            reference = reference[:end - start]
+    return end
+
+
+class _Explorer(object):
+    """ depth first simulation of one (sub)tree with one VehicleDynamics, forked by checkpoint/restore """
+
+    def __init__(self, vehicle_dynamics, inputs, time):
+        self.vehicle_dynamics = vehicle_dynamics
+        self.inputs = inputs
+        self.time = time
+        self.segments = []
+        self.leaves = {}
+
+    def explore(self, checkpoint, members, start, parent, pool=None):
+        end = common_prefix(self.inputs, members, start)
+        if end > start:
+            self.vehicle_dynamics.restore(checkpoint)
+            ticks = self.inputs[members[0]][start:end]
+            manoeuvre = Manoeuvre(ticks[:, 2], ticks[:, 0], ticks[:, 1], self.time[members[0]][start:end])
+            output_states, ran, error = self.vehicle_dynamics.simulate(manoeuvre, recorder=OutputRecorder(end - start), on_error="truncate")
+            self.segments.append(Segment(parent, start, output_states.rows.copy(), None if error is None else str(error)))
+            parent = len(self.segments) - 1
+            if error is not None:
+                self.leaves.update(dict.fromkeys(members, parent))
+                return
+            checkpoint = self.vehicle_dynamics.checkpoint()
+        branches = {}
+        for member in members:
+            if len(self.inputs[member]) == end:
+                self.leaves[member] = parent
+            else:
+                branches.setdefault(self.inputs[member][end].tobytes(), []).append(member)
+        if pool is None or len(branches) < 2:
+            for branch in branches.values():
+                self.explore(checkpoint, branch, end, parent, pool)
+            return
+        futures = [pool.submit(_explore_branch, checkpoint, {member: self.inputs[member] for member in branch},
+                               {member: self.time[member] for member in branch}, end) for branch in branches.values()]
+        for future in futures:
+            self.merge(future.result(), parent)
+
+    def merge(self, explored, parent):
+        """ appends the segments and leaves of a subtree explored by a worker below parent """
+        segments, leaves = explored
+        offset = len(self.segments)
+        for segment in segments:
+            self.segments.append(segment._replace(parent=parent if segment.parent is None else segment.parent + offset))
+        self.leaves.update({member: parent if leaf is None else leaf + offset for member, leaf in leaves.items()})
+
+
+# VehicleDynamics arguments of the worker processes, set once by the pool initializer
+_VEHICLE_DYNAMICS_ARGUMENTS = None
+
+
+def _set_vehicle_dynamics_arguments(arguments):
+    global _VEHICLE_DYNAMICS_ARGUMENTS
+    _VEHICLE_DYNAMICS_ARGUMENTS = arguments
+
+
+def _new_vehicle_dynamics(arguments):
+    from vehicle_dynamics.VehicleDynamics import VehicleDynamics
+    vehicle_dynamics = VehicleDynamics(**deepcopy(arguments))
+    vehicle_dynamics.logger.setLevel("WARNING")
+    return vehicle_dynamics
+
+
+def _explore_branch(checkpoint, inputs, time, start):
+    explorer = _Explorer(_new_vehicle_dynamics(_VEHICLE_DYNAMICS_ARGUMENTS), inputs, time)
+    explorer.explore(checkpoint, list(inputs), start, None)
+    return explorer.segments, explorer.leaves
+
+
+class BranchResult(object):
+    """
+        Outputs of a BranchingRunner.run(): a tree of segments, each manoeuvre ending at a leaf.
+        The rows of a shared prefix are stored once and only copied by outputs(i).
+
+        ticks_simulated is the number of ticks actually simulated (the size of the tree),
+        ticks_total the sum of the manoeuvre lengths.
+    """
+
+    def __init__(self, segments, leaves, lengths):
+        super(BranchResult, self).__init__()
+        self.segments = segments
+        self.leaves = leaves
+        self.lengths = lengths
+        self.ticks_simulated = sum(len(segment.rows) for segment in segments)
+        self.ticks_total = sum(lengths)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def path(self, member):
+        """ segments from the root to the leaf of manoeuvre member """
+        path = []
+        segment = self.leaves[member]
+        while segment is not None:
+            path.append(self.segments[segment])
+            segment = self.segments[segment].parent
+        return path[::-1]
+
+    def outputs(self, member):
+        """ OutputRecorder of manoeuvre member, shorter than the manoeuvre if it stopped with an error """
+        rows = [segment.rows for segment in self.path(member)]
+        return OutputRecorder.from_rows(np.concatenate(rows) if rows else np.zeros((0, CurrentStates.LAYOUT.size)))
+
+    def error(self, member):
+        path = self.path(member)
+        return path[-1].error if path else None
+
+
+class BranchingRunner(object):
+    """
+        Simulates a set of manoeuvres that share prefixes as a tree: the ticks common to several
+        manoeuvres are simulated once, then the state is forked with VehicleDynamics.checkpoint()
+        and each branch continues from it, so the cost grows with the size of the scenario tree
+        instead of the sum of the manoeuvre lengths. Two manoeuvres share a tick when their
+        throttle, brake and steering are equal there and at every tick before.
+
+        With workers > 1 the branches of the first divergence run in a process pool, each
+        subtree on its own VehicleDynamics.
+
+        Required Arguments:
+            1. vehicle_dynamics_arguments: keyword arguments of VehicleDynamics (initial_state,
+               initial_gear, frequency, car_parameters_path, ...), every simulator is built from them
+            2. workers: number of processes, 1 runs everything in this process, None for os.cpu_count()
+    """
+
+    def __init__(self, workers=1, **vehicle_dynamics_arguments):
+        super(BranchingRunner, self).__init__()
+        self.workers = workers
+        self.vehicle_dynamics_arguments = vehicle_dynamics_arguments
+
+    def run(self, manoeuvres):
+        """ BranchResult of the manoeuvres, outputs(i) being the run of manoeuvres[i] """
+        if not manoeuvres:
+            raise ValueError("no manoeuvres to run")
+        inputs = {member: _inputs(manoeuvre) for member, manoeuvre in enumerate(manoeuvres)}
+        time = {member: np.asarray(manoeuvre.time, dtype=float) for member, manoeuvre in enumerate(manoeuvres)}
+        vehicle_dynamics = _new_vehicle_dynamics(self.vehicle_dynamics_arguments)
+        explorer = _Explorer(vehicle_dynamics, inputs, time)
+        if self.workers == 1:
+            explorer.explore(vehicle_dynamics.checkpoint(), list(inputs), 0, None)
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_set_vehicle_dynamics_arguments,
+                                     initargs=(self.vehicle_dynamics_arguments,)) as pool:
+                explorer.explore(vehicle_dynamics.checkpoint(), list(inputs), 0, None, pool)
+        return BranchResult(explorer.segments, explorer.leaves, [len(member_inputs) for member_inputs in inputs.values()])
+
+
+def main(data, logger, variants=8):
+    """ the Braking example with its braking phase replaced by variants of brake pressure and steering after 4.5 s """
+    import time
+    from vehicle_dynamics.structures.StateVector import StateVector
+
+    frequency = 1000
+    split = int(4.5 * frequency)
+    steering, throttle, brake, time_stamps = (np.asarray(data[key], dtype=float) for key in ("steering", "throttle", "brake", "time"))
+    manoeuvres = []
+    for variant in range(variants):
+        branch_steering, branch_throttle, branch_brake = steering.copy(), throttle.copy(), brake.copy()
+        branch_brake[split:] = brake[split:] * (0.5 + variant / variants)
+        branch_steering[split:] = steering[split:] + 0.002 * (variant % 3)
+        manoeuvres.append(Manoeuvre(branch_steering, branch_throttle, branch_brake, time_stamps))
+
+    initial_state = StateVector(x=data["Rel_pos_x"][0], y=data["Rel_pos_y"][0], vx=data["Velocity_X"][0], yaw=data["Yaw"][0])
+    runner = BranchingRunner(initial_state=initial_state, initial_gear=1, frequency=frequency, car_parameters_path="../../bmw_m8.yaml", validation="off")
+    start = time.perf_counter()
+    result = runner.run(manoeuvres)
+    logger.info(f"{len(result)} manoeuvres, {result.ticks_simulated} ticks simulated instead of {result.ticks_total}, {time.perf_counter() - start:.2f} s")
+    for member in range(len(result)):
+        outputs = result.outputs(member)
+        logger.info(f"variant {member}: final x {outputs.x_a.x[-1]:.2f} m, y {outputs.x_a.y[-1]:.2f} m, vx {outputs.x_a.vx[-1]:.2f} m/s, error {result.error(member)}")
+
+
+if __name__ == '__main__':
+    from vehicle_dynamics.utils.columnar_data import open_data
+    from vehicle_dynamics.utils.LocalLogger import LocalLogger
+    logger = LocalLogger("branching").logger
+    logger.setLevel('INFO')
+
+    PATH_TO_DATA = "../../example_data/Braking.pickle"
+    data = open_data(PATH_TO_DATA)
+    main(data, logger)
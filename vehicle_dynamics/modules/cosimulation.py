@@ -0,0 +1,329 @@
+"""
+Vehicle Dynamic Model - Co-Simulation Server
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Serves VehicleDynamics instances to another process over a local TCP or Unix socket, so a
+scenario engine can drive the model without embedding Python:
+
+    python cosimulation.py --unix /tmp/vehicle_dynamics.sock
+    python cosimulation.py --port 5555
+
+Every message, in both directions, is a MESSAGE_HEADER (1 byte opcode or status, 4 bytes payload
+length, little endian) followed by the payload:
+
+    opcode      request payload                                 response payload
+    CREATE      JSON VehicleDynamics arguments (initial_state   vehicle_id, row size (2 x uint32)
+                as a dict of StateVector fields)
+    RESET       vehicle_id (uint32)                             empty
+    STEP        N x STEP_COMMAND (vehicle_id uint32, throttle,  N, row size (2 x uint32) and the
+                brake, steering float64), packed                N x row size float64 states
+    CHECKPOINT  vehicle_id                                      VehicleDynamics.checkpoint() bytes
+    RESTORE     vehicle_id + checkpoint bytes                   empty
+    REMOVE      vehicle_id                                      empty
+    LAYOUT      empty                                           JSON names of the state row columns
+
+The state row of a vehicle is its CurrentStates buffer after the tick (CurrentStates.LAYOUT.names()).
+The commands of a STEP are run in order, a vehicle may appear several times. A failing request
+answers status ERROR with the message as UTF-8; the commands of a STEP before the failing one stay
+applied.
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from vehicle_dynamics.structures.CurrentStates import CurrentStates
+from vehicle_dynamics.utils.LocalLogger import LocalLogger
+
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import threading
+import numpy as np
+
+MESSAGE_HEADER = struct.Struct("<BI")
+VEHICLE_ID = struct.Struct("<I")
+STEP_HEADER = struct.Struct("<II")
+STEP_COMMAND = np.dtype([("vehicle_id", "<u4"), ("throttle", "<f8"), ("brake", "<f8"), ("steering", "<f8")])
+
+CREATE, RESET, STEP, CHECKPOINT, RESTORE, REMOVE, LAYOUT = range(1, 8)
+OK, ERROR = 0, 1
+
+
+class CoSimulation(object):
+    """
+        The vehicles of a server and the handling of one request, independent of the transport.
+
+        Required Arguments:
+            1. vehicle_dynamics_arguments: defaults of the VehicleDynamics arguments of CREATE,
+               e.g. car_parameters_path
+    """
+
+    def __init__(self, **vehicle_dynamics_arguments):
+        super(CoSimulation, self).__init__()
+        self.defaults = vehicle_dynamics_arguments
+        self.vehicles = {}
+        self.initial_checkpoints = {}
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.logger = LocalLogger("cosimulation").logger
+        self.handlers = {CREATE: self.create, RESET: self.reset, STEP: self.step, CHECKPOINT: self.checkpoint,
+                         RESTORE: self.restore, REMOVE: self.remove, LAYOUT: self.layout}
+
+    def handle(self, opcode, payload):
+        """ (status, response payload) of one request """
+        try:
+            if opcode not in self.handlers:
+                raise ValueError(f"unknown opcode {opcode}")
+            with self.lock:
+                return OK, self.handlers[opcode](memoryview(payload))
+        except (ValueError, TypeError, KeyError, OSError, struct.error) as error:
+            return ERROR, f"{type(error).__name__}: {error}".encode()
+        except Exception as error:
+            # a bad request must not cost the client its connection, whatever it raises
+            self.logger.exception(f"request {opcode} failed")
+            return ERROR, f"{type(error).__name__}: {error}".encode()
+
+    def vehicle(self, payload):
+        if len(payload) < VEHICLE_ID.size:
+            raise ValueError(f"payload of {len(payload)} bytes, expected a vehicle_id of {VEHICLE_ID.size} bytes")
+        vehicle_id, = VEHICLE_ID.unpack_from(payload)
+        if vehicle_id not in self.vehicles:
+            raise ValueError(f"no vehicle {vehicle_id}")
+        return vehicle_id, self.vehicles[vehicle_id]
+
+    def create(self, payload):
+        from vehicle_dynamics.VehicleDynamics import VehicleDynamics
+        from vehicle_dynamics.structures.StateVector import StateVector
+
+        arguments = dict(self.defaults, **json.loads(bytes(payload) or b"{}"))
+        if isinstance(arguments.get("initial_state"), dict):
+            arguments["initial_state"] = StateVector(**arguments["initial_state"])
+        vehicle_dynamics = VehicleDynamics(**arguments)
+        vehicle_dynamics.logger.setLevel("WARNING")
+        vehicle_id = self.next_id
+        self.next_id += 1
+        self.vehicles[vehicle_id] = vehicle_dynamics
+        self.initial_checkpoints[vehicle_id] = vehicle_dynamics.checkpoint()
+        return STEP_HEADER.pack(vehicle_id, vehicle_dynamics.current_states.buffer.size)
+
+    def reset(self, payload):
+        vehicle_id, vehicle_dynamics = self.vehicle(payload)
+        vehicle_dynamics.restore(self.initial_checkpoints[vehicle_id])
+        return b""
+
+    def step(self, payload):
+        if len(payload) % STEP_COMMAND.itemsize:
+            raise ValueError(f"STEP payload of {len(payload)} bytes is not a multiple of {STEP_COMMAND.itemsize}")
+        commands = np.frombuffer(payload, dtype=STEP_COMMAND)
+        states = np.empty((len(commands), CurrentStates.LAYOUT.size), dtype="<f8")
+        vehicles = self.vehicles
+        for row, (vehicle_id, throttle, brake, steering) in enumerate(commands.tolist()):
+            if vehicle_id not in vehicles:
+                raise ValueError(f"no vehicle {vehicle_id}")
+            try:
+                states[row] = vehicles[vehicle_id].tick(throttle, brake, steering).buffer
+            except ValueError as error:
+                raise ValueError(f"vehicle {vehicle_id}: {error}") from error
+        return STEP_HEADER.pack(*states.shape) + states.tobytes()
+
+    def checkpoint(self, payload):
+        return self.vehicle(payload)[1].checkpoint()
+
+    def restore(self, payload):
+        self.vehicle(payload)[1].restore(payload[VEHICLE_ID.size:])
+        return b""
+
+    def remove(self, payload):
+        vehicle_id, _ = self.vehicle(payload)
+        del self.vehicles[vehicle_id], self.initial_checkpoints[vehicle_id]
+        return b""
+
+    def layout(self, payload):
+        return json.dumps(CurrentStates.LAYOUT.names()).encode()
+
+
+def _receive(connection, size, buffer=None):
+    """ exactly size bytes from a socket """
+    buffer = bytearray(size) if buffer is None else buffer
+    view = memoryview(buffer)[:size]
+    while view:
+        received = connection.recv_into(view)
+        if received == 0:
+            raise ConnectionError("connection closed")
+        view = view[received:]
+    return buffer
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+
+    def setup(self):
+        if self.request.family != getattr(socket, "AF_UNIX", None):
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        header = bytearray(MESSAGE_HEADER.size)
+        handle = self.server.cosimulation.handle
+        while True:
+            try:
+                opcode, size = MESSAGE_HEADER.unpack(_receive(self.request, MESSAGE_HEADER.size, header))
+                payload = _receive(self.request, size)
+            except ConnectionError:
+                return
+            status, response = handle(opcode, payload)
+            self.request.sendall(MESSAGE_HEADER.pack(status, len(response)) + response)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class CoSimulationServer(object):
+    """
+        Serves a CoSimulation on a local socket, one thread per connection (the requests are
+        run one at a time).
+
+        Required Arguments:
+            1. address: (host, port) for TCP, port 0 picks a free one, or the path of a Unix socket
+            2. vehicle_dynamics_arguments: defaults of the VehicleDynamics arguments of CREATE
+    """
+
+    def __init__(self, address, **vehicle_dynamics_arguments):
+        super(CoSimulationServer, self).__init__()
+        if isinstance(address, str):
+            if os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode):
+                os.unlink(address)
+            self.server = _UnixServer(address, _RequestHandler)
+        else:
+            self.server = _TCPServer(address, _RequestHandler)
+        self.server.cosimulation = self.cosimulation = CoSimulation(**vehicle_dynamics_arguments)
+        self.address = self.server.server_address
+        self.thread = None
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def start(self):
+        """ serves from a background thread """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        if self.thread is not None:
+            self.server.shutdown()
+            self.thread.join()
+        self.server.server_close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CoSimulationClient(object):
+    """
+        Python client of a CoSimulationServer, mostly as the reference of the protocol.
+        A response with status ERROR raises a ValueError with the message of the server.
+
+        Required Arguments:
+            1. address: (host, port) or the path of a Unix socket
+    """
+
+    def __init__(self, address):
+        super(CoSimulationClient, self).__init__()
+        if isinstance(address, str):
+            self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.connection.connect(address)
+        self.header = bytearray(MESSAGE_HEADER.size)
+
+    def request(self, opcode, payload=b""):
+        """ response payload of one request """
+        self.connection.sendall(MESSAGE_HEADER.pack(opcode, len(payload)) + payload)
+        status, size = MESSAGE_HEADER.unpack(_receive(self.connection, MESSAGE_HEADER.size, self.header))
+        response = _receive(self.connection, size)
+        if status != OK:
+            raise ValueError(response.decode())
+        return response
+
+    def create(self, **vehicle_dynamics_arguments):
+        """ vehicle_id of a new VehicleDynamics, initial_state given as a dict of StateVector fields """
+        vehicle_id, _ = STEP_HEADER.unpack(self.request(CREATE, json.dumps(vehicle_dynamics_arguments).encode()))
+        return vehicle_id
+
+    def reset(self, vehicle_id):
+        self.request(RESET, VEHICLE_ID.pack(vehicle_id))
+
+    def step(self, commands):
+        """
+            one tick of every command
+
+            Required Arguments:
+                1. commands: (vehicle_id, throttle, brake, steering) tuples or a STEP_COMMAND array
+
+            Returns: (N, row size) array of the states after each command
+        """
+        if not isinstance(commands, np.ndarray):
+            commands = np.array(commands, dtype=STEP_COMMAND)
+        response = self.request(STEP, commands.astype(STEP_COMMAND, copy=False).tobytes())
+        rows, size = STEP_HEADER.unpack_from(response)
+        return np.frombuffer(response, dtype="<f8", offset=STEP_HEADER.size).reshape(rows, size)
+
+    def checkpoint(self, vehicle_id):
+        return bytes(self.request(CHECKPOINT, VEHICLE_ID.pack(vehicle_id)))
+
+    def restore(self, vehicle_id, checkpoint):
+        self.request(RESTORE, VEHICLE_ID.pack(vehicle_id) + bytes(checkpoint))
+
+    def remove(self, vehicle_id):
+        self.request(REMOVE, VEHICLE_ID.pack(vehicle_id))
+
+    def layout(self):
+        """ names of the columns of the state rows """
+        return json.loads(bytes(self.request(LAYOUT)))
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="vehicle_dynamics co-simulation server")
+    parser.add_argument("--unix", help="path of the Unix socket to serve on")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--car-parameters", default="../../bmw_m8.yaml", help="default car_parameters_path of CREATE")
+    arguments = parser.parse_args()
+
+    address = arguments.unix if arguments.unix else (arguments.host, arguments.port)
+    server = CoSimulationServer(address, car_parameters_path=os.path.abspath(arguments.car_parameters))
+    print(f"serving on {server.address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+Vehicle Dynamic Model - Friction Map
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Position dependent road friction (wet patches, ice, puddles) as a scale of the peak friction D of
+the tire model, read under each of the four contact patches every tick:
+
+    FrictionMap     polygons with a friction scale on a default surface, in a uniform grid index
+    FrictionGrid    a gridded scale, written with road.write_height_map and memory mapped
+
+Both answer scale(x, y) for arrays of points and scales(xs, ys) for the few points of a tick.
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+import math
+
+import numpy as np
+
+from vehicle_dynamics.modules.road import TiledHeightMap
+
+
+class FrictionMap(object):
+    """
+        Friction patches on a road of friction scale default. A patch is a polygon, given as
+        ((x, y) vertices, scale), its scale above or below the default (dry patches on a wet
+        road as well as ice on a dry one); where patches overlap the lowest of their scales applies.
+
+        The patches are indexed by the cells of a uniform grid of cell_size metres their bounding
+        box overlaps, so a lookup only tests the patches of the cell of the point: its cost
+        depends on the patches around the point, not on the size of the map.
+
+        Required Arguments:
+            1. patches: iterable of (vertices, scale), vertices (K, 2) with K >= 3
+            2. cell_size: side of the index cells [m]
+            3. default: scale outside the patches
+    """
+
+    def __init__(self, patches, cell_size=10., default=1.):
+        super(FrictionMap, self).__init__()
+        if cell_size <= 0:
+            raise ValueError(f"cell_size must be positive, got {cell_size}")
+        self.cell_size = float(cell_size)
+        self.default = float(default)
+        self.polygons, self.scales_of_patches = [], []
+        index = {}
+        for number, (vertices, scale) in enumerate(patches):
+            vertices = np.asarray(vertices, dtype=float)
+            if vertices.ndim != 2 or vertices.shape[1] != 2 or len(vertices) < 3:
+                raise ValueError(f"patch {number}: vertices must be (K, 2) with K >= 3, got shape {vertices.shape}")
+            if scale < 0:
+                raise ValueError(f"patch {number}: the friction scale must not be negative, got {scale}")
+            self.polygons.append((vertices[:, 0].tolist(), vertices[:, 1].tolist()))
+            self.scales_of_patches.append(float(scale))
+            (x_min, y_min), (x_max, y_max) = self._cell(*vertices.min(axis=0)), self._cell(*vertices.max(axis=0))
+            for cell_x in range(x_min, x_max + 1):
+                for cell_y in range(y_min, y_max + 1):
+                    index.setdefault((cell_x, cell_y), []).append(number)
+        self.index = {cell: tuple(numbers) for cell, numbers in index.items()}
+
+    def _cell(self, x, y):
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    @staticmethod
+    def _inside(x, y, polygon):
+        """ even-odd rule of a point against a polygon of vertex lists """
+        xs, ys = polygon
+        inside = False
+        x_j, y_j = xs[-1], ys[-1]
+        for x_i, y_i in zip(xs, ys):
+            if (y_i > y) != (y_j > y) and x < (x_j - x_i) * (y - y_i) / (y_j - y_i) + x_i:
+                inside = not inside
+            x_j, y_j = x_i, y_i
+        return inside
+
+    @staticmethod
+    def _inside_array(x, y, polygon):
+        """ _inside for arrays of points """
+        xs, ys = polygon
+        inside = np.zeros(x.shape, dtype=bool)
+        x_j, y_j = xs[-1], ys[-1]
+        for x_i, y_i in zip(xs, ys):
+            if y_i != y_j:
+                crossing = ((y_i > y) != (y_j > y)) & (x < (x_j - x_i) * (y - y_i) / (y_j - y_i) + x_i)
+                inside ^= crossing
+            x_j, y_j = x_i, y_i
+        return inside
+
+    def scales(self, xs, ys):
+        """ friction scale of lists of floats as a list, the path of the 4 contact points of a tick """
+        index, cell_size = self.index, self.cell_size
+        scales = []
+        for x, y in zip(xs, ys):
+            scale = math.inf
+            for number in index.get((math.floor(x / cell_size), math.floor(y / cell_size)), ()):
+                if self.scales_of_patches[number] < scale and self._inside(x, y, self.polygons[number]):
+                    scale = self.scales_of_patches[number]
+            scales.append(self.default if scale == math.inf else scale)
+        return scales
+
+    def scale(self, x, y):
+        """ friction scale at the points (x, y), same shape as x and y """
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        flat_x, flat_y = x.reshape(-1), y.reshape(-1)
+        scales = np.full(flat_x.shape, np.inf)
+        cells = np.stack([np.floor(flat_x / self.cell_size), np.floor(flat_y / self.cell_size)], axis=1).astype(np.int64)
+        unique_cells, cell_of_point = np.unique(cells, axis=0, return_inverse=True)
+        cell_of_point = cell_of_point.reshape(-1)
+        for number, cell in enumerate(unique_cells.tolist()):
+            patches = self.index.get(tuple(cell))
+            if not patches:
+                continue
+            points = np.flatnonzero(cell_of_point == number)
+            for patch in patches:
+                inside = self._inside_array(flat_x[points], flat_y[points], self.polygons[patch])
+                scales[points[inside]] = np.minimum(scales[points[inside]], self.scales_of_patches[patch])
+        scales[scales == np.inf] = self.default
+        return scales.reshape(x.shape)
+
+
+class FrictionGrid(TiledHeightMap):
+    """
+        Gridded friction scale, written with road.write_height_map(directory, scales, resolution, ...)
+        and read like a height map: bilinear, memory mapped tiles behind a LRU cache, the nearest
+        edge outside the grid.
+    """
+
+    def scale(self, x, y):
+        """ friction scale at the points (x, y), same shape as x and y """
+        return self.height(x, y)
+
+    def scales(self, xs, ys):
+        """ friction scale of lists of floats as a list """
+        return self.heights(xs, ys)
+
+
+def main(data, logger):
+    """ Braking on a dry road and through a wet stretch and an ice patch (FrictionMap) """
+    import time
+    from vehicle_dynamics.VehicleDynamics import VehicleDynamics
+    from vehicle_dynamics.structures.Manoeuvre import Manoeuvre
+    from vehicle_dynamics.structures.StateVector import StateVector
+
+    x_data, y_data = np.asarray(data["Rel_pos_x"], dtype=float), np.asarray(data["Rel_pos_y"], dtype=float)
+    # a wet band across the route at a third of it and an ice patch around its middle
+    third, middle = len(x_data) // 3, len(x_data) // 2
+    x_wet, y_wet, x_ice, y_ice = float(x_data[third]), float(y_data[third]), float(x_data[middle]), float(y_data[middle])
+    friction = FrictionMap([([(x_wet - 5, y_wet - 50), (x_wet + 5, y_wet - 50), (x_wet + 5, y_wet + 50), (x_wet - 5, y_wet + 50)], 0.6),
+                            ([(x_ice + 3 * math.cos(a), y_ice + 3 * math.sin(a)) for a in np.linspace(0, 2 * math.pi, 24, endpoint=False)], 0.15)],
+                           cell_size=5.)
+
+    manoeuvre = Manoeuvre(data["steering"], data["throttle"], data["brake"], data["time"])
+    outputs = {}
+    for name, friction_map in (("dry", None), ("wet+ice", friction)):
+        initial_state = StateVector(x=data["Rel_pos_x"][0], y=data["Rel_pos_y"][0], vx=data["Velocity_X"][0], yaw=data["Yaw"][0])
+        vehicle_dynamics = VehicleDynamics(initial_state=initial_state, initial_gear=1, car_parameters_path="../../bmw_m8.yaml", friction=friction_map)
+        vehicle_dynamics.logger.setLevel("WARNING")
+        start = time.perf_counter()
+        outputs[name] = vehicle_dynamics.simulate(manoeuvre).output_states
+        x_a = outputs[name].x_a
+        logger.info(f"{name:8s} {time.perf_counter() - start:.2f} s, travelled {math.hypot(x_a.x[-1] - x_a.x[0], x_a.y[-1] - x_a.y[0]):.2f} m, "
+                    f"peak vx {x_a.vx.max():.3f} m/s")
+
+    start = time.perf_counter()
+    for _ in range(10000):
+        friction.scales([x_ice, x_ice + 1, x_wet, 0.], [y_ice, y_ice, y_wet, 0.])
+    logger.info(f"lookup of 4 contact patches {(time.perf_counter() - start) / 10000 * 1e6:.1f} us")
+    return friction, outputs
+
+
+if __name__ == '__main__':
+    from vehicle_dynamics.utils.columnar_data import open_data
+    from vehicle_dynamics.utils.LocalLogger import LocalLogger
+    logger = LocalLogger("friction").logger
+    logger.setLevel('INFO')
+
+    PATH_TO_DATA = "../../example_data/Braking.pickle"
+    data = open_data(PATH_TO_DATA)
+    main(data, logger)
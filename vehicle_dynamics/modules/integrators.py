@@ -0,0 +1,211 @@
+"""
+Vehicle Dynamic Model - Integrators
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+import numpy as np
+
+
+class ExplicitRungeKutta(object):
+    """
+        Explicit Runge-Kutta step of a model exposing derivatives(y, inputs), given by its
+        Butcher tableau (a, b). The inputs are held during the step.
+
+        Required Arguments:
+            1. model: VehicleModel (or any object with derivatives(y, inputs))
+            2. y: state at the beginning of the step
+            3. time_step
+            4. inputs: held inputs of the model
+
+        Returns: state at the end of the step
+    """
+    a = ()
+    b = (1.,)
+
+    def step(self, model, y, time_step, inputs):
+        stages = [model.derivatives(y, inputs)]
+        for row in self.a:
+            stages.append(model.derivatives(y + time_step * sum(weight * k for weight, k in zip(row, stages)), inputs))
+        return y + time_step * sum(weight * k for weight, k in zip(self.b, stages))
+
+
+class ExplicitEuler(ExplicitRungeKutta):
+    """ first order, one evaluation per step """
+    a = ()
+    b = (1.,)
+
+
+class Heun(ExplicitRungeKutta):
+    """ second order (explicit trapezoidal rule), two evaluations per step """
+    a = ((1.,),)
+    b = (1/2, 1/2)
+
+
+class RK4(ExplicitRungeKutta):
+    """ classic fourth order Runge-Kutta, four evaluations per step """
+    a = ((1/2,), (0., 1/2), (0., 0., 1.))
+    b = (1/6, 1/3, 1/3, 1/6)
+
+
+class SemiImplicitEuler(object):
+    """
+        Symplectic (semi-implicit) Euler: the velocities are advanced first, then the positions
+        with the new velocities, through model.kinematics(y). One evaluation per step, first order,
+        but it keeps the undamped oscillations (suspension, roll, pitch) bounded at steps where
+        explicit Euler lets them grow.
+    """
+
+    def step(self, model, y, time_step, inputs):
+        y_next = y.copy()
+        y_next[model.VELOCITIES] += time_step * model.derivatives(y, inputs)[model.VELOCITIES]
+        y_next[model.POSITIONS] += time_step * model.kinematics(y_next)
+        return y_next
+
+
+INTEGRATORS = {"explicit_euler": ExplicitEuler,
+               "semi_implicit_euler": SemiImplicitEuler,
+               "heun": Heun,
+               "rk4": RK4}
+
+
+def get_integrator(integrator):
+    """ returns an integrator instance from its name in INTEGRATORS (or the instance itself) """
+    if isinstance(integrator, str):
+        if integrator not in INTEGRATORS:
+            raise ValueError(f"integrator must be 'euler' or one of {sorted(INTEGRATORS)}, got {integrator}")
+        return INTEGRATORS[integrator]()
+    return integrator
+
+
+def resample(manoeuvre, data_frequency, frequency):
+    """ manoeuvre sampled at frequency from one recorded at data_frequency (zero-order hold) """
+    from vehicle_dynamics.structures.Manoeuvre import Manoeuvre
+    points = len(manoeuvre) * frequency // data_frequency
+    index = np.arange(points) * data_frequency // frequency
+    return Manoeuvre(np.asarray(manoeuvre.steering)[index], np.asarray(manoeuvre.throttle)[index],
+                     np.asarray(manoeuvre.brake)[index], np.arange(1, points + 1) / frequency)
+
+
+class PowertrainReplay(object):
+    """
+        Stands in for Powertrain and replays a recorded wheel torque and gear, one entry per tick,
+        so runs at different frequencies see the same gear shifts. Used by accuracy_study to
+        separate the integration error from the timing of the discrete powertrain events.
+    """
+
+    def __init__(self, powertrain_net_torque, gear):
+        super(PowertrainReplay, self).__init__()
+        self.powertrain_net_torque = powertrain_net_torque
+        self.gear = gear
+        self.tick = 0
+
+    def powertrain(self, current_state, throttle: float, brake: float):
+        current_state.gear = self.gear[self.tick]
+        current_state.powertrain_net_torque = self.powertrain_net_torque[self.tick]
+        self.tick += 1
+        return current_state
+
+
+def accuracy_study(car_parameters_path, initial_state, initial_gear, manoeuvre, data_frequency=1000,
+                   runs=(("euler", 1000),), reference=("rk4", 4000), sample_frequency=10, replay=False, logger=None):
+    """
+        Error of each (integrator, frequency) in runs against a reference run, on the states sampled
+        at sample_frequency. The manoeuvre is resampled to every frequency with resample().
+
+        With replay the powertrain is not simulated: every run is driven by the wheel torque of the
+        reference run averaged over its steps and by the gear of the reference at the start of its
+        steps (PowertrainReplay), so the error is the one of the integrator alone. The frequency
+        of the reference must then be a multiple of every frequency of runs.
+
+        Required Arguments:
+            1. car_parameters_path
+            2. initial_state: StateVector
+            3. initial_gear
+            4. manoeuvre: Manoeuvre recorded at data_frequency
+
+        Returns: list of dicts with integrator, frequency, steps, elapsed (s) and the RMS errors of the
+            position (m), vx (m/s) and yaw rate (rad/s)
+    """
+    from copy import copy
+    import time
+    from vehicle_dynamics.VehicleDynamics import VehicleDynamics
+
+    def run(integrator, frequency, powertrain=None):
+        vehicle_dynamics = VehicleDynamics(initial_state=copy(initial_state), initial_gear=initial_gear, frequency=frequency,
+                                           car_parameters_path=car_parameters_path, integrator=integrator, validation="off")
+        if powertrain is not None:
+            vehicle_dynamics.powertrain = powertrain
+        start = time.perf_counter()
+        output_states, ticks, error = vehicle_dynamics.simulate(resample(manoeuvre, data_frequency, frequency), on_error="raise")
+        elapsed = time.perf_counter() - start
+        sample = slice(frequency // sample_frequency - 1, None, frequency // sample_frequency)
+        x_a = output_states.x_a
+        states = np.stack([x_a.x[sample], x_a.y[sample], x_a.vx[sample], x_a.wz[sample]], axis=1)
+        return states, ticks, elapsed, output_states
+
+    reference_states, reference_ticks, _, reference_outputs = run(*reference)
+    results = []
+    for integrator, frequency in runs:
+        powertrain = None
+        if replay:
+            if reference[1] % frequency:
+                raise ValueError(f"the reference frequency {reference[1]} is not a multiple of {frequency}")
+            steps = reference[1] // frequency
+            ticks = reference_ticks // steps * steps
+            powertrain = PowertrainReplay(reference_outputs.powertrain_net_torque[:ticks].reshape(-1, steps, 4).mean(axis=1),
+                                          reference_outputs.gear[:ticks:steps])
+        states, ticks, elapsed, _ = run(integrator, frequency, powertrain)
+        points = min(len(states), len(reference_states))
+        error = states[:points] - reference_states[:points]
+        result = {"integrator": integrator, "frequency": frequency, "steps": ticks, "elapsed": elapsed,
+                  "position": float(np.sqrt(np.mean(error[:, 0] ** 2 + error[:, 1] ** 2))),
+                  "vx": float(np.sqrt(np.mean(error[:, 2] ** 2))),
+                  "wz": float(np.sqrt(np.mean(error[:, 3] ** 2)))}
+        if logger is not None:
+            logger.info(f"{'replay' if replay else 'closed loop':>11} {integrator:>20} {frequency:>5} Hz  position {result['position']:.2e} m  "
+                        f"vx {result['vx']:.2e} m/s  wz {result['wz']:.2e} rad/s  {elapsed:.1f} s")
+        results.append(result)
+    return results
+
+
+def main(data, logger, savefig=False, fig_save_dir="../../figures"):
+    import matplotlib.pyplot as plt
+    from vehicle_dynamics.structures.Manoeuvre import Manoeuvre
+    from vehicle_dynamics.structures.StateVector import StateVector
+
+    manoeuvre = Manoeuvre(data["steering"], data["throttle"], data["brake"], data["time"])
+    initial_state = StateVector(x=data["Rel_pos_x"][0], y=data["Rel_pos_y"][0], vx=data["Velocity_X"][0], yaw=data["Yaw"][0])
+    runs = [("euler", frequency) for frequency in (100, 200, 500, 1000, 2000)]
+    runs += [(integrator, frequency) for integrator in INTEGRATORS for frequency in (20, 50, 100, 200, 500, 1000)]
+
+    results = {}
+    for replay, name in ((True, "Integrator Accuracy Replayed Powertrain"), (False, "Integrator Accuracy Closed Loop")):
+        results[replay] = accuracy_study("../../bmw_m8.yaml", initial_state, 1, manoeuvre, runs=runs, replay=replay, logger=logger)
+        figure, axes = plt.subplots(1, 3, figsize=(18, 6))
+        figure.suptitle(name)
+        for integrator in ["euler"] + list(INTEGRATORS):
+            curve = [result for result in results[replay] if result["integrator"] == integrator]
+            for axis, error, unit in zip(axes, ("position", "vx", "wz"), ("m", "m/s", "rad/s")):
+                axis.loglog([result["steps"] for result in curve], [result[error] for result in curve], marker="o", label=integrator)
+                axis.set_xlabel("Steps")
+                axis.set_ylabel(f"RMS {error} error ({unit})")
+                axis.grid(True, which="both")
+        axes[0].legend()
+        plt.tight_layout()
+        if savefig:
+            plt.savefig(fig_save_dir + "/" + name + ".png")
+    plt.show()
+    return results
+
+
+if __name__ == '__main__':
+    from vehicle_dynamics.utils.columnar_data import open_data
+    from vehicle_dynamics.utils.LocalLogger import LocalLogger
+    logger = LocalLogger("integrators").logger
+    logger.setLevel('INFO')
+
+    PATH_TO_DATA = "../../example_data/Braking.pickle"
+    data = open_data(PATH_TO_DATA)
+    main(data, logger)
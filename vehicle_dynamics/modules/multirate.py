@@ -0,0 +1,116 @@
+"""
+Vehicle Dynamic Model - Multi-Rate Scheduler
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from vehicle_dynamics.utils.StaticParameters import StaticParameters
+from vehicle_dynamics.utils.CurrentStates import CurrentStates
+from vehicle_dynamics.modules.powertrain import Powertrain
+from vehicle_dynamics.modules.wheels import Wheels
+from vehicle_dynamics.modules.body import Body
+from vehicle_dynamics.structures.OutputRecorder import OutputRecorder
+
+import logging
+import numpy as np
+
+SUBSYSTEMS = ("powertrain", "wheels")
+
+
+def check_substeps(substeps):
+    """ validates a {subsystem: steps per chassis step} dict, returns it with the missing subsystems at 1 """
+    unknown = set(substeps) - set(SUBSYSTEMS)
+    if unknown:
+        raise ValueError(f"substeps can only be given for {SUBSYSTEMS}, got {sorted(unknown)}")
+    substeps = {subsystem: substeps.get(subsystem, 1) for subsystem in SUBSYSTEMS}
+    for subsystem, steps in substeps.items():
+        if int(steps) != steps or steps < 1:
+            raise ValueError(f"substeps of {subsystem} must be a positive integer, got {steps}")
+    if substeps["wheels"] % substeps["powertrain"]:
+        raise ValueError(f"the wheel substeps ({substeps['wheels']}) must be a multiple of the powertrain substeps ({substeps['powertrain']})")
+    return {subsystem: int(steps) for subsystem, steps in substeps.items()}
+
+
+class MultiRate(object):
+    """
+        Advances Powertrain and Wheels several times inside each chassis step of Body.
+
+        The chassis (Body) runs at static_parameters.time_step, the wheel spin and tire loop
+        substeps["wheels"] times per chassis step and the powertrain substeps["powertrain"] times,
+        evenly spread between the wheel substeps (the wheel substeps must be a multiple of it).
+        During the substeps the chassis velocities and wheel loads are held; Body then
+        integrates the wheel forces averaged over the substeps, so the chassis receives the
+        impulse of the whole step instead of the forces of its last substep.
+
+        Required Arguments:
+            1. static_parameters
+            2. logger
+            3. substeps: dict subsystem -> steps per chassis step, "powertrain" and "wheels" (default 1)
+    """
+
+    def __init__(self, static_parameters: StaticParameters, logger: logging.Logger, substeps: dict, tire_model=None, road=None, friction=None):
+        super(MultiRate, self).__init__()
+        self.substeps = check_substeps(substeps)
+        self.wheel_steps = self.substeps["wheels"]
+        self.powertrain_interval = self.wheel_steps // self.substeps["powertrain"]
+        self.powertrain = Powertrain(static_parameters, logger, static_parameters.time_step / self.substeps["powertrain"])
+        self.wheels = Wheels(static_parameters, logger, static_parameters.time_step / self.wheel_steps, tire_model, friction)
+        self.body = Body(static_parameters, logger, road)
+
+    def step(self, current_state: CurrentStates, throttle: float, brake: float, steering_input: float):
+        wheel_forces = current_state.x_rf.wheel_forces_transformed_force2vehicle_sys
+        force_sum = np.zeros(wheel_forces.shape)
+        for substep in range(self.wheel_steps):
+            if substep % self.powertrain_interval == 0:
+                current_state = self.powertrain.powertrain(current_state, throttle, brake)
+            current_state = self.wheels.wheels(current_state, steering_input)
+            force_sum += wheel_forces
+        wheel_forces[...] = force_sum / self.wheel_steps
+        return self.body.body(current_state)
+
+
+def main(data, logger, frequencies=(200, 50, 20), substeps=(1, 2, 5, 10)):
+    """ chassis steps at frequencies with 1 to 10 wheel substeps against the 1000 Hz single rate run on Braking,
+    all driven by the powertrain torque of the 1000 Hz run (integrators.PowertrainReplay) """
+    from copy import copy
+    import time
+    from vehicle_dynamics.VehicleDynamics import VehicleDynamics
+    from vehicle_dynamics.structures.Manoeuvre import Manoeuvre
+    from vehicle_dynamics.structures.StateVector import StateVector
+    from vehicle_dynamics.modules.integrators import resample, PowertrainReplay
+
+    manoeuvre = Manoeuvre(data["steering"], data["throttle"], data["brake"], data["time"])
+    initial_state = StateVector(x=data["Rel_pos_x"][0], y=data["Rel_pos_y"][0], vx=data["Velocity_X"][0], yaw=data["Yaw"][0])
+
+    reference = VehicleDynamics(initial_state=copy(initial_state), initial_gear=1, frequency=1000, car_parameters_path="../../bmw_m8.yaml", validation="off")
+    reference_states, reference_ticks, _ = reference.simulate(manoeuvre)
+    reference_sample = slice(1000 // 10 - 1, None, 1000 // 10)
+    for frequency in frequencies:
+        steps = 1000 // frequency
+        ticks = reference_ticks // steps * steps
+        for wheel_steps in substeps:
+            vehicle_dynamics = VehicleDynamics(initial_state=copy(initial_state), initial_gear=1, frequency=frequency, car_parameters_path="../../bmw_m8.yaml",
+                                               validation="off", substeps={"wheels": wheel_steps})
+            vehicle_dynamics.powertrain = vehicle_dynamics.multirate.powertrain = PowertrainReplay(reference_states.powertrain_net_torque[:ticks].reshape(-1, steps, 4).mean(axis=1),
+                                                                                                   reference_states.gear[:ticks:steps])
+            start = time.perf_counter()
+            output_states, ticks_run, error = vehicle_dynamics.simulate(resample(manoeuvre, 1000, frequency), recorder=OutputRecorder(ticks // steps))
+            elapsed = time.perf_counter() - start
+            sample = slice(frequency // 10 - 1, None, frequency // 10)
+            points = min(len(output_states.x_a.vx[sample]), len(reference_states.x_a.vx[reference_sample]))
+            vx_error = output_states.x_a.vx[sample][:points] - reference_states.x_a.vx[reference_sample][:points]
+            wheel_error = output_states.wheel_w_vel[sample][:points] - reference_states.wheel_w_vel[reference_sample][:points]
+            logger.info(f"chassis {frequency:>4} Hz, wheels x{wheel_steps:<3} ticks {ticks_run:>5}, error {error}, RMS vx error {np.sqrt(np.mean(vx_error ** 2)):.2e} m/s, "
+                        f"RMS wheel speed error {np.sqrt(np.mean(wheel_error ** 2)):.2e} rad/s, {elapsed:.2f} s")
+
+
+if __name__ == '__main__':
+    from vehicle_dynamics.utils.columnar_data import open_data
+    from vehicle_dynamics.utils.LocalLogger import LocalLogger
+    logger = LocalLogger("multirate").logger
+    logger.setLevel('INFO')
+
+    PATH_TO_DATA = "../../example_data/Braking.pickle"
+    data = open_data(PATH_TO_DATA)
+    main(data, logger)
@@ -2,17 +2,23 @@ from vehicle_dynamics.utils.StaticParameters import StaticParameters
 from vehicle_dynamics.utils.LocalLogger import LocalLogger
 from vehicle_dynamics.utils.CurrentStates import CurrentStates
 from vehicle_dynamics.utils.import_data_CM import import_data_CM
-from vehicle_dynamics.utils.plot_function import plot_function
+from vehicle_dynamics.utils.LookupTable import LookupTable
 from vehicle_dynamics.utils.StaticParameters import StaticParameters
 
 from vehicle_dynamics.structures.OutputStates import OutputStates
 from vehicle_dynamics.structures.Manoeuvre import Manoeuvre
 
 import logging
-from scipy.interpolate import interp1d
 import numpy as np
 
 
+def interval_ticks(interval, time_step):
+    """ number of ticks of time_step lasting as long as interval ticks at 1000 Hz, the rate the
+    tick counts of the YAML were set at. Not rounded: the counters count down fractional ticks,
+    so the throttle change intervals keep adding up to the same duration at any frequency. """
+    return interval / (1000 * time_step)
+
+
 class Powertrain(object):
     """
         Powertrain is a class calculates the current Torque delivered by the engine to the wheels.
@@ -53,20 +59,33 @@ class Powertrain(object):
 
     """
 
-    def __init__(self, static_parameters: StaticParameters, logger: LocalLogger):
+    def __init__(self, static_parameters: StaticParameters, logger: LocalLogger, time_step=None):
         super(Powertrain, self).__init__()
         self.logger = logger
-        self.torque_interpolation = interp1d(static_parameters.powertrain.engine.w_table, static_parameters.powertrain.engine.torque_max)
-        self.MIN_GEAR_CHANGE_INTERVAL = static_parameters.powertrain.gearbox.MIN_GEAR_CHANGE_INTERVAL
-        self.CONVERTER_SYNC_TIME = static_parameters.powertrain.torque_converter.CONVERTER_SYNC_TIME
+        # step of the engine speed integration and of the tick counters, shorter than static_parameters.time_step when sub-stepped
+        self.time_step = static_parameters.time_step if time_step is None else time_step
+        self.torque_interpolation = LookupTable(static_parameters.powertrain.engine.w_table, static_parameters.powertrain.engine.torque_max)
+        self.MIN_GEAR_CHANGE_INTERVAL = interval_ticks(static_parameters.powertrain.gearbox.MIN_GEAR_CHANGE_INTERVAL, self.time_step)
+        self.CONVERTER_SYNC_TIME = interval_ticks(static_parameters.powertrain.torque_converter.CONVERTER_SYNC_TIME, self.time_step)
+        self.THROTTLE_CHANGE_INTERVAL = interval_ticks(2, self.time_step)
         self.current_sync = 0
         self.current_grace_period = 0
         self.static_parameters = static_parameters
-        self.μ_funct = interp1d(static_parameters.powertrain.torque_converter.speed_ratio,
-                                static_parameters.powertrain.torque_converter.ratio)
-        self.k_in_funct = interp1d(np.array(np.linspace(0., 1., len(static_parameters.powertrain.torque_converter.factor))), np.array(static_parameters.powertrain.torque_converter.factor))
+        self.μ_funct = LookupTable(static_parameters.powertrain.torque_converter.speed_ratio,
+                                  static_parameters.powertrain.torque_converter.ratio)
+        self.k_in_funct = LookupTable(np.array(np.linspace(0., 1., len(static_parameters.powertrain.torque_converter.factor))), np.array(static_parameters.powertrain.torque_converter.factor))
         self.previous_throtle = 0
 
+    # state of the powertrain kept outside CurrentStates, saved by VehicleDynamics.checkpoint()
+    COUNTERS = ("current_sync", "current_grace_period", "previous_throtle")
+
+    def counters(self):
+        return [float(getattr(self, name)) for name in self.COUNTERS]
+
+    def set_counters(self, values):
+        for name, value in zip(self.COUNTERS, values):
+            setattr(self, name, float(value))
+
     def gear_change_rpm(self, current_state: CurrentStates, throttle: float):
         if self.current_grace_period > 0:
             self.current_grace_period -= 1
@@ -104,7 +123,7 @@ class Powertrain(object):
         torque_available = self.torque_interpolation(current_state.engine_w)
         
         if self.previous_throtle - throttle != 0 :
-            self.current_grace_period += 2
+            self.current_grace_period += self.THROTTLE_CHANGE_INTERVAL
             self.previous_throtle = throttle
         else:
             self.previous_throtle = throttle
@@ -141,7 +160,7 @@ class Powertrain(object):
             torque_converter_out = μ * torque_converter_in
 
             engine_wdot = (engine_torque - torque_converter_in) / self.static_parameters.powertrain.engine.inertia
-            current_state.engine_w = (current_state.engine_w + engine_wdot * self.static_parameters.time_step)
+            current_state.engine_w = (current_state.engine_w + engine_wdot * self.time_step)
 
         # Gillespie equation 2-7
         traction_torque = torque_converter_out * final_ratio * self.static_parameters.powertrain.gearbox.efficiency
@@ -178,6 +197,7 @@ class Powertrain(object):
 
 
 def main(static_parameters, current_state, data, logger, savefig=False):
+    from vehicle_dynamics.utils.plot_function import plot_function
     import yaml
     from tqdm import tqdm
 
@@ -229,11 +249,10 @@ def main(static_parameters, current_state, data, logger, savefig=False):
 
 
 if __name__ == '__main__':
-    import pickle
+    from vehicle_dynamics.utils.columnar_data import open_data
 
     PATH_TO_DATA = "../../example_data/Braking.pickle"
-    with open(PATH_TO_DATA,"rb")as handle:
-        data=pickle.load(handle)
+    data = open_data(PATH_TO_DATA)
 
     from vehicle_dynamics.structures.StateVector import StateVector
     from vehicle_dynamics.utils.StaticParameters import StaticParameters
@@ -0,0 +1,177 @@
+"""
+Vehicle Dynamic Model - Real-Time Runner
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from array import array
+from queue import Empty
+import threading
+import time
+
+import numpy as np
+
+
+class QueueInputs(object):
+    """ inputs read from a queue.Queue of (throttle, brake, steering): the last received command is held """
+
+    def __init__(self, queue, initial=(0., 0., 0.)):
+        super(QueueInputs, self).__init__()
+        self.queue = queue
+        self.command = tuple(initial)
+
+    def __call__(self, tick, time_stamp):
+        try:
+            while True:
+                self.command = self.queue.get_nowait()
+        except Empty:
+            pass
+        return self.command
+
+
+class ManoeuvreInputs(object):
+    """ inputs replaying a Manoeuvre tick by tick, the last command is held after its end """
+
+    def __init__(self, manoeuvre):
+        super(ManoeuvreInputs, self).__init__()
+        points = len(manoeuvre)
+        self.commands = list(zip(np.asarray(manoeuvre.throttle[:points], dtype=float).tolist(),
+                                 np.asarray(manoeuvre.brake[:points], dtype=float).tolist(),
+                                 np.asarray(manoeuvre.steering[:points], dtype=float).tolist()))
+
+    def __call__(self, tick, time_stamp):
+        return self.commands[min(tick, len(self.commands) - 1)]
+
+
+def _latencies(samples):
+    values = np.frombuffer(samples, dtype=float) if len(samples) else np.zeros(1)
+    return {"mean_us": 1e6 * float(values.mean()), "p50_us": 1e6 * float(np.percentile(values, 50)),
+            "p99_us": 1e6 * float(np.percentile(values, 99)), "max_us": 1e6 * float(values.max())}
+
+
+class RealTimeRunner(object):
+    """
+        Runs a VehicleDynamics in step with the wall clock: tick k is due k time_step after the
+        start on a monotonic clock (time.perf_counter). The runner sleeps until a tick is due,
+        then busy-waits the last spin seconds, as time.sleep overshoots by tens of microseconds.
+        A tick that finds the runner behind runs at once, so after a slow tick the following
+        ones catch up back to back. When more than max_catch_up ticks are due at once the
+        backlog is dropped instead: the schedule slips, and the simulated time falls behind the
+        wall clock by the slipped time.
+
+        Required Arguments:
+            1. vehicle_dynamics: VehicleDynamics, ticked at its frequency
+            2. inputs: callable(tick, time_stamp) -> (throttle, brake, steering), e.g. QueueInputs
+               or ManoeuvreInputs, called once per tick
+            3. on_tick: callable(current_states) after every tick, e.g. OutputRecorder.set_states
+
+        run() returns the statistics of the run:
+            ticks, simulated_s, wall_s, real_time_factor (simulated_s / wall_s)
+            lateness: start of each tick after its due time (the jitter), mean/p50/p99/max in us
+            tick_time: duration of each tick
+            overruns: ticks that took longer than time_step
+            late_ticks: ticks started more than one time_step late (caught up)
+            slips, slipped_s: how often and by how much the schedule slipped
+            error: the ValueError that stopped the run, or None
+    """
+
+    def __init__(self, vehicle_dynamics, inputs, on_tick=None, max_catch_up=10, spin=2e-4, clock=time.perf_counter, sleep=time.sleep):
+        super(RealTimeRunner, self).__init__()
+        if max_catch_up < 1:
+            raise ValueError(f"max_catch_up must be at least 1, got {max_catch_up}")
+        self.vehicle_dynamics = vehicle_dynamics
+        self.inputs = inputs
+        self.on_tick = on_tick
+        self.max_catch_up = max_catch_up
+        self.spin = spin
+        self.clock = clock
+        self.sleep = sleep
+        self.stopped = threading.Event()
+
+    def stop(self):
+        """ ends run() after the current tick, from another thread or from inputs/on_tick """
+        self.stopped.set()
+
+    def run(self, duration=None):
+        """ ticks until duration seconds are simulated (forever if None) or stop() """
+        time_step = self.vehicle_dynamics.static_parameters.time_step
+        limit = None if duration is None else int(round(duration / time_step))
+        tick, inputs, on_tick, clock = self.vehicle_dynamics.tick, self.inputs, self.on_tick, self.clock
+        lateness, tick_time = array('d'), array('d')
+        overruns = late_ticks = slips = 0
+        slipped = 0.
+        error = None
+        ticks = 0
+        self.stopped.clear()
+
+        start = begin = clock()
+        while not self.stopped.is_set() and (limit is None or ticks < limit):
+            due = start + ticks * time_step
+            now = clock()
+            if now < due:
+                if due - now > self.spin:
+                    self.sleep(due - now - self.spin)
+                while now < due:
+                    now = clock()
+            late = now - due
+            behind = int(late / time_step)
+            if behind > self.max_catch_up:
+                start += behind * time_step
+                late -= behind * time_step
+                slips += 1
+                slipped += behind * time_step
+            elif behind:
+                late_ticks += 1
+            lateness.append(late)
+
+            throttle, brake, steering = inputs(ticks, ticks * time_step)
+            try:
+                current_states = tick(throttle, brake, steering)
+            except ValueError as tick_error:
+                error = tick_error
+                self.vehicle_dynamics.logger.error(f"real-time run stopped: {error}")
+                break
+            if on_tick is not None:
+                on_tick(current_states)
+            elapsed = clock() - now
+            tick_time.append(elapsed)
+            overruns += elapsed > time_step
+            ticks += 1
+        wall = clock() - begin
+
+        return {"ticks": ticks, "simulated_s": ticks * time_step, "wall_s": wall,
+                "real_time_factor": ticks * time_step / wall if wall > 0 else None,
+                "lateness": _latencies(lateness), "tick_time": _latencies(tick_time),
+                "overruns": overruns, "late_ticks": late_ticks, "slips": slips, "slipped_s": slipped, "error": error}
+
+
+def main(data, logger, frequency=500):
+    from vehicle_dynamics.VehicleDynamics import VehicleDynamics
+    from vehicle_dynamics.modules.integrators import resample
+    from vehicle_dynamics.structures.Manoeuvre import Manoeuvre
+    from vehicle_dynamics.structures.OutputRecorder import OutputRecorder
+    from vehicle_dynamics.structures.StateVector import StateVector
+
+    manoeuvre = resample(Manoeuvre(data["steering"], data["throttle"], data["brake"], data["time"]), 1000, frequency)
+    initial_state = StateVector(x=data["Rel_pos_x"][0], y=data["Rel_pos_y"][0], vx=data["Velocity_X"][0], yaw=data["Yaw"][0])
+    vehicle_dynamics = VehicleDynamics(initial_state=initial_state, initial_gear=1, frequency=frequency, car_parameters_path="../../bmw_m8.yaml")
+    recorder = OutputRecorder(len(manoeuvre))
+    runner = RealTimeRunner(vehicle_dynamics, ManoeuvreInputs(manoeuvre), on_tick=recorder.set_states)
+    stats = runner.run(duration=len(manoeuvre) / frequency)
+    logger.info(f"{stats['ticks']} ticks at {frequency} Hz in {stats['wall_s']:.2f} s, real-time factor {stats['real_time_factor']:.3f}")
+    logger.info(f"lateness p50 {stats['lateness']['p50_us']:.0f} us, p99 {stats['lateness']['p99_us']:.0f} us, max {stats['lateness']['max_us']:.0f} us")
+    logger.info(f"tick p50 {stats['tick_time']['p50_us']:.0f} us, max {stats['tick_time']['max_us']:.0f} us, {stats['overruns']} overruns, "
+                f"{stats['late_ticks']} late ticks, {stats['slips']} slips ({stats['slipped_s']:.3f} s)")
+    return stats, recorder
+
+
+if __name__ == '__main__':
+    from vehicle_dynamics.utils.columnar_data import open_data
+    from vehicle_dynamics.utils.LocalLogger import LocalLogger
+    logger = LocalLogger("realtime").logger
+    logger.setLevel('INFO')
+
+    PATH_TO_DATA = "../../example_data/Braking.pickle"
+    data = open_data(PATH_TO_DATA)
+    main(data, logger)
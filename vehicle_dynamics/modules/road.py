@@ -0,0 +1,235 @@
+"""
+Vehicle Dynamic Model - Road Surface
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Height maps of the road as tiled grids on disk, read through a memory map one tile at a time:
+
+    road/road.json    origin, resolution, tile size and shape of the map
+    road/tiles.npy    (tiles_y, tiles_x, tile_size + 1, tile_size + 1) heights, tile (ty, tx)
+                      holding the samples [ty * tile_size, (ty + 1) * tile_size] in y and the
+                      same in x, so neighbouring tiles share their border samples and every
+                      bilinear cell lies inside one tile
+
+Only the tiles around the car are read and a few of them kept in a LRU cache, so a route of any
+length runs in constant memory. The heights are the road displacement under the suspension
+(unevenness around the reference plane z = 0), the model has no road grade.
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from collections import OrderedDict
+import json
+import math
+import os
+
+import numpy as np
+
+MANIFEST = "road.json"
+TILES = "tiles.npy"
+
+
+def write_height_map(directory, heights, resolution, origin=(0., 0.), tile_size=256, shape=None, dtype=np.float32):
+    """
+        writes a height map as road.json and tiles.npy, one tile at a time
+
+        Required Arguments:
+            1. directory
+            2. heights: (ny, nx) array-like, heights[iy, ix] at (origin[0] + ix * resolution,
+               origin[1] + iy * resolution), e.g. a np.memmap, or a callable(x, y) -> heights of
+               the grid points of a tile, for maps that do not fit in memory (then shape is (ny, nx))
+            3. resolution: grid spacing [m]
+            4. origin: (x, y) of heights[0, 0] [m]
+            5. tile_size: cells per tile side
+
+        Returns: TiledHeightMap of the directory
+    """
+    if callable(heights):
+        if shape is None:
+            raise ValueError("shape (ny, nx) is required when heights is a function")
+        ny, nx = shape
+    else:
+        ny, nx = np.shape(heights)
+    if ny < 2 or nx < 2 or resolution <= 0 or tile_size < 1:
+        raise ValueError(f"a height map needs at least 2 x 2 samples, a positive resolution and tile size, got {(ny, nx)}, {resolution}, {tile_size}")
+    tiles_y, tiles_x = math.ceil((ny - 1) / tile_size), math.ceil((nx - 1) / tile_size)
+    os.makedirs(directory, exist_ok=True)
+    tiles = np.lib.format.open_memmap(os.path.join(directory, TILES), mode="w+", dtype=dtype,
+                                      shape=(tiles_y, tiles_x, tile_size + 1, tile_size + 1))
+    for ty in range(tiles_y):
+        # samples of the tile, clamped at the far edges of the map
+        rows = np.minimum(np.arange(ty * tile_size, (ty + 1) * tile_size + 1), ny - 1)
+        for tx in range(tiles_x):
+            columns = np.minimum(np.arange(tx * tile_size, (tx + 1) * tile_size + 1), nx - 1)
+            if callable(heights):
+                x, y = np.meshgrid(origin[0] + columns * resolution, origin[1] + rows * resolution)
+                tiles[ty, tx] = heights(x, y)
+            else:
+                tiles[ty, tx] = np.asarray(heights[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1])[np.ix_(rows - rows[0], columns - columns[0])]
+    tiles.flush()
+    del tiles
+    with open(os.path.join(directory, MANIFEST), "w") as file:
+        json.dump({"origin": [float(origin[0]), float(origin[1])], "resolution": float(resolution), "tile_size": int(tile_size),
+                   "shape": [int(ny), int(nx)], "tiles": [tiles_y, tiles_x], "dtype": np.dtype(dtype).name}, file)
+    return TiledHeightMap(directory)
+
+
+class TiledHeightMap(object):
+    """
+        Bilinear road heights from a map written by write_height_map, memory mapped.
+
+        height(x, y) evaluates any array of points, heights(xs, ys) lists of a few; the tiles it needs are read from the map and
+        the last cache_tiles of them kept as float64 (LRU), hits and misses count the cache use.
+        Outside the map the height of its nearest edge is used.
+
+        Required Arguments:
+            1. directory: written by write_height_map
+            2. cache_tiles: tiles kept in memory
+    """
+    SCALAR_PATH_SIZE = 16
+
+    def __init__(self, directory, cache_tiles=16):
+        super(TiledHeightMap, self).__init__()
+        if cache_tiles < 1:
+            raise ValueError(f"cache_tiles must be at least 1, got {cache_tiles}")
+        with open(os.path.join(directory, MANIFEST)) as file:
+            manifest = json.load(file)
+        self.directory = directory
+        self.origin = tuple(manifest["origin"])
+        self.resolution = manifest["resolution"]
+        self.tile_size = manifest["tile_size"]
+        self.shape = tuple(manifest["shape"])
+        self.tiles = np.load(os.path.join(directory, TILES), mmap_mode="r", allow_pickle=False)
+        if self.tiles.shape != (*manifest["tiles"], self.tile_size + 1, self.tile_size + 1):
+            raise ValueError(f"{TILES} of shape {self.tiles.shape} does not match {MANIFEST}")
+        self.cache_tiles = cache_tiles
+        self.cache = OrderedDict()
+        self.hits = self.misses = 0
+        # largest grid coordinate, in cells
+        self._u_max, self._v_max = self.shape[1] - 1, self.shape[0] - 1
+
+    def tile(self, ty, tx):
+        """ flat float64 memoryview of a tile, through the LRU cache """
+        key = (ty, tx)
+        tile = self.cache.get(key)
+        if tile is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return tile
+        self.misses += 1
+        tile = memoryview(np.array(self.tiles[ty, tx], dtype=float).reshape(-1))
+        self.cache[key] = tile
+        if len(self.cache) > self.cache_tiles:
+            self.cache.popitem(last=False)
+        return tile
+
+    def height(self, x, y):
+        """ road height [m] at the points (x, y), same shape as x and y """
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        if x.size <= self.SCALAR_PATH_SIZE:
+            return np.array(self.heights(x.reshape(-1).tolist(), y.reshape(-1).tolist())).reshape(x.shape)
+        u, v = self._grid(x.reshape(-1), y.reshape(-1))
+        cell_x = np.minimum(u.astype(np.intp), self._u_max - 1)
+        cell_y = np.minimum(v.astype(np.intp), self._v_max - 1)
+        tile_x, tile_y = cell_x // self.tile_size, cell_y // self.tile_size
+        heights = np.empty(len(u))
+        side = self.tile_size + 1
+        keys = tile_y * self.tiles.shape[1] + tile_x
+        for key in np.unique(keys):
+            points = np.flatnonzero(keys == key)
+            tile = np.asarray(self.tile(*divmod(int(key), self.tiles.shape[1]))).reshape(side, side)
+            column, row = cell_x[points] - tile_x[points] * self.tile_size, cell_y[points] - tile_y[points] * self.tile_size
+            fx, fy = u[points] - cell_x[points], v[points] - cell_y[points]
+            lower = tile[row, column] + fx * (tile[row, column + 1] - tile[row, column])
+            upper = tile[row + 1, column] + fx * (tile[row + 1, column + 1] - tile[row + 1, column])
+            heights[points] = lower + fy * (upper - lower)
+        return heights.reshape(x.shape)
+
+    def _grid(self, x, y):
+        """ grid coordinates of the points, clamped to the map """
+        u = np.clip((x - self.origin[0]) / self.resolution, 0., self._u_max)
+        v = np.clip((y - self.origin[1]) / self.resolution, 0., self._v_max)
+        return u, v
+
+    def heights(self, xs, ys):
+        """ heights of lists of floats as a list, in float arithmetic: the path of the 4 contact points of a tick """
+        x0, y0, resolution, tile_size = self.origin[0], self.origin[1], self.resolution, self.tile_size
+        u_max, v_max, side = self._u_max, self._v_max, self.tile_size + 1
+        heights = []
+        key = tile = None
+        for x, y in zip(xs, ys):
+            u = (x - x0) / resolution
+            u = 0. if u < 0. else (u_max if u > u_max else u)
+            v = (y - y0) / resolution
+            v = 0. if v < 0. else (v_max if v > v_max else v)
+            cell_x, cell_y = min(int(u), u_max - 1), min(int(v), v_max - 1)
+            tile_x, tile_y = cell_x // tile_size, cell_y // tile_size
+            if (tile_y, tile_x) != key:
+                key = (tile_y, tile_x)
+                tile = self.tile(tile_y, tile_x)
+            k = (cell_y - tile_y * tile_size) * side + cell_x - tile_x * tile_size
+            fx, fy = u - cell_x, v - cell_y
+            lower = tile[k] + fx * (tile[k + 1] - tile[k])
+            upper = tile[k + side] + fx * (tile[k + side + 1] - tile[k + side])
+            heights.append(lower + fy * (upper - lower))
+        return heights
+
+
+class ContactPoints(object):
+    """ inertial (xs, ys) of the four contact points (FL, RL, FR, RR): the wheel positions of the body frame rotated by the yaw around the CoG """
+
+    def __init__(self, static_parameters):
+        super(ContactPoints, self).__init__()
+        body = static_parameters.body
+        self.longitudinal_distance = [body.lf, -body.lr, body.lf, -body.lr]
+        self.lateral_distance = [body.wl, body.wl, -body.wr, -body.wr]
+
+    def __call__(self, x, y, sin_yaw, cos_yaw):
+        distances = tuple(zip(self.longitudinal_distance, self.lateral_distance))
+        return ([x + longitudinal * cos_yaw - lateral * sin_yaw for longitudinal, lateral in distances],
+                [y + longitudinal * sin_yaw + lateral * cos_yaw for longitudinal, lateral in distances])
+
+
+def main(data, logger, directory=None):
+    """ Braking on a flat road and on a synthetic uneven one (sum of sines, ~2 cm), the map in a temporary directory by default """
+    import tempfile
+    import time
+    from vehicle_dynamics.VehicleDynamics import VehicleDynamics
+    from vehicle_dynamics.structures.Manoeuvre import Manoeuvre
+    from vehicle_dynamics.structures.StateVector import StateVector
+
+    x_data, y_data = np.asarray(data["Rel_pos_x"], dtype=float), np.asarray(data["Rel_pos_y"], dtype=float)
+    origin = (float(x_data.min()) - 50., float(y_data.min()) - 50.)
+    resolution = 0.05
+    shape = (int((y_data.max() + 50. - origin[1]) / resolution) + 1, int((x_data.max() + 50. - origin[0]) / resolution) + 1)
+
+    def uneven(x, y):
+        return 0.01 * np.sin(2 * np.pi * x / 7.3) + 0.006 * np.sin(2 * np.pi * (x + 0.4 * y) / 1.9) + 0.003 * np.sin(2 * np.pi * y / 0.7)
+
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix="road_")
+    start = time.perf_counter()
+    height_map = write_height_map(directory, uneven, resolution, origin, tile_size=128, shape=shape)
+    logger.info(f"height map {shape[1]} x {shape[0]} samples, {height_map.tiles.shape[0] * height_map.tiles.shape[1]} tiles, written in {time.perf_counter() - start:.2f} s")
+
+    manoeuvre = Manoeuvre(data["steering"], data["throttle"], data["brake"], data["time"])
+    outputs = {}
+    for name, road in (("flat", None), ("uneven", height_map)):
+        initial_state = StateVector(x=data["Rel_pos_x"][0], y=data["Rel_pos_y"][0], vx=data["Velocity_X"][0], yaw=data["Yaw"][0])
+        vehicle_dynamics = VehicleDynamics(initial_state=initial_state, initial_gear=1, car_parameters_path="../../bmw_m8.yaml", road=road)
+        vehicle_dynamics.logger.setLevel("WARNING")
+        start = time.perf_counter()
+        outputs[name] = vehicle_dynamics.simulate(manoeuvre).output_states
+        logger.info(f"{name:7s} {time.perf_counter() - start:.2f} s, wheel load FL {outputs[name].f_zr.wheel_load_z[:, 0].min():.0f} to {outputs[name].f_zr.wheel_load_z[:, 0].max():.0f} N")
+    logger.info(f"tile cache: {height_map.hits} hits, {height_map.misses} misses")
+    return height_map, outputs
+
+
+if __name__ == '__main__':
+    from vehicle_dynamics.utils.columnar_data import open_data
+    from vehicle_dynamics.utils.LocalLogger import LocalLogger
+    logger = LocalLogger("road").logger
+    logger.setLevel('INFO')
+
+    PATH_TO_DATA = "../../example_data/Braking.pickle"
+    data = open_data(PATH_TO_DATA)
+    main(data, logger)
@@ -0,0 +1,308 @@
+"""
+Vehicle Dynamic Model - Tire Model
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+import hashlib
+import json
+import os
+import numpy as np
+
+
+class MagicFormula(object):
+    """
+        Simplified Magic Formula (pure slip) of Wheels:
+
+            fx = Fz * D * sin(C * arctan(B * slip_x)),  B = slip_stiffness / (C * D)
+            fy = Fz * D * sin(C * arctan(B * slip_y)),  B = cornering_coefficient / (C * D)
+
+        with D the peak friction and C the shape factor of the longitudinal and lateral
+        directions. B, C and D are computed once; forces() and to_vehicle() are array operations
+        over any shape broadcasting against them: the (4,) wheels of one vehicle with scalar
+        coefficients (from_static_parameters) or the (N, 4) wheels of a batch with (N, 1) ones
+        (from_batch_parameters).
+
+        Other formulations (e.g. combined slip) subclass it and override forces(); Wheels,
+        VehicleModel and BatchWheels only call forces() and to_vehicle().
+    """
+
+    def __init__(self, longitudinal_peak_friction, longitudinal_shape_factor, longitudinal_slip_stiffness,
+                 lateral_peak_friction, lateral_shape_factor, lateral_cornering_coefficient):
+        super(MagicFormula, self).__init__()
+        self.longitudinal_peak_friction = longitudinal_peak_friction
+        self.longitudinal_shape_factor = longitudinal_shape_factor
+        self.longitudinal_stiffness = longitudinal_slip_stiffness / (longitudinal_shape_factor * longitudinal_peak_friction)
+        self.lateral_peak_friction = lateral_peak_friction
+        self.lateral_shape_factor = lateral_shape_factor
+        self.lateral_stiffness = lateral_cornering_coefficient / (lateral_shape_factor * lateral_peak_friction)
+
+    @classmethod
+    def from_static_parameters(cls, static_parameters):
+        """ coefficients of the tire of a StaticParameters """
+        longitudinal, lateral = static_parameters.tire.longitudinal, static_parameters.tire.lateral
+        return cls(longitudinal.peak_friction, longitudinal.shape_factor, longitudinal.slip_stiffness,
+                   lateral.peak_friction, lateral.shape_factor, lateral.cornering_coefficient)
+
+    @classmethod
+    def from_batch_parameters(cls, parameters):
+        """ (N, 1) coefficients of the members of a BatchStaticParameters """
+        return cls(parameters.longitudinal_peak_friction[:, None], parameters.longitudinal_shape_factor[:, None],
+                   parameters.longitudinal_slip_stiffness[:, None], parameters.lateral_peak_friction[:, None],
+                   parameters.lateral_shape_factor[:, None], parameters.lateral_cornering_coefficient[:, None])
+
+    def forces(self, wheel_load_z, slip_x, slip_y):
+        """
+            tire forces in the wheel frame
+
+            Required Arguments:
+                1. wheel_load_z: vertical load of every wheel [N]
+                2. slip_x: longitudinal slip ratio
+                3. slip_y: slip angle [rad]
+
+            Returns: (fx, fy) [N]
+        """
+        fx = wheel_load_z * self.longitudinal_peak_friction * np.sin(self.longitudinal_shape_factor * np.arctan(self.longitudinal_stiffness * slip_x))
+        fy = wheel_load_z * self.lateral_peak_friction * np.sin(self.lateral_shape_factor * np.arctan(self.lateral_stiffness * slip_y))
+        return fx, fy
+
+    @staticmethod
+    def to_vehicle(fx, fy, wheel_delta):
+        """ (force_x, force_y) of the tire forces rotated by the steering angle of every wheel into the vehicle frame """
+        cos_delta, sin_delta = np.cos(wheel_delta), np.sin(wheel_delta)
+        return fx * cos_delta - fy * sin_delta, fy * cos_delta + fx * sin_delta
+
+
+class CombinedSlipMagicFormula(MagicFormula):
+    """
+        Magic Formula with the combined slip weighting of Pacejka (Tire and Vehicle Dynamics,
+        without shifts): the pure slip forces of MagicFormula are scaled by
+
+            Gx = cos(Cx_alpha * arctan(Bx_alpha * slip_y)),  Bx_alpha = rBx1 * cos(arctan(rBx2 * slip_x))
+            Gy = cos(Cy_kappa * arctan(By_kappa * slip_x)),  By_kappa = rBy1 * cos(arctan(rBy2 * slip_y))
+
+        so a tire braking hard loses side force and the other way round. The weighting
+        coefficients are read from an optional tire.combined group of the YAML, with the
+        passenger car values of the book as defaults.
+    """
+    COMBINED_DEFAULTS = {"rBx1": 12.35, "rBx2": -10.77, "Cx_alpha": 1.092, "rBy1": 6.461, "rBy2": 4.196, "Cy_kappa": 1.081}
+
+    def __init__(self, *pure_slip, **combined):
+        super(CombinedSlipMagicFormula, self).__init__(*pure_slip)
+        unknown = set(combined) - set(self.COMBINED_DEFAULTS)
+        if unknown:
+            raise ValueError(f"unknown combined slip coefficients {sorted(unknown)}, expected {list(self.COMBINED_DEFAULTS)}")
+        for name, value in self.COMBINED_DEFAULTS.items():
+            setattr(self, name, combined.get(name, value))
+
+    @classmethod
+    def from_static_parameters(cls, static_parameters):
+        pure_slip = MagicFormula.from_static_parameters(static_parameters)
+        combined = static_parameters.tire.combined or {}
+        return cls(pure_slip.longitudinal_peak_friction, pure_slip.longitudinal_shape_factor,
+                   static_parameters.tire.longitudinal.slip_stiffness, pure_slip.lateral_peak_friction,
+                   pure_slip.lateral_shape_factor, static_parameters.tire.lateral.cornering_coefficient,
+                   **{name: combined[name] for name in cls.COMBINED_DEFAULTS if combined.get(name) is not None})
+
+    def forces(self, wheel_load_z, slip_x, slip_y):
+        fx, fy = super(CombinedSlipMagicFormula, self).forces(wheel_load_z, slip_x, slip_y)
+        Bx_alpha = self.rBx1 * np.cos(np.arctan(self.rBx2 * slip_x))
+        By_kappa = self.rBy1 * np.cos(np.arctan(self.rBy2 * slip_y))
+        return (fx * np.cos(self.Cx_alpha * np.arctan(Bx_alpha * slip_y)),
+                fy * np.cos(self.Cy_kappa * np.arctan(By_kappa * slip_x)))
+
+
+def default_cache_directory():
+    """ directory of the baked TireForceTables, $XDG_CACHE_HOME/vehicle_dynamics/tire_tables by default """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "vehicle_dynamics", "tire_tables")
+
+
+def _model_key(model, slip_x, slip_y):
+    """ SHA-256 of the class, the coefficients of a tire model and the grid """
+    coefficients = {name: np.asarray(value, dtype=float).tolist() for name, value in sorted(vars(model).items())}
+    description = json.dumps([f"{type(model).__module__}.{type(model).__qualname__}", coefficients, slip_x, slip_y])
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+# baked tables of this process by _model_key
+_TABLES = {}
+
+
+class TireForceTable(object):
+    """
+        Surrogate of a tire model: fx / wheel_load_z and fy / wheel_load_z tabulated on a uniform
+        (slip_x, slip_y) grid and interpolated bilinearly, so a tire model of any cost is
+        evaluated at the cost of one lookup per tick. Built by bake() for a model whose forces
+        are proportional to the wheel load (those of this module are).
+
+        Slips outside the grid are clamped to its edge. max_error holds the largest difference
+        to the model, per unit of wheel load, at the centres of the grid cells (where the
+        bilinear error peaks) and at the grid edges; error() measures it at any slips.
+
+        The 4 wheels of one vehicle are looked up with plain floats, as numpy calls on 4 values
+        cost more than the arithmetic; batches of wheels take the array path.
+
+        Used as the tire_model of Wheels / VehicleDynamics in place of the model.
+    """
+
+    SCALAR_PATH_SIZE = 16
+
+    def __init__(self, slip_x, slip_y, table, max_error):
+        super(TireForceTable, self).__init__()
+        self.slip_x = tuple(slip_x)
+        self.slip_y = tuple(slip_y)
+        self.table = np.ascontiguousarray(table, dtype=float)
+        self.max_error = dict(max_error)
+        self.x0, self.x_step = slip_x[0], (slip_x[1] - slip_x[0]) / (slip_x[2] - 1)
+        self.y0, self.y_step = slip_y[0], (slip_y[1] - slip_y[0]) / (slip_y[2] - 1)
+        # flat views of the tables for the scalar path, indexed as plain floats
+        self._fx = memoryview(self.table[0].reshape(-1))
+        self._fy = memoryview(self.table[1].reshape(-1))
+
+    @classmethod
+    def bake(cls, model, slip_x=(-1., 1., 401), slip_y=(-0.5, 0.5, 201), cache_directory=None):
+        """
+            table of model, loaded from the cache directory when it was baked before
+
+            Required Arguments:
+                1. model: tire model with forces(wheel_load_z, slip_x, slip_y) and scalar coefficients
+                2. slip_x, slip_y: (first, last, points) of the grid
+                3. cache_directory: where the tables are kept as .npz, default_cache_directory() if
+                   None, False to bake without caching on disk
+        """
+        slip_x = (float(slip_x[0]), float(slip_x[1]), int(slip_x[2]))
+        slip_y = (float(slip_y[0]), float(slip_y[1]), int(slip_y[2]))
+        if slip_x[2] < 2 or slip_y[2] < 2 or slip_x[1] <= slip_x[0] or slip_y[1] <= slip_y[0]:
+            raise ValueError(f"the grid needs increasing bounds and at least 2 points per slip, got {slip_x} and {slip_y}")
+        key = _model_key(model, slip_x, slip_y)
+        if key in _TABLES:
+            return _TABLES[key]
+        path = None
+        if cache_directory is not False:
+            path = os.path.join(default_cache_directory() if cache_directory is None else cache_directory, key + ".npz")
+            if os.path.exists(path):
+                with np.load(path, allow_pickle=False) as stored:
+                    _TABLES[key] = cls(slip_x, slip_y, stored["table"], zip(("fx", "fy"), stored["max_error"].tolist()))
+                return _TABLES[key]
+
+        grid_x, grid_y = np.meshgrid(np.linspace(*slip_x), np.linspace(*slip_y), indexing="ij")
+        table = np.stack(model.forces(1., grid_x, grid_y))
+        baked = cls(slip_x, slip_y, table, {})
+        # the bilinear error peaks inside the cells, the edges catch slopes the grid misses
+        centre_x = np.linspace(slip_x[0] + baked.x_step / 2, slip_x[1] - baked.x_step / 2, slip_x[2] - 1)
+        centre_y = np.linspace(slip_y[0] + baked.y_step / 2, slip_y[1] - baked.y_step / 2, slip_y[2] - 1)
+        probes = [np.meshgrid(centre_x, centre_y, indexing="ij"), np.meshgrid(centre_x, np.linspace(*slip_y), indexing="ij"),
+                  np.meshgrid(np.linspace(*slip_x), centre_y, indexing="ij")]
+        errors = np.max([baked.error(model, probe_x, probe_y) for probe_x, probe_y in probes], axis=0)
+        baked.max_error = {"fx": float(errors[0]), "fy": float(errors[1])}
+        if path is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez(temporary, table=table, max_error=errors)
+            os.replace(temporary, path)
+        _TABLES[key] = baked
+        return baked
+
+    @classmethod
+    def from_static_parameters(cls, static_parameters, model=CombinedSlipMagicFormula, **grid):
+        """ table of model.from_static_parameters(static_parameters), see bake() for grid """
+        return cls.bake(model.from_static_parameters(static_parameters), **grid)
+
+    def normalised_forces(self, slip_x, slip_y):
+        """ (2, ...) fx and fy per unit of wheel load at the slips """
+        if type(slip_x) is np.ndarray and type(slip_y) is np.ndarray and slip_x.ndim == 1 and slip_x.shape == slip_y.shape \
+                and len(slip_x) <= self.SCALAR_PATH_SIZE:
+            return np.array(self._lookup(slip_x.tolist(), slip_y.tolist()))
+        slip_x, slip_y = np.broadcast_arrays(np.asarray(slip_x, dtype=float), np.asarray(slip_y, dtype=float))
+        u = np.clip((slip_x - self.x0) / self.x_step, 0., self.slip_x[2] - 1)
+        v = np.clip((slip_y - self.y0) / self.y_step, 0., self.slip_y[2] - 1)
+        i = np.minimum(u.astype(np.intp), self.slip_x[2] - 2)
+        j = np.minimum(v.astype(np.intp), self.slip_y[2] - 2)
+        u -= i
+        v -= j
+        table = self.table
+        corner = table[:, i, j]
+        along_x = table[:, i + 1, j] - corner
+        along_y = table[:, i, j + 1] - corner
+        twist = table[:, i + 1, j + 1] - table[:, i + 1, j] - along_y
+        return corner + u * along_x + v * (along_y + u * twist)
+
+    def _lookup(self, slips_x, slips_y):
+        """ ([fx], [fy]) per unit of wheel load of lists of slips, with float arithmetic """
+        x0, x_step, u_max, i_max = self.x0, self.x_step, self.slip_x[2] - 1, self.slip_x[2] - 2
+        y0, y_step, v_max, j_max = self.y0, self.y_step, self.slip_y[2] - 1, self.slip_y[2] - 2
+        row = self.slip_y[2]
+        fx_table, fy_table = self._fx, self._fy
+        fx, fy = [], []
+        for slip_x, slip_y in zip(slips_x, slips_y):
+            u = (slip_x - x0) / x_step
+            u = 0. if u < 0. else (u_max if u > u_max else u)
+            v = (slip_y - y0) / y_step
+            v = 0. if v < 0. else (v_max if v > v_max else v)
+            i = min(int(u), i_max)
+            j = min(int(v), j_max)
+            u -= i
+            v -= j
+            k = i * row + j
+            corner, along_x, along_y = fx_table[k], fx_table[k + row], fx_table[k + 1]
+            fx.append(corner + u * (along_x - corner) + v * (along_y - corner + u * (fx_table[k + row + 1] - along_x - along_y + corner)))
+            corner, along_x, along_y = fy_table[k], fy_table[k + row], fy_table[k + 1]
+            fy.append(corner + u * (along_x - corner) + v * (along_y - corner + u * (fy_table[k + row + 1] - along_x - along_y + corner)))
+        return fx, fy
+
+    def forces(self, wheel_load_z, slip_x, slip_y):
+        fx, fy = self.normalised_forces(slip_x, slip_y)
+        return wheel_load_z * fx, wheel_load_z * fy
+
+    def error(self, model, slip_x, slip_y):
+        """ largest |table - model| of fx and fy per unit of wheel load at the slips """
+        exact = np.stack(np.broadcast_arrays(*model.forces(1., slip_x, slip_y)))
+        return np.abs(self.normalised_forces(slip_x, slip_y) - exact).reshape(2, -1).max(axis=1)
+
+    to_vehicle = staticmethod(MagicFormula.to_vehicle)
+
+
+def main(data, logger):
+    """ bakes the combined slip model of the M8 and runs Braking with the model and with its table """
+    import time
+    from vehicle_dynamics.VehicleDynamics import VehicleDynamics
+    from vehicle_dynamics.structures.Manoeuvre import Manoeuvre
+    from vehicle_dynamics.structures.StateVector import StateVector
+    from vehicle_dynamics.structures.StaticParameters import StaticParameters
+
+    static_parameters = StaticParameters.compile("../../bmw_m8.yaml", 1000)
+    model = CombinedSlipMagicFormula.from_static_parameters(static_parameters)
+    start = time.perf_counter()
+    table = TireForceTable.bake(model)
+    logger.info(f"table {table.table.shape} in {time.perf_counter() - start:.3f} s, max error per unit load: fx {table.max_error['fx']:.2e}, fy {table.max_error['fy']:.2e}")
+
+    wheel_load_z, slip_x, slip_y = np.full(4, 4000.), np.array([0.02, -0.1, 0.3, -0.9]), np.array([0.01, -0.05, 0.2, -0.4])
+    for name, tire_model in (("pure slip", MagicFormula.from_static_parameters(static_parameters)), ("combined", model), ("table", table)):
+        start = time.perf_counter()
+        for _ in range(10000):
+            tire_model.forces(wheel_load_z, slip_x, slip_y)
+        logger.info(f"{name:10s} forces of 4 wheels {1e6 * (time.perf_counter() - start) / 10000:.1f} us")
+
+    manoeuvre = Manoeuvre(data["steering"], data["throttle"], data["brake"], data["time"])
+    outputs = {}
+    for name, tire_model in (("combined", model), ("table", table)):
+        initial_state = StateVector(x=data["Rel_pos_x"][0], y=data["Rel_pos_y"][0], vx=data["Velocity_X"][0], yaw=data["Yaw"][0])
+        vehicle_dynamics = VehicleDynamics(initial_state=initial_state, initial_gear=1, static_parameters=static_parameters, tire_model=tire_model)
+        vehicle_dynamics.logger.setLevel("WARNING")
+        outputs[name] = vehicle_dynamics.simulate(manoeuvre).output_states
+    logger.info(f"Braking, table against model: max vx difference {np.abs(outputs['table'].x_a.vx - outputs['combined'].x_a.vx).max():.2e} m/s, "
+                f"max fx difference {np.abs(outputs['table'].x_rf.fx - outputs['combined'].x_rf.fx).max():.1f} N")
+    return table, outputs
+
+
+if __name__ == '__main__':
+    from vehicle_dynamics.utils.columnar_data import open_data
+    from vehicle_dynamics.utils.LocalLogger import LocalLogger
+    logger = LocalLogger("tire_model").logger
+    logger.setLevel('INFO')
+
+    PATH_TO_DATA = "../../example_data/Braking.pickle"
+    data = open_data(PATH_TO_DATA)
+    main(data, logger)
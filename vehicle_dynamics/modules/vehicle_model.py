@@ -0,0 +1,185 @@
+"""
+Vehicle Dynamic Model - Continuous Vehicle Model
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from vehicle_dynamics.utils.StaticParameters import StaticParameters
+from vehicle_dynamics.utils.CurrentStates import CurrentStates
+from vehicle_dynamics.modules.tire_model import MagicFormula
+from vehicle_dynamics.modules.road import ContactPoints
+
+from collections import namedtuple
+import numpy as np
+
+ModelInputs = namedtuple('ModelInputs', 'wheel_delta powertrain_net_torque wheel_inertia acc_x acc_y road reference_zCG friction', defaults=(None,))
+ModelOutputs = namedtuple('ModelOutputs', 'derivatives slip_x slip_y fx fy wheel_forces wheel_load_z suspension suspension_dot suspension_force acc_x acc_y acc_z wx_dot wy_dot wz_dot pho_r_2dot')
+
+
+class VehicleModel(object):
+    """
+        Continuous-time form of the Wheels and Body equations, dy/dt = f(y, inputs), for the
+        integrators of modules/integrators.py.
+
+        State y (16,): x, y, z, roll, pitch, yaw, vx, vy, vz, wx, wy, wz and the four wheel_w_vel
+        (FL, RL, FR, RR). The first six are positions, their rates only depend on the
+        velocities (kinematics()), which the semi-implicit Euler integrator uses.
+
+        The equations are the ones of Wheels.wheels and Body.body with two differences:
+            - suspension_dot is the analytic rate of the suspension displacement instead of
+              the finite difference between two ticks, so it does not depend on time_step
+            - the tire forces use the wheel loads of the same state instead of the loads of
+              the previous tick
+        As in Body, the load transfer uses acc_x/acc_y of the previous step, and vx and the
+        wheel speeds are held at 0 when they would become negative.
+
+        The powertrain torque, steering and gear are held during the step (ModelInputs,
+        built by inputs()), as is the friction scale of the contact patches with a friction map.
+    """
+    POSITIONS = slice(0, 6)
+    VELOCITIES = slice(6, 16)
+    MINIMUM_SPEED_VALUE = 15
+
+    def __init__(self, static_parameters: StaticParameters, tire_model=None, friction=None):
+        super(VehicleModel, self).__init__()
+        self.static_parameters = static_parameters
+        sp = static_parameters
+        self.long_f = sp.body.lf
+        self.long_r = sp.body.lr
+        self.lat_l = sp.body.wl
+        self.lat_r = sp.body.wr
+        self.longitudinal_distance = np.array([self.long_f, -self.long_r, self.long_f, -self.long_r])
+        self.lateral_distance = np.array([self.lat_l, self.lat_l, -self.lat_r, -self.lat_r])
+
+        self.dynamic_radius = sp.tire.dynamic_radius
+        self.tire_model = MagicFormula.from_static_parameters(sp) if tire_model is None else tire_model
+        self.friction = friction
+        self.contact_points = ContactPoints(sp)
+
+        w = self.lat_l + self.lat_r
+        self.ξ_lon = np.array([-1/2, 1/2, -1/2, 1/2])
+        self.ξ_lat = np.array([- self.long_r/w, - self.long_f/w, self.long_r/w, self.long_f/w])
+        self.static_load = (sp.sprung_mass + sp.suspension.unsprung_mass) * sp.gravity
+        self.anti_roll_bar = sp.suspension.roll_bar_stiffness / (2 * self.lateral_distance)
+        self.total_sprung_mass = np.sum(sp.sprung_mass)
+        self.hsr = sp.suspension.roll_centre_height - sp.body.sz
+        self.hsp = sp.suspension.pitch_centre_height - sp.body.sz
+
+    def inputs(self, current_state: CurrentStates, steering_input: float):
+        """ quantities held during one step: steering, wheel torque, gear and the previous accelerations.
+        Converts the steering input into current_state.delta as Wheels does. """
+        sp = self.static_parameters
+        current_state.delta = steering_input * sp.steering.maximum_steering_angle / sp.steering.ratio
+        final_ratio = sp.powertrain.gearbox.gear_ratio[current_state.gear] * sp.powertrain.differential.ratio
+        wheel_inertia = sp.tire.inertia + sp.powertrain.gearbox.inertia * final_ratio ** 2 + sp.powertrain.differential.driveshaft_inertia * sp.powertrain.differential.ratio ** 2
+        delta = current_state.delta
+        friction_scale = None
+        if self.friction is not None:
+            x_a = current_state.x_a
+            friction_scale = np.array(self.friction.scales(*self.contact_points(x_a.x, x_a.y, x_a.sin_yaw, x_a.cos_yaw)))
+        return ModelInputs(np.array([delta, 0.0, delta, 0.0]), current_state.powertrain_net_torque.copy(), wheel_inertia,
+                           current_state.x_a.acc_x, current_state.x_a.acc_y, current_state.displacement.road.copy(), current_state.reference_zCG,
+                           friction_scale)
+
+    @staticmethod
+    def pack(current_state: CurrentStates):
+        x_a = current_state.x_a
+        return np.array([x_a.x, x_a.y, x_a.z, x_a.roll, x_a.pitch, x_a.yaw,
+                         x_a.vx, x_a.vy, x_a.vz, x_a.wx, x_a.wy, x_a.wz, *current_state.wheel_w_vel])
+
+    def kinematics(self, y):
+        """ rates of the positions (x, y, z, roll, pitch, yaw) """
+        sin_Ψ, cos_Ψ = np.sin(y[5]), np.cos(y[5])
+        return np.array([y[6] * cos_Ψ - y[7] * sin_Ψ, y[6] * sin_Ψ + y[7] * cos_Ψ, y[8], y[9], y[10], y[11]])
+
+    def derivatives(self, y, inputs: ModelInputs):
+        return self.evaluate(y, inputs).derivatives
+
+    def evaluate(self, y, inputs: ModelInputs):
+        sp = self.static_parameters
+        MINIMUM_SPEED_VALUE = self.MINIMUM_SPEED_VALUE
+        z, roll, pitch, yaw, vx, vy, vz, wx, wy, wz = y[2:12]
+        wheel_w_vel = y[12:16]
+        sin_Ф, cos_Ф = np.sin(roll), np.cos(roll)
+        sin_θ, cos_θ = np.sin(pitch), np.cos(pitch)
+        m = sp.body.mass
+
+        # Suspension and wheel loads (Body)
+        suspension = z - inputs.reference_zCG - (self.longitudinal_distance * sin_θ) + (self.lateral_distance * sin_Ф) - inputs.road
+        suspension_dot = vz - self.longitudinal_distance * cos_θ * wy + self.lateral_distance * cos_Ф * wx
+        suspension_force = -(sp.suspension.damping_rate * suspension_dot) - (sp.suspension.spring_rate * suspension) + self.anti_roll_bar * sin_Ф
+        lateral_force_transfer = self.ξ_lat * (m * inputs.acc_y * sp.suspension.roll_centre_height / sp.track_width)
+        longitudinal_force_transfer = self.ξ_lon * (m * inputs.acc_x * sp.suspension.pitch_centre_height / sp.wheel_base)
+        wheel_load_z = self.static_load + suspension_force + longitudinal_force_transfer + lateral_force_transfer
+
+        # Slip (Wheels)
+        wheel_speed = self.dynamic_radius * wheel_w_vel
+        if abs(vx) <= MINIMUM_SPEED_VALUE:
+            slip_x = (wheel_speed - vx) / MINIMUM_SPEED_VALUE
+        else:
+            slip_x = (wheel_speed - vx) / np.maximum(np.absolute(wheel_speed), np.absolute(vx))
+        if vx <= MINIMUM_SPEED_VALUE and -wz * self.lat_r <= MINIMUM_SPEED_VALUE:
+            slip_y = inputs.wheel_delta - np.arctan((vy + self.longitudinal_distance * wz) / MINIMUM_SPEED_VALUE)
+        else:
+            slip_y = inputs.wheel_delta - np.arctan((vy + self.longitudinal_distance * wz) / (vx - self.lateral_distance * wz))
+
+        # Tire model (Wheels)
+        fx, fy = self.tire_model.forces(wheel_load_z, slip_x, slip_y)
+        if inputs.friction is not None:
+            fx, fy = fx * inputs.friction, fy * inputs.friction
+        force_x, force_y = self.tire_model.to_vehicle(fx, fy, inputs.wheel_delta)
+
+        pho_r_2dot = (inputs.powertrain_net_torque - fx * self.dynamic_radius - sp.tire.rolling_resistance_coefficient * wheel_load_z) / inputs.wheel_inertia
+        pho_r_2dot = np.where((wheel_w_vel <= 0.0) & (pho_r_2dot < 0.0), 0.0, pho_r_2dot)
+
+        # Chassis (Body)
+        sum_fx, sum_fy = np.sum(force_x), np.sum(force_y)
+        acc_x = (sum_fx - 0.5 * sp.aerodynamics_front * vx**2) / m
+        vx_dot = acc_x + vy * wz
+        if vx <= 0.0 and vx_dot < 0.0:
+            acc_x = vx_dot = 0.0
+        acc_y = sum_fy / m
+        acc_z = np.sum(suspension_force) / m
+
+        Mz = (force_y[0] + force_y[2]) * self.long_f - (force_y[1] + force_y[3]) * self.long_r + (force_x[3] + force_x[2]) * self.lat_r + (force_x[1] + force_x[0]) * (-self.lat_l)
+        wx_dot = (np.sum(self.lateral_distance * suspension_force) + self.total_sprung_mass * self.hsr * (acc_y + sp.gravity * sin_Ф)) / sp.body.i_x_s
+        wy_dot = -(np.sum(self.longitudinal_distance * suspension_force) + self.total_sprung_mass * self.hsp * (acc_x - sp.gravity * sin_θ)) / sp.body.i_y_s
+        wz_dot = Mz / sp.body.i_z
+
+        sin_Ψ, cos_Ψ = np.sin(yaw), np.cos(yaw)
+        derivatives = np.array([vx * cos_Ψ - vy * sin_Ψ, vx * sin_Ψ + vy * cos_Ψ, vz, wx, wy, wz,
+                                vx_dot, acc_y - vx * wz, acc_z, wx_dot, wy_dot, wz_dot, *pho_r_2dot])
+
+        return ModelOutputs(derivatives, slip_x, slip_y, fx, fy, np.array([force_x, force_y, wheel_load_z]), wheel_load_z,
+                            suspension, suspension_dot, suspension_force, acc_x, acc_y, acc_z, wx_dot, wy_dot, wz_dot, pho_r_2dot)
+
+    def project(self, y):
+        """ vx and the wheel speeds do not become negative (the clamps of Body and Wheels) """
+        if y[6] <= 0.0:
+            y[6] = 0.0
+        np.maximum(y[12:16], 0.0, out=y[12:16])
+        return y
+
+    def store(self, current_state: CurrentStates, y, inputs: ModelInputs):
+        """ writes the state y and the quantities evaluated at y back into current_state """
+        outputs = self.evaluate(y, inputs)
+        x_a = current_state.x_a
+        x_a.x, x_a.y, x_a.z, x_a.roll, x_a.pitch, x_a.yaw, x_a.vx, x_a.vy, x_a.vz, x_a.wx, x_a.wy, x_a.wz = y[:12].tolist()
+        x_a.acc_x, x_a.acc_y, x_a.acc_z = outputs.acc_x, outputs.acc_y, outputs.acc_z
+        x_a.wx_dot, x_a.wy_dot, x_a.wz_dot = outputs.wx_dot, outputs.wy_dot, outputs.wz_dot
+        current_state.wheel_w_vel = y[12:16]
+        previous_slip_y = current_state.slip_y.copy()
+        current_state.slip_x = outputs.slip_x
+        current_state.slip_y = outputs.slip_y
+        current_state.slip_y_rate = (previous_slip_y - outputs.slip_y) / self.static_parameters.time_step
+        current_state.x_rf.fx = outputs.fx
+        current_state.x_rf.fy = outputs.fy
+        current_state.x_rf.wheel_forces_transformed_force2vehicle_sys = outputs.wheel_forces
+        current_state.x_rr.pho_r_2dot = outputs.pho_r_2dot
+        current_state.f_zr.wheel_load_z = outputs.wheel_load_z
+        current_state.compiled_wheel_forces = np.array([outputs.fx, outputs.fy, outputs.wheel_load_z])
+        current_state.displacement.suspension = outputs.suspension
+        current_state.displacement.suspension_dot = outputs.suspension_dot
+        current_state.suspension_force = outputs.suspension_force
+        return current_state
@@ -3,17 +3,24 @@ from vehicle_dynamics.structures.StateVector import StateVector
 from vehicle_dynamics.utils.CurrentStates import CurrentStates
 from vehicle_dynamics.utils.import_data_CM import import_data_CM
 from vehicle_dynamics.utils.LocalLogger import LocalLogger
-from vehicle_dynamics.utils.plot_function import plot_function
+from vehicle_dynamics.modules.tire_model import MagicFormula
+from vehicle_dynamics.modules.road import ContactPoints
 from copy import copy
-import matplotlib.pyplot as plt
 import numpy as np
 import logging
-import yaml 
 
 
 class Wheels:
-    def __init__(self, static_parameters, logger: logging.Logger):
+    """
+        friction: map of the friction scale of the road (modules/friction.py FrictionMap or
+        FrictionGrid, any object with scales(xs, ys)), read under the four contact patches
+        every tick; it scales the peak friction D of the tire forces. None keeps D of the tire.
+    """
+
+    def __init__(self, static_parameters, logger: logging.Logger, time_step=None, tire_model=None, friction=None):
         self.static_parameters = static_parameters
+        # step of the wheel speed integration, shorter than static_parameters.time_step when the wheels are sub-stepped
+        self.time_step = static_parameters.time_step if time_step is None else time_step
         # x-position from Vehicle CoG to the front axle [m]
         self.long_f = static_parameters.body.lf
         # x-position from Vehicle Cog to the rear axle [m]
@@ -22,7 +29,20 @@ class Wheels:
         self.lat_l = static_parameters.body.wl
         # y-position from Vehicle CoG to the right chassis point  [m]
         self.lat_r = -static_parameters.body.wr
-        pass
+        # tire force model, the Magic Formula coefficients of static_parameters by default
+        self.tire_model = MagicFormula.from_static_parameters(static_parameters) if tire_model is None else tire_model
+        self.friction = friction
+        self.contact_points = ContactPoints(static_parameters)
+
+        # parameters read every tick
+        self.maximum_steering_angle = static_parameters.steering.maximum_steering_angle
+        self.steering_ratio = static_parameters.steering.ratio
+        self.dynamic_radius = static_parameters.tire.dynamic_radius
+        self.rolling_resistance_coefficient = static_parameters.tire.rolling_resistance_coefficient
+        # inertia seen by each wheel in every gear [Kgm^2]
+        powertrain = static_parameters.powertrain
+        self.wheel_inertia = [static_parameters.tire.inertia + powertrain.gearbox.inertia * final_ratio ** 2 + powertrain.differential.driveshaft_inertia * powertrain.differential.ratio ** 2
+                              for final_ratio in powertrain.gearbox.gear_ratio * powertrain.differential.ratio]
 
     def wheels(self, current_state: CurrentStates, steering_input: float):
         """
@@ -52,16 +72,17 @@ class Wheels:
 
         """
         # Convert Steering input [-1,1] to wheel steering (delta)
-        steering_angle = steering_input * self.static_parameters.steering.maximum_steering_angle 
-        current_state.delta = steering_angle / self.static_parameters.steering.ratio
+        steering_angle = steering_input * self.maximum_steering_angle
+        current_state.delta = steering_angle / self.steering_ratio
 
         # Slip Calculation
         MINIMUM_SPEED_VALUE = 15
-        if (abs(self.static_parameters.tire.dynamic_radius * current_state.wheel_w_vel).all() <= MINIMUM_SPEED_VALUE) and (abs(current_state.x_a.vx) <= MINIMUM_SPEED_VALUE):
-            current_state.slip_x = ((((self.static_parameters.tire.dynamic_radius * current_state.wheel_w_vel) - current_state.x_a.vx) / (MINIMUM_SPEED_VALUE)))
+        wheel_speed = self.dynamic_radius * current_state.wheel_w_vel
+        if (abs(wheel_speed).all() <= MINIMUM_SPEED_VALUE) and (abs(current_state.x_a.vx) <= MINIMUM_SPEED_VALUE):
+            current_state.slip_x = (((wheel_speed - current_state.x_a.vx) / (MINIMUM_SPEED_VALUE)))
         else:
             # equation 11.30 Bardini
-            current_state.slip_x = ((((self.static_parameters.tire.dynamic_radius * current_state.wheel_w_vel) - current_state.x_a.vx) / np.maximum(np.absolute(self.static_parameters.tire.dynamic_radius * current_state.wheel_w_vel), np.absolute(current_state.x_a.vx))))
+            current_state.slip_x = ((wheel_speed - current_state.x_a.vx) / np.maximum(np.absolute(wheel_speed), np.absolute(current_state.x_a.vx)))
 
 
         previous_slip_y = copy(current_state.slip_y)
@@ -77,25 +98,28 @@ class Wheels:
             current_state.slip_y[2] = (current_state.delta - np.arctan((current_state.x_a.vy + self.long_f * current_state.x_a.wz) / (current_state.x_a.vx - self.lat_r * current_state.x_a.wz))) #- self.static_parameters.tire.relaxation*current_state.slip_y_rate[2]/current_state.x_a.vx   # Front Right
             current_state.slip_y[3] = (- np.arctan((current_state.x_a.vy + self.long_r * current_state.x_a.wz) / (current_state.x_a.vx - self.lat_r * current_state.x_a.wz))) #- self.static_parameters.tire.relaxation*current_state.slip_y_rate[3]/current_state.x_a.vx # Rear Right
 
-        current_state.slip_y_rate = (previous_slip_y - current_state.slip_y)/self.static_parameters.time_step
+        current_state.slip_y_rate = (previous_slip_y - current_state.slip_y)/self.time_step
 
         # Tire Model
 
-        current_state.x_rf.fx = current_state.f_zr.wheel_load_z * self.static_parameters.tire.longitudinal.peak_friction * np.sin(self.static_parameters.tire.longitudinal.shape_factor * np.arctan((self.static_parameters.tire.longitudinal.slip_stiffness / (self.static_parameters.tire.longitudinal.shape_factor * self.static_parameters.tire.longitudinal.peak_friction)) * current_state.slip_x))
-        current_state.x_rf.fy = current_state.f_zr.wheel_load_z * self.static_parameters.tire.lateral.peak_friction * np.sin(self.static_parameters.tire.lateral.shape_factor * np.arctan((self.static_parameters.tire.lateral.cornering_coefficient / (self.static_parameters.tire.lateral.shape_factor * self.static_parameters.tire.lateral.peak_friction)) * current_state.slip_y))
-
-
+        fx, fy = self.tire_model.forces(current_state.f_zr.wheel_load_z, current_state.slip_x, current_state.slip_y)
+        if self.friction is not None:
+            # D scales both forces, the shape and the stiffness factor B are kept
+            x_a = current_state.x_a
+            friction_scale = np.array(self.friction.scales(*self.contact_points(x_a.x, x_a.y, x_a.sin_yaw, x_a.cos_yaw)))
+            fx, fy = fx * friction_scale, fy * friction_scale
+        current_state.x_rf.fx = fx
+        current_state.x_rf.fy = fy
 
-        current_state.compiled_wheel_forces = np.array([current_state.x_rf.fx, current_state.x_rf.fy, current_state.f_zr.wheel_load_z])
+        current_state.compiled_wheel_forces = np.array([fx, fy, current_state.f_zr.wheel_load_z])
 
         delta = np.array([current_state.delta, 0.0, current_state.delta, 0.0])  # FL, RL, FR, RR
-        for i in range(4):
-            current_state.x_rf.wheel_forces_transformed_force2vehicle_sys[0, i] = current_state.x_rf.fx[i] * np.cos(delta[i]) - current_state.x_rf.fy[i] * np.sin(delta[i])
-            current_state.x_rf.wheel_forces_transformed_force2vehicle_sys[1, i] = current_state.x_rf.fy[i] * np.cos(delta[i]) + current_state.x_rf.fx[i] * np.sin(delta[i]) 
+        force_x, force_y = self.tire_model.to_vehicle(fx, fy, delta)
+        current_state.x_rf.wheel_forces_transformed_force2vehicle_sys[0, :] = force_x
+        current_state.x_rf.wheel_forces_transformed_force2vehicle_sys[1, :] = force_y
 
-        final_ratio = self.static_parameters.powertrain.gearbox.gear_ratio[current_state.gear] * self.static_parameters.powertrain.differential.ratio
-        current_state.x_rr.pho_r_2dot = (current_state.powertrain_net_torque - current_state.x_rf.fx * self.static_parameters.tire.dynamic_radius - self.static_parameters.tire.rolling_resistance_coefficient*current_state.f_zr.wheel_load_z) / (self.static_parameters.tire.inertia + self.static_parameters.powertrain.gearbox.inertia * final_ratio ** 2 + self.static_parameters.powertrain.differential.driveshaft_inertia * self.static_parameters.powertrain.differential.ratio ** 2)
-        current_state.wheel_w_vel = current_state.wheel_w_vel + (current_state.x_rr.pho_r_2dot * self.static_parameters.time_step)  # rad/s      
+        current_state.x_rr.pho_r_2dot = (current_state.powertrain_net_torque - fx * self.dynamic_radius - self.rolling_resistance_coefficient*current_state.f_zr.wheel_load_z) / self.wheel_inertia[current_state.gear]
+        current_state.wheel_w_vel = current_state.wheel_w_vel + (current_state.x_rr.pho_r_2dot * self.time_step)  # rad/s      
         for i in range(len(current_state.wheel_w_vel)):
             if current_state.wheel_w_vel[i] <= 0.0:
                 current_state.wheel_w_vel[i] = 0.0
@@ -1,8 +1,12 @@
+from vehicle_dynamics.structures.StateLayout import BufferedStructure
 import numpy as np
 
 
-class AngularWheelPosition(object):
+class AngularWheelPosition(BufferedStructure):
+    FIELDS = (("pho_r", (4,)), ("pho_r_dot", (4,)), ("pho_r_2dot", (4,)))
+
     def __init__(self, pho_r=np.zeros(4), pho_r_dot = np.zeros(4), pho_r_2dot = np.zeros(4)):
+        super(AngularWheelPosition, self).__init__()
 
         # pag 272 eq.52
         # Angular position/speed of each wheel
@@ -0,0 +1,98 @@
+"""
+Vehicle Dynamic Model - BatchCurrentStates Class
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+import numpy as np
+
+
+class BatchCurrentStates(object):
+    """Struct-of-arrays counterpart of CurrentStates for N vehicles advanced in lockstep.
+
+        Every channel of CurrentStates is stored as one array with the member index first:
+            - scalar channels (delta, engine_w, x_a fields, ...) have shape (N,)
+            - wheel channels (wheel_w_vel, slip_x, fx, ...) have shape (N, 4)
+            - wheel force matrices have shape (N, 3, 4) and sum_f_wheel (N, 3)
+
+        The x_a fields are flattened (vx instead of x_a.vx) and the Powertrain counters
+        (current_sync, current_grace_period, previous_throttle) are kept here as well, so
+        a subset of members can be taken out and put back as a whole.
+    """
+
+    SCALAR_CHANNELS = ("delta", "engine_w", "reference_zCG",
+                       "x", "y", "z", "roll", "pitch", "yaw",
+                       "vx", "vy", "vz", "wx", "wy", "wz",
+                       "acc_x", "acc_y", "acc_z", "wx_dot", "wy_dot", "wz_dot",
+                       "previous_throttle", "current_sync", "current_grace_period")
+    INTEGER_CHANNELS = ("gear",)
+    WHEEL_CHANNELS = ("wheel_w_vel", "slip_x", "slip_y", "slip_y_rate",
+                      "powertrain_net_torque", "suspension_force",
+                      "fx", "fy", "wheel_load_z", "pho_r_2dot",
+                      "suspension", "suspension_dot", "road")
+    MATRIX_CHANNELS = ("wheel_forces_transformed_force2vehicle_sys", "compiled_wheel_forces", "sum_f_wheel")
+    STATE_VECTOR_FIELDS = ("x", "y", "z", "roll", "pitch", "yaw",
+                           "vx", "vy", "vz", "wx", "wy", "wz",
+                           "acc_x", "acc_y", "acc_z", "wx_dot", "wy_dot", "wz_dot")
+
+    CHANNELS = SCALAR_CHANNELS + INTEGER_CHANNELS + WHEEL_CHANNELS + MATRIX_CHANNELS
+
+    def __init__(self, **channels):
+        super(BatchCurrentStates, self).__init__()
+        for name in self.CHANNELS:
+            setattr(self, name, channels[name])
+
+    def __len__(self):
+        return len(self.engine_w)
+
+    @classmethod
+    def from_current_states(cls, current_states):
+        """ Packs a list of CurrentStates (one per member) into a BatchCurrentStates """
+        channels = {}
+        for name in ("delta", "engine_w", "reference_zCG"):
+            channels[name] = np.array([float(getattr(state, name)) for state in current_states])
+        for name in cls.STATE_VECTOR_FIELDS:
+            channels[name] = np.array([float(getattr(state.x_a, name)) for state in current_states])
+        channels["previous_throttle"] = np.zeros(len(current_states))
+
+        channels["gear"] = np.array([int(state.gear) for state in current_states])
+        channels["current_sync"] = np.zeros(len(current_states))
+        channels["current_grace_period"] = np.zeros(len(current_states))
+
+        def stack(getter):
+            return np.array([np.array(getter(state), dtype=float) for state in current_states])
+
+        for name in ("wheel_w_vel", "slip_x", "slip_y", "slip_y_rate", "powertrain_net_torque", "suspension_force"):
+            channels[name] = stack(lambda state: getattr(state, name))
+        channels["fx"] = stack(lambda state: state.x_rf.fx)
+        channels["fy"] = stack(lambda state: state.x_rf.fy)
+        channels["wheel_load_z"] = stack(lambda state: state.f_zr.wheel_load_z)
+        channels["pho_r_2dot"] = stack(lambda state: state.x_rr.pho_r_2dot)
+        channels["suspension"] = stack(lambda state: state.displacement.suspension)
+        channels["suspension_dot"] = stack(lambda state: state.displacement.suspension_dot)
+        channels["road"] = stack(lambda state: state.displacement.road)
+
+        channels["wheel_forces_transformed_force2vehicle_sys"] = stack(lambda state: state.x_rf.wheel_forces_transformed_force2vehicle_sys)
+        channels["compiled_wheel_forces"] = stack(lambda state: state.compiled_wheel_forces)
+        channels["sum_f_wheel"] = stack(lambda state: state.sum_f_wheel)
+        return cls(**channels)
+
+    def take(self, index):
+        """ returns a new BatchCurrentStates holding a copy of the members in index """
+        return BatchCurrentStates(**{name: getattr(self, name)[index] for name in self.CHANNELS})
+
+    def put(self, index, other):
+        """ writes the members of other back into the positions given by index """
+        for name in self.CHANNELS:
+            getattr(self, name)[index] = getattr(other, name)
+
+    def finite(self):
+        """ returns a (N,) mask that is False for members holding a NaN or inf in any channel """
+        mask = np.ones(len(self), dtype=bool)
+        for name in self.SCALAR_CHANNELS:
+            mask &= np.isfinite(getattr(self, name))
+        for name in self.WHEEL_CHANNELS + self.MATRIX_CHANNELS:
+            values = getattr(self, name)
+            mask &= np.isfinite(values.reshape(len(values), -1)).all(axis=1)
+        return mask
@@ -0,0 +1,127 @@
+"""
+Vehicle Dynamic Model - BatchStaticParameters Structure
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from vehicle_dynamics.utils.LookupTable import LookupTable
+from vehicle_dynamics.modules.powertrain import interval_ticks
+
+import numpy as np
+
+
+def _stack_tables(tables):
+    """ stacks 1D tables of possibly different length into a (N, K) array, repeating the last entry as padding """
+    tables = [np.asarray(table, dtype=float) for table in tables]
+    length = max(table.shape[-1] for table in tables)
+    return np.array([np.concatenate([table, np.repeat(table[-1:], length - table.shape[-1])]) for table in tables])
+
+
+class BatchStaticParameters(object):
+    """Stacks the StaticParameters of N members into arrays with the member index first.
+
+        Scalar parameters become (N,) arrays and per wheel parameters (N, 4) arrays, so the
+        batch kernels can broadcast them against the BatchCurrentStates channels.
+        Lookup tables of different length are padded with their last entry and held as batched
+        LookupTable (one row per member), and gear tables
+        are padded with their last gear; n_gears keeps the real gear count of every member.
+        All members must share the same time_step, as they are advanced in lockstep.
+    """
+
+    def __init__(self, static_parameters):
+        super(BatchStaticParameters, self).__init__()
+        if not static_parameters:
+            raise ValueError("BatchStaticParameters needs at least one member")
+
+        time_steps = {sp.time_step for sp in static_parameters}
+        if len(time_steps) != 1:
+            raise ValueError(f"all members must share the same time_step, got {sorted(time_steps)}")
+        self.time_step = time_steps.pop()
+
+        def scalar(getter, dtype=float):
+            return np.array([getter(sp) for sp in static_parameters], dtype=dtype)
+
+        def wheel(getter):
+            return np.array([np.broadcast_to(np.asarray(getter(sp), dtype=float), (4,)) for sp in static_parameters])
+
+        # Powertrain
+        # one row per member; out of range values are reported by out_of_range() instead of raising
+        self.torque_interpolation = LookupTable(_stack_tables([sp.powertrain.engine.w_table for sp in static_parameters]),
+                                                _stack_tables([sp.powertrain.engine.torque_max for sp in static_parameters]), bounds_error=False)
+        self.μ_funct = LookupTable(_stack_tables([sp.powertrain.torque_converter.speed_ratio for sp in static_parameters]),
+                                   _stack_tables([sp.powertrain.torque_converter.ratio for sp in static_parameters]), bounds_error=False)
+        self.k_in_funct = LookupTable(_stack_tables([np.linspace(0., 1., len(sp.powertrain.torque_converter.factor)) for sp in static_parameters]),
+                                      _stack_tables([sp.powertrain.torque_converter.factor for sp in static_parameters]), bounds_error=False)
+
+        self.n_gears = scalar(lambda sp: sp.powertrain.gearbox.gear_ratio.size, dtype=int)
+        gears = self.n_gears.max()
+        self.gear_ratio = np.array([np.pad(np.asarray(sp.powertrain.gearbox.gear_ratio, dtype=float), (0, gears - sp.powertrain.gearbox.gear_ratio.size), mode="edge") for sp in static_parameters])
+        self.gear_max_rpm = np.array([np.pad(np.asarray(sp.powertrain.gearbox.gear_max_rpm, dtype=float), ((0, 0), (0, gears - sp.powertrain.gearbox.gear_ratio.size)), mode="edge") for sp in static_parameters])
+        self.gear_min_rpm = np.array([np.pad(np.asarray(sp.powertrain.gearbox.gear_min_rpm, dtype=float), ((0, 0), (0, gears - sp.powertrain.gearbox.gear_ratio.size)), mode="edge") for sp in static_parameters])
+
+        self.MIN_GEAR_CHANGE_INTERVAL = scalar(lambda sp: interval_ticks(sp.powertrain.gearbox.MIN_GEAR_CHANGE_INTERVAL, sp.time_step))
+        self.CONVERTER_SYNC_TIME = scalar(lambda sp: interval_ticks(sp.powertrain.torque_converter.CONVERTER_SYNC_TIME, sp.time_step))
+        self.THROTTLE_CHANGE_INTERVAL = interval_ticks(2, self.time_step)
+        self.lock_up_ratio = scalar(lambda sp: sp.powertrain.torque_converter.lock_up_ratio)
+        self.engine_inertia = scalar(lambda sp: sp.powertrain.engine.inertia)
+        self.idle_rpm = scalar(lambda sp: sp.powertrain.engine.idle_rpm)
+        self.maximum_rpm = scalar(lambda sp: sp.powertrain.engine.maximum_rpm)
+        self.gearbox_efficiency = scalar(lambda sp: sp.powertrain.gearbox.efficiency)
+        self.gearbox_inertia = scalar(lambda sp: sp.powertrain.gearbox.inertia)
+        self.differential_ratio = scalar(lambda sp: sp.powertrain.differential.ratio)
+        self.driveshaft_inertia = scalar(lambda sp: sp.powertrain.differential.driveshaft_inertia)
+        self.bias = wheel(lambda sp: sp.powertrain.bias)
+        self.max_braking_torque = scalar(lambda sp: sp.brake.max_braking_torque)
+        self.brake_bias = wheel(lambda sp: sp.brake.brake_bias)
+
+        # Steering and tires
+        self.maximum_steering_angle = scalar(lambda sp: sp.steering.maximum_steering_angle)
+        self.steering_ratio = scalar(lambda sp: sp.steering.ratio)
+        self.dynamic_radius = wheel(lambda sp: sp.tire.dynamic_radius)
+        self.tire_inertia = wheel(lambda sp: sp.tire.inertia)
+        self.rolling_resistance_coefficient = scalar(lambda sp: sp.tire.rolling_resistance_coefficient)
+        self.longitudinal_peak_friction = scalar(lambda sp: sp.tire.longitudinal.peak_friction)
+        self.longitudinal_shape_factor = scalar(lambda sp: sp.tire.longitudinal.shape_factor)
+        self.longitudinal_slip_stiffness = scalar(lambda sp: sp.tire.longitudinal.slip_stiffness)
+        self.lateral_peak_friction = scalar(lambda sp: sp.tire.lateral.peak_friction)
+        self.lateral_shape_factor = scalar(lambda sp: sp.tire.lateral.shape_factor)
+        self.lateral_cornering_coefficient = scalar(lambda sp: sp.tire.lateral.cornering_coefficient)
+
+        # Body and suspension
+        self.lf = scalar(lambda sp: sp.body.lf)
+        self.lr = scalar(lambda sp: sp.body.lr)
+        self.wl = scalar(lambda sp: sp.body.wl)
+        self.wr = scalar(lambda sp: sp.body.wr)
+        self.sz = scalar(lambda sp: sp.body.sz)
+        self.mass = scalar(lambda sp: sp.body.mass)
+        self.i_x_s = scalar(lambda sp: sp.body.i_x_s)
+        self.i_y_s = scalar(lambda sp: sp.body.i_y_s)
+        self.i_z = scalar(lambda sp: sp.body.i_z)
+        self.sprung_mass = wheel(lambda sp: sp.sprung_mass)
+        self.unsprung_mass = wheel(lambda sp: sp.suspension.unsprung_mass)
+        self.spring_rate = wheel(lambda sp: sp.suspension.spring_rate)
+        self.damping_rate = wheel(lambda sp: sp.suspension.damping_rate)
+        self.roll_bar_stiffness = scalar(lambda sp: sp.suspension.roll_bar_stiffness)
+        self.roll_centre_height = scalar(lambda sp: sp.suspension.roll_centre_height)
+        self.pitch_centre_height = scalar(lambda sp: sp.suspension.pitch_centre_height)
+        self.wheel_base = scalar(lambda sp: sp.wheel_base)
+        self.track_width = scalar(lambda sp: sp.track_width)
+        self.aerodynamics_front = scalar(lambda sp: sp.aerodynamics_front)
+        self.gravity = scalar(lambda sp: sp.gravity)
+
+        # Wheel positions relative to the CoG, FL, RL, FR, RR
+        self.longitudinal_distance = np.stack([self.lf, -self.lr, self.lf, -self.lr], axis=1)
+        self.lateral_distance = np.stack([self.wl, self.wl, -self.wr, -self.wr], axis=1)
+
+    def __len__(self):
+        return len(self.mass)
+
+    def take(self, index):
+        """ returns a new BatchStaticParameters holding only the members in index """
+        subset = object.__new__(BatchStaticParameters)
+        for name, value in vars(self).items():
+            if isinstance(value, (np.ndarray, LookupTable)):
+                value = value.take(index) if isinstance(value, LookupTable) else value[index]
+            setattr(subset, name, value)
+        return subset
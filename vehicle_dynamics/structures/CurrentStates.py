@@ -13,22 +13,53 @@ from vehicle_dynamics.structures.Displacement import Displacement
 from vehicle_dynamics.structures.StrutForce import StrutForce
 from vehicle_dynamics.structures.WheelHubForce import WheelHubForce
 from vehicle_dynamics.structures.AngularWheelPosition import AngularWheelPosition
+from vehicle_dynamics.structures.StateLayout import BufferedStructure
 
 from vehicle_dynamics.utils.import_data_CM import import_data_CM
 from vehicle_dynamics.utils.LocalLogger import LocalLogger
 
-from scipy.interpolate import interp1d
 from numpy.linalg import inv
 import numpy as np
-import yaml
 import math 
 
 
-class CurrentStates(object):
-    """This class initialize the values of a vehicular dynamic model. """
+VALIDATION_MODES = ("strict", "end_of_tick", "off")
 
-    def __init__(self, static_parameters, freq = 1000, initial_state = np.zeros(15), initial_gear = 1, logger = 1):
+
+class CurrentStates(BufferedStructure):
+    """This class initialize the values of a vehicular dynamic model.
+
+        Every state lives in one contiguous float64 array, current_states.buffer: the scalar
+        channels are stored at fixed offsets, the array channels (slip_x, x_rf.fx, ...) are
+        views into it and the structures (x_a, x_rf, ...) work on their part of it. Copying
+        the buffer is a complete snapshot of the state; LAYOUT.flat() gives the offset and
+        shape of every channel.
+
+        validation selects how the states are checked for NaN/inf:
+            "strict"      every property setter checks its value (default)
+            "end_of_tick" the setters do not check, check_finite() is called once per tick
+                          on the packed state by VehicleDynamics
+            "off"         no check, for trusted production runs
+        The errors name the offending channel, VehicleDynamics adds the tick.
+    """
+
+    FIELDS = (("delta", ()), ("engine_w", ()), ("gear", ()), ("reference_zCG", ()),
+              ("wheel_w_vel", (4,)), ("compiled_wheel_forces", (3, 4)), ("sum_f_wheel", (3,)),
+              ("slip_x", (4,)), ("slip_y", (4,)), ("slip_y_rate", (4,)),
+              ("powertrain_net_torque", (4,)), ("suspension_force", (4,)),
+              ("x_a", StateVector), ("x_rr", AngularWheelPosition), ("x_rf", TireForces),
+              ("displacement", Displacement), ("f_zr", WheelHubForce), ("f_za", StrutForce))
+    CHECKED_FIELDS = ("delta", "engine_w", "gear", "wheel_w_vel", "x_a", "reference_zCG", "x_rr", "x_rf",
+                      "displacement", "f_zr", "f_za", "compiled_wheel_forces", "sum_f_wheel",
+                      "slip_x", "slip_y", "powertrain_net_torque", "suspension_force")
+    INTEGER_FIELDS = ("gear",)
+
+    def __init__(self, static_parameters, freq = 1000, initial_state = np.zeros(15), initial_gear = 1, logger = 1, validation = "strict"):
         super(CurrentStates, self).__init__()
+        if validation not in VALIDATION_MODES:
+            raise ValueError(f"validation must be one of {VALIDATION_MODES}, got {validation}")
+        self._validation = validation
+        self.validate = validation == "strict"
         self.delta = 0
 
         self.engine_w = static_parameters.powertrain.engine.idle_rpm
@@ -128,174 +159,18 @@ class CurrentStates(object):
 
 
     @property
-    def delta(self):
-        return self._delta
-
-    @delta.setter
-    def delta(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"delta was set as {value}")
-        self._delta = value
-
-    @property
-    def engine_w(self):
-        return self._engine_w
-
-    @engine_w.setter
-    def engine_w(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"engine_w was set as {value}")
-        self._engine_w = value
-
-    @property
-    def gear(self):
-        return self._gear
-
-    @gear.setter
-    def gear(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"gear was set as {value}")
-        self._gear = value
-
-    @property
-    def wheel_w_vel(self):
-        return self._wheel_w_vel
-
-    @wheel_w_vel.setter
-    def wheel_w_vel(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"wheel_w_vel was set as {value}")
-        self._wheel_w_vel = value
-
-    @property
-    def x_a(self):
-        return self._x_a
-
-    @x_a.setter
-    def x_a(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"x_a was set as {value}")
-        self._x_a = value
-
-    @property
-    def reference_zCG(self):
-        return self._reference_zCG
-
-    @reference_zCG.setter
-    def reference_zCG(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"reference_zCG was set as {value}")
-        self._reference_zCG = value
-
-    @property
-    def x_rr(self):
-        return self._x_rr
-
-    @x_rr.setter
-    def x_rr(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"x_rr was set as {value}")
-        self._x_rr = value
-
-    @property
-    def x_rf(self):
-        return self._x_rf
+    def validation(self):
+        return self._validation
 
-    @x_rf.setter
-    def x_rf(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"x_rf was set as {value}")
-        self._x_rf = value
-
-    @property
-    def displacement(self):
-        return self._displacement
-
-    @displacement.setter
-    def displacement(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"displacement was set as {value}")
-        self._displacement = value
-
-    @property
-    def f_zr(self):
-        return self._f_zr
-
-    @f_zr.setter
-    def f_zr(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"f_zr was set as {value}")
-        self._f_zr = value
-
-    @property
-    def f_za(self):
-        return self._f_za
-
-    @f_za.setter
-    def f_za(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"f_za was set as {value}")
-        self._f_za = value
-
-    @property
-    def compiled_wheel_forces(self):
-        return self._compiled_wheel_forces
-
-    @compiled_wheel_forces.setter
-    def compiled_wheel_forces(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"compiled_wheel_forces was set as {value}")
-        self._compiled_wheel_forces = value
-
-    @property
-    def sum_f_wheel(self):
-        return self._sum_f_wheel
-
-    @sum_f_wheel.setter
-    def sum_f_wheel(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"sum_f_wheel was set as {value}")
-        self._sum_f_wheel = value
-
-    @property
-    def slip_x(self):
-        return self._slip_x
-
-    @slip_x.setter
-    def slip_x(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"slip_x was set as {value}")
-        self._slip_x = value
-
-    @property
-    def slip_y(self):
-        return self._slip_y
-
-    @slip_y.setter
-    def slip_y(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"slip_y was set as {value}")
-        self._slip_y = value
-
-    @property
-    def powertrain_net_torque(self):
-        return self._powertrain_net_torque
-
-    @powertrain_net_torque.setter
-    def powertrain_net_torque(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"powertrain_net_torque was set as {value}")
-        self._powertrain_net_torque = value
-
-    @property
-    def suspension_force(self):
-        return self._suspension_force
-
-    @suspension_force.setter
-    def suspension_force(self, value):
-        if np.isnan(value).any() or np.isinf(value).any():
-            raise ValueError(f"suspension_force was set as {value}")
-        self._suspension_force = value
+    def check_finite(self):
+        """ one vectorized NaN/inf check over the whole state buffer,
+        raises a ValueError naming the offending channels """
+        finite = np.isfinite(self.buffer)
+        if finite.all():
+            return
+        offending = [name for name, (offset, shape) in self.LAYOUT.flat().items()
+                     if not finite[offset:offset + int(np.prod(shape, dtype=int))].all()]
+        raise ValueError(f"{', '.join(offending)} set as NaN/inf")
 
 
 def main():
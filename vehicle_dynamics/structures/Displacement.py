@@ -1,8 +1,12 @@
+from vehicle_dynamics.structures.StateLayout import BufferedStructure
 import numpy as np
 
 
-class Displacement(object):
+class Displacement(BufferedStructure):
+    FIELDS = tuple((name, (4,)) for name in ("static_suspension", "suspension", "suspension_dot", "zr_2dot", "zr_dot", "road"))
+
     def __init__(self, static_suspension, suspension=np.zeros(4), suspension_dot=np.zeros(4), zr_dot=np.zeros(4), zr_2dot = np.zeros(4), road =np.zeros(4)):
+        super(Displacement, self).__init__()
         self.static_suspension = static_suspension
         self.suspension = suspension
         self.suspension_dot = suspension_dot
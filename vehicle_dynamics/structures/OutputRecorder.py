@@ -0,0 +1,126 @@
+from vehicle_dynamics.structures.OutputStates import OutputState
+from vehicle_dynamics.structures.CurrentStates import CurrentStates
+from types import SimpleNamespace
+import numpy as np
+
+
+class ChannelGroup(object):
+    """Columnar view over the recorded fields of one structure (x_a, x_rf, ...)
+
+        group.vx returns the column of every recorded tick, group[i] and iteration
+        return a record per tick with the same attributes as the original structure,
+        so [i.vx for i in output_states[:].x_a] keeps working.
+    """
+
+    def __init__(self, recorder, paths):
+        self._recorder = recorder
+        self._paths = paths
+
+    def __getattr__(self, name):
+        try:
+            path = self.__dict__["_paths"][name]
+        except KeyError:
+            raise AttributeError(name) from None
+        return self._recorder.channel(path)
+
+    def __len__(self):
+        return len(self._recorder)
+
+    def __getitem__(self, items):
+        if isinstance(items, slice):
+            return [self[i] for i in range(*items.indices(len(self)))]
+        if items < 0:
+            items += len(self)
+        if not 0 <= items < len(self):
+            raise IndexError(f"tick {items} was not recorded")
+        return SimpleNamespace(**{name: self._recorder.channel(path)[items] for name, path in self._paths.items()})
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class OutputRecorder(object):
+    """OutputRecorder Class
+        drop-in replacement of OutputStates that preallocates a (T, L) array, sized from the
+        manoeuvre length, and copies the whole CurrentStates buffer into row t at every tick
+        instead of copying the structures. Scalar channels are columns of it and the wheel
+        quantities (T, 4) / (T, 3, 4) views, laid out as CurrentStates.LAYOUT. The recorder
+        grows if more ticks than expected are recorded.
+
+        Channels are available as arrays (output_states.engine_w, output_states.slip_x) and the
+        structures as ChannelGroup (output_states.x_a.vx), any parameter is available using the
+        .attribute[] operator as in OutputStates. rows returns the raw (T, L) buffer rows."""
+
+    CHANNELS = ("compiled_wheel_forces", "delta", "engine_w", "gear", "powertrain_net_torque", "slip_x",
+                "slip_y", "sum_f_wheel", "wheel_w_vel", "suspension_force")
+
+    GROUPS = {"x_a": ("x", "y", "z", "roll", "pitch", "yaw", "vx", "vy", "vz", "wx", "wy", "wz",
+                      "acc_x", "acc_y", "acc_z", "wx_dot", "wy_dot", "wz_dot"),
+              "x_rf": ("fx", "fy", "wheel_forces_transformed_force2vehicle_sys"),
+              "x_rr": ("pho_r", "pho_r_dot", "pho_r_2dot"),
+              "displacement": ("static_suspension", "suspension", "suspension_dot", "zr_2dot", "zr_dot", "road"),
+              "f_zr": ("f_zr_dot", "wheel_load_z"),
+              "f_za": ("f_za", "f_za_dot", "spring_force", "dumper_force")}
+
+    INTEGER_CHANNELS = ("gear",)
+
+    def __init__(self, size=1000, layout=CurrentStates.LAYOUT):
+        super(OutputRecorder, self).__init__()
+        self._capacity = max(len(size) if hasattr(size, "__len__") else int(size), 1)
+        self._length = 0
+        self._layout = layout.flat()
+        self._rows = np.zeros((self._capacity, layout.size))
+        self._groups = {group: ChannelGroup(self, {field: f"{group}.{field}" for field in fields})
+                        for group, fields in self.GROUPS.items()}
+
+    @classmethod
+    def from_rows(cls, rows, layout=CurrentStates.LAYOUT):
+        """ recorder holding already recorded (T, L) rows """
+        recorder = cls(len(rows), layout)
+        recorder._rows[:len(rows)] = rows
+        recorder._length = len(rows)
+        return recorder
+
+    def _grow(self):
+        self._capacity *= 2
+        grown = np.zeros((self._capacity, self._rows.shape[1]))
+        grown[:len(self._rows)] = self._rows
+        self._rows = grown
+
+    def channel(self, path):
+        """ recorded values of a channel of the layout ("engine_w", "x_a.vx", "x_rf.fx") """
+        offset, shape = self._layout[path]
+        values = self._rows[:self._length, offset:offset + int(np.prod(shape, dtype=int))].reshape((self._length,) + shape)
+        return values.astype(int) if path in self.INTEGER_CHANNELS else values
+
+    @property
+    def rows(self):
+        return self._rows[:self._length]
+
+    def __len__(self):
+        return self._length
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in self._groups:
+            return self._groups[name]
+        if name in self._layout:
+            return self.channel(name)
+        raise AttributeError(name)
+
+    def set_states(self, current_states):
+        if self._length == self._capacity:
+            self._grow()
+        self._rows[self._length] = current_states.buffer
+        self._length += 1
+
+    def __getitem__(self, items):
+        return OutputState(*(getattr(self, name) for name in OutputState._fields))
+
+    def padding(self, value):
+        while self._length + value > self._capacity:
+            self._grow()
+        self._rows[self._length:self._length + value] = self._rows[self._length - 1]
+        self._length += value
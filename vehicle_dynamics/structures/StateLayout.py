@@ -0,0 +1,202 @@
+"""
+Vehicle Dynamic Model - StateLayout Structure
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from copy import copy
+import numpy as np
+
+
+class StateLayout(object):
+    """Offsets of named fields packed one after the other in a float64 buffer.
+
+        fields is a sequence of (name, shape) where shape is a tuple (() for a scalar)
+        or a BufferedStructure subclass, whose own layout is nested at that offset.
+        flat() lists every leaf with its dotted path ("x_a.vx") as (offset, shape).
+    """
+
+    def __init__(self, fields):
+        super(StateLayout, self).__init__()
+        self.fields = {}
+        self.structures = {}
+        offset = 0
+        for name, shape in fields:
+            if isinstance(shape, type) and issubclass(shape, BufferedStructure):
+                self.structures[name] = shape
+                size = shape.LAYOUT.size
+            else:
+                shape = tuple(shape)
+                size = int(np.prod(shape, dtype=int))
+            self.fields[name] = (offset, shape)
+            offset += size
+        self.size = offset
+
+    def __len__(self):
+        return self.size
+
+    def slice(self, name):
+        offset, shape = self.fields[name]
+        size = shape.LAYOUT.size if name in self.structures else int(np.prod(shape, dtype=int))
+        return slice(offset, offset + size)
+
+    def flat(self, prefix="", offset=0):
+        """ dict of dotted path -> (offset, shape) of every scalar and array leaf """
+        leaves = {}
+        for name, (field_offset, shape) in self.fields.items():
+            if name in self.structures:
+                leaves.update(shape.LAYOUT.flat(f"{prefix}{name}.", offset + field_offset))
+            else:
+                leaves[f"{prefix}{name}"] = (offset + field_offset, shape)
+        return leaves
+
+    def names(self):
+        """ dotted path of every element of the buffer, arrays are expanded as name[i, j] """
+        names = []
+        for path, (offset, shape) in self.flat().items():
+            if shape == ():
+                names.append(path)
+            else:
+                names += [f"{path}[{', '.join(map(str, index))}]" for index in np.ndindex(*shape)]
+        return names
+
+
+class ScalarField(object):
+    """ float stored at an offset of the buffer; checked fields call obj.check() while obj.validate is set """
+
+    def __init__(self, name, offset=0, checked=False):
+        self.name = name
+        self.offset = offset
+        self.checked = checked
+
+    def place(self, name, offset, layout):
+        """ called when the owning class is created, with the offset of the field in its layout """
+        self.name = name
+        self.offset = offset
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return obj.buffer.item(self.offset)
+
+    def __set__(self, obj, value):
+        if self.checked and obj.validate:
+            obj.check(self.name, value)
+        obj.buffer[self.offset] = value
+
+
+class IntegerField(ScalarField):
+    """ integer (gear) stored as float in the buffer """
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return int(obj.buffer.item(self.offset))
+
+
+class ArrayField(object):
+    """ zero-copy view into the buffer, assigning copies the values into the view """
+
+    def __init__(self, name, index=0, checked=False):
+        self.name = name
+        self.index = index
+        self.checked = checked
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return obj._views[self.index]
+
+    def __set__(self, obj, value):
+        if self.checked and obj.validate:
+            obj.check(self.name, value)
+        obj._views[self.index][...] = value
+
+
+class StructureField(object):
+    """ nested BufferedStructure, assigning one adopts it: its values are copied into
+    the parent buffer and it keeps working on that part of the buffer """
+
+    def __init__(self, name, checked=False):
+        self.name = name
+        self.checked = checked
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return obj.__dict__[self.name]
+
+    def __set__(self, obj, value):
+        if self.checked and obj.validate:
+            obj.check(self.name, value)
+        value.bind(obj.buffer[type(obj).LAYOUT.slice(self.name)])
+        value.validate = obj.validate
+        obj.__dict__[self.name] = value
+
+
+class BufferedStructure(object):
+    """Base of the state structures: every field lives in one contiguous float64 buffer.
+
+        Subclasses declare FIELDS as (name, shape) pairs; scalars are read as Python floats,
+        arrays as views of the buffer and nested structures share the parent buffer, so
+        structure.buffer is a snapshot of the whole state in a single copy.
+        CHECKED_FIELDS are passed to check(name, value) when set while validate is True,
+        INTEGER_FIELDS are returned as int.
+    """
+
+    FIELDS = ()
+    CHECKED_FIELDS = ()
+    INTEGER_FIELDS = ()
+    validate = True
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.LAYOUT = StateLayout(cls.FIELDS)
+        arrays = 0
+        for name, (offset, shape) in cls.LAYOUT.fields.items():
+            checked = name in cls.CHECKED_FIELDS
+            declared = cls.__dict__.get(name)
+            if name in cls.LAYOUT.structures:
+                field = StructureField(name, checked)
+            elif shape != ():
+                field = ArrayField(name, arrays, checked)
+                arrays += 1
+            elif isinstance(declared, ScalarField):
+                field = declared
+                field.place(name, offset, cls.LAYOUT)
+            else:
+                field = (IntegerField if name in cls.INTEGER_FIELDS else ScalarField)(name, offset, checked)
+            setattr(cls, name, field)
+        cls._array_fields = [(name, cls.LAYOUT.slice(name), shape) for name, (offset, shape) in cls.LAYOUT.fields.items()
+                             if name not in cls.LAYOUT.structures and shape != ()]
+
+    def __init__(self):
+        super(BufferedStructure, self).__init__()
+        self.bind(np.zeros(self.LAYOUT.size), copy_values=False)
+
+    def bind(self, buffer, copy_values=True):
+        """ moves the structure onto buffer (a float64 array of LAYOUT.size), copying the current values into it """
+        if copy_values:
+            buffer[...] = self.buffer
+        self.buffer = buffer
+        self._views = [buffer[part].reshape(shape) for name, part, shape in self._array_fields]
+        for name in self.LAYOUT.structures:
+            if name in self.__dict__:
+                self.__dict__[name].bind(buffer[self.LAYOUT.slice(name)], copy_values=False)
+
+    def check(self, name, value):
+        if np.isnan(value).any() or np.isinf(value).any():
+            raise ValueError(f"{name} was set as {value}")
+
+    def __copy__(self):
+        """ detached copy owning its own buffer """
+        duplicate = object.__new__(type(self))
+        duplicate.__dict__.update(self.__dict__)
+        for name in self.LAYOUT.structures:
+            duplicate.__dict__[name] = copy(self.__dict__[name])
+        duplicate.bind(self.buffer.copy(), copy_values=False)
+        return duplicate
+
+    def __deepcopy__(self, memo):
+        return self.__copy__()
@@ -5,19 +5,74 @@ Vehicle Dynamic Model - StaticParameters Structure
 
 Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
 """
-import yaml
 import numpy as np
-from munch import DefaultMunch
 from copy import deepcopy
-import munch
+import hashlib
+import re
+
+# derived fields and the fields they are computed from, in the order they are computed
+DERIVED_FIELDS = {"wheel_base": ("body.lr", "body.lf"),
+                  "track_width": ("body.wl", "body.wr"),
+                  "wd": ("body.lr", "body.lf", "body.wl", "body.wr"),
+                  "sprung_mass": ("body.mass", "body.lr", "body.lf", "body.wl", "body.wr", "suspension.unsprung_mass"),
+                  "aerodynamics_front": ("aerodynamics.air_drag_coefficient", "aerodynamics.front_area", "aerodynamics.air_density")}
+
+_FIELD_PATH = re.compile(r"^([A-Za-z_][\w.]*?)((?:\[\d+\])*)$")
+
+# compiled StaticParameters by (sha256 of the YAML, frequency)
+_COMPILED = {}
+
+
+class ParameterGroup(dict):
+    """ read-only group of a compiled StaticParameters (powertrain, body, ...): fields are read as
+    attributes and a missing field reads as None, as with the DefaultMunch of a loaded one """
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self.get(name)
+
+    def __dir__(self):
+        return list(self.keys())
+
+    def _immutable(self, *args, **kwargs):
+        raise AttributeError("compiled StaticParameters are immutable, use derive()")
+
+    __setattr__ = __delattr__ = __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return (ParameterGroup, (dict(self),))
+
+
+def _freeze(value):
+    """ read-only copy of a field: dicts as ParameterGroup, arrays not writeable """
+    if isinstance(value, dict):
+        return ParameterGroup({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (np.ndarray, list)):
+        value = np.array(value)
+        value.flags.writeable = False
+    return value
 
 
 class StaticParameters(object):
-    
+    """
+        Parameters of a car YAML, with the engine speeds converted to rad/s and the derived
+        fields (DERIVED_FIELDS) computed.
+
+        StaticParameters.compile(path, freq) returns a cached immutable instance (one per YAML
+        content and frequency): its groups are ParameterGroup and its arrays read-only.
+        derive(overrides) returns a new immutable instance with some fields replaced that
+        shares every unchanged group and array and recomputes only the derived fields depending
+        on the replaced ones, e.g. for optimization loops.
+    """
+
     _initialized=False
+    _frozen = False
 
     def __init__(self, car_parameters_path, freq=1000, optimization=False):
         super(StaticParameters, self).__init__()
+        import yaml  # imported here with munch, so importing the simulation modules stays light
         with open(car_parameters_path, 'r') as file:
             param = yaml.safe_load(file)
 
@@ -30,28 +85,95 @@ class StaticParameters(object):
         self.powertrain.engine.maximum_rpm *= np.pi / 30
         self.powertrain.engine.idle_rpm *= np.pi / 30
 
-        self.wheel_base = self.body.lr + self.body.lf
-        self.track_width = self.body.wl + self.body.wr
-
-        wd1 = (self.body.lr / (self.wheel_base)) * (self.body.wr / self.track_width)
-        wd2 = (self.body.lf / (self.wheel_base)) * (self.body.wr / self.track_width)
-        wd3 = (self.body.lr / (self.wheel_base)) * (self.body.wl / self.track_width)
-        wd4 = (self.body.lf / (self.wheel_base)) * (self.body.wl / self.track_width)
-
-        self.wd = np.array([wd1, wd2, wd3, wd4])
         self.tire.dynamic_radius = np.array(self.tire.dynamic_radius)
-        self.sprung_mass = self.body.mass * self.wd - self.suspension.unsprung_mass
+        for name in DERIVED_FIELDS:
+            setattr(self, name, self.derived_value(name))
 
         self.time_step = 1. / freq
 
-        self.aerodynamics_front = self.aerodynamics.air_drag_coefficient * self.aerodynamics.front_area * self.aerodynamics.air_density 
-
         self.gravity = 9.81
 
         if not optimization:
             self._initialized = True
 
 
+    def derived_value(self, name):
+        """ value of one of the DERIVED_FIELDS from the current fields """
+        if name == "wheel_base":
+            return self.body.lr + self.body.lf
+        if name == "track_width":
+            return self.body.wl + self.body.wr
+        if name == "wd":
+            wd1 = (self.body.lr / (self.wheel_base)) * (self.body.wr / self.track_width)
+            wd2 = (self.body.lf / (self.wheel_base)) * (self.body.wr / self.track_width)
+            wd3 = (self.body.lr / (self.wheel_base)) * (self.body.wl / self.track_width)
+            wd4 = (self.body.lf / (self.wheel_base)) * (self.body.wl / self.track_width)
+            return np.array([wd1, wd2, wd3, wd4])
+        if name == "sprung_mass":
+            return self.body.mass * self.wd - self.suspension.unsprung_mass
+        if name == "aerodynamics_front":
+            return self.aerodynamics.air_drag_coefficient * self.aerodynamics.front_area * self.aerodynamics.air_density
+        raise ValueError(f"{name} is not a derived field")
+
+    @classmethod
+    def compile(cls, car_parameters_path, freq=1000):
+        """ immutable StaticParameters of the YAML, loaded once per file content and frequency """
+        with open(car_parameters_path, 'rb') as file:
+            key = (hashlib.sha256(file.read()).hexdigest(), float(freq))
+        if key not in _COMPILED:
+            _COMPILED[key] = cls(car_parameters_path, freq, optimization=True).frozen()
+        return _COMPILED[key]
+
+    def frozen(self):
+        """ immutable copy of this instance (itself if it already is) """
+        if self._frozen:
+            return self
+        frozen = object.__new__(type(self))
+        frozen.__dict__.update({name: _freeze(value) for name, value in self.__dict__.items() if not name.startswith("_")})
+        frozen.__dict__.update(_initialized=True, _frozen=True)
+        return frozen
+
+    def derive(self, overrides):
+        """
+            immutable StaticParameters with the fields in overrides replaced, sharing the unchanged ones
+
+            Required Arguments:
+                1. overrides: {path: value}, path as "body.mass", "powertrain.bias[2]" (one element)
+                   or "time_step", value in the units of the instance (rad/s for the engine speeds)
+        """
+        derived = object.__new__(type(self))
+        derived.__dict__.update(self.frozen().__dict__)
+        changed, copied = [], set()
+        for path, value in overrides.items():
+            match = _FIELD_PATH.match(path)
+            if match is None:
+                raise ValueError(f"{path} is not a field path")
+            field, index = match.group(1), tuple(int(i) for i in re.findall(r"\d+", match.group(2)))
+            *parents, key = field.split(".")
+            if field in DERIVED_FIELDS:
+                raise ValueError(f"{field} is derived, override the fields it is computed from: {DERIVED_FIELDS[field]}")
+            group = derived.__dict__
+            for parent in parents:
+                if not isinstance(group.get(parent), ParameterGroup):
+                    raise ValueError(f"{path} is not a field of the parameters")
+                # copy the groups on the path only (once), the other groups stay shared
+                if id(group[parent]) not in copied:
+                    dict.__setitem__(group, parent, ParameterGroup(group[parent]))
+                    copied.add(id(group[parent]))
+                group = group[parent]
+            if key not in group:
+                raise ValueError(f"{path} is not a field of the parameters")
+            if index:
+                array = np.array(group[key], dtype=np.result_type(group[key], value))
+                array[index] = value
+                value = array
+            dict.__setitem__(group, key, _freeze(value))
+            changed.append(field)
+        for name, inputs in DERIVED_FIELDS.items():
+            if any(path == field or path.startswith(field + ".") for path in inputs for field in changed):
+                derived.__dict__[name] = _freeze(derived.derived_value(name))
+        return derived
+
     def __setattr__(self, name, value):
         if self._initialized:
             raise AttributeError("We are not in the saving attributes phase of this code, Do Better")
@@ -59,6 +181,7 @@ class StaticParameters(object):
             object.__setattr__(self, name, value)
 
     def convert_YAML2Struct(self, yaml):
+        from munch import DefaultMunch
         data = DefaultMunch.fromDict(yaml)
         for name in dir(data):
             current_key = getattr(data, name)
@@ -66,6 +189,7 @@ class StaticParameters(object):
             setattr(self, name, getattr(data, name))
 
     def check_munch_key(self, current_key):
+        import munch
         for i in dir(current_key):
             if isinstance(getattr(current_key, i), list):
                 setattr(current_key, i, np.array(getattr(current_key, i)))
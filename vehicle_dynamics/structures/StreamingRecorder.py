@@ -0,0 +1,204 @@
+"""
+Vehicle Dynamic Model - StreamingRecorder Class
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from vehicle_dynamics.structures.CurrentStates import CurrentStates
+from vehicle_dynamics.structures.OutputRecorder import ChannelGroup, OutputRecorder
+
+import json
+import os
+import numpy as np
+
+STREAM_FORMAT = "vehicle_dynamics.stream"
+STREAM_VERSION = 1
+INDEX_FILE = "index.json"
+
+
+class StreamingRecorder(object):
+    """StreamingRecorder Class
+        recorder for runs too long to keep in memory: the CurrentStates buffer is copied into a
+        preallocated (chunk_size, L) array at every tick, as in OutputRecorder, and every full
+        chunk is written to directory as chunk_000000.npy, ... Each file holds the chunk
+        transposed, (L, ticks), so a channel is contiguous on disk. index.json lists the chunks
+        and the layout and is rewritten after every chunk, so an interrupted run stays readable
+        up to its last chunk. Memory use is one chunk whatever the length of the run.
+
+        Pass it as recorder to VehicleDynamics.simulate() and close() it (or use it as a context
+        manager) to write the last partial chunk; StreamReader(directory) reads the run back.
+
+        Required Arguments:
+            1. directory: created if missing, an existing recording in it is replaced
+            2. chunk_size: ticks per chunk
+    """
+
+    def __init__(self, directory, chunk_size=10000, layout=CurrentStates.LAYOUT):
+        super(StreamingRecorder, self).__init__()
+        if int(chunk_size) < 1:
+            raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+        self.directory = directory
+        self.chunk_size = int(chunk_size)
+        self._layout = layout.flat()
+        self._rows = np.zeros((self.chunk_size, layout.size))
+        self._fill = 0
+        self._length = 0
+        self._chunks = []
+        self.closed = False
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name == INDEX_FILE or (name.startswith("chunk_") and name.endswith(".npy")):
+                os.remove(os.path.join(directory, name))
+        self._write_index()
+
+    def __len__(self):
+        return self._length
+
+    def set_states(self, current_states):
+        self._rows[self._fill] = current_states.buffer
+        self._fill += 1
+        self._length += 1
+        if self._fill == self.chunk_size:
+            self.flush()
+
+    def padding(self, value):
+        """ repeats the last recorded tick value times, as OutputRecorder.padding """
+        last = self._rows[self._fill - 1].copy() if self._fill else np.load(self._chunk_path(len(self._chunks) - 1), mmap_mode="r")[:, -1].copy()
+        for _ in range(value):
+            self._rows[self._fill] = last
+            self._fill += 1
+            self._length += 1
+            if self._fill == self.chunk_size:
+                self.flush()
+
+    def _chunk_path(self, chunk):
+        return os.path.join(self.directory, f"chunk_{chunk:06d}.npy")
+
+    def flush(self):
+        """ writes the ticks buffered since the last chunk as a new chunk """
+        if self._fill == 0:
+            return
+        chunk = len(self._chunks)
+        np.save(self._chunk_path(chunk), np.ascontiguousarray(self._rows[:self._fill].T))
+        self._chunks.append({"file": os.path.basename(self._chunk_path(chunk)), "start": self._length - self._fill, "ticks": self._fill})
+        self._fill = 0
+        self._write_index()
+
+    def _write_index(self, complete=False):
+        index = {"format": STREAM_FORMAT, "version": STREAM_VERSION, "ticks": self._length - self._fill, "complete": complete,
+                 "size": self._rows.shape[1], "layout": {name: [offset, list(shape)] for name, (offset, shape) in self._layout.items()},
+                 "chunks": self._chunks}
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + ".tmp", "w") as file:
+            json.dump(index, file)
+        os.replace(path + ".tmp", path)
+
+    def close(self):
+        """ writes the last partial chunk and marks the recording complete """
+        if self.closed:
+            return
+        self.flush()
+        self._write_index(complete=True)
+        self.closed = True
+
+    def reader(self):
+        self.close()
+        return StreamReader(self.directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+class StreamReader(object):
+    """StreamReader Class
+        lazy reader of a StreamingRecorder directory with the interface of OutputRecorder
+        (reader.engine_w, reader.x_a.vx, reader.channel("x_rf.fx")): the chunks are memory
+        mapped and only the columns of the requested channel are read. rows(start, stop) reads a
+        range of ticks as (T, L) rows.
+    """
+
+    CHANNELS = OutputRecorder.CHANNELS
+    GROUPS = OutputRecorder.GROUPS
+    INTEGER_CHANNELS = OutputRecorder.INTEGER_CHANNELS
+
+    def __init__(self, directory):
+        super(StreamReader, self).__init__()
+        with open(os.path.join(directory, INDEX_FILE)) as file:
+            index = json.load(file)
+        if index.get("format") != STREAM_FORMAT or index.get("version") != STREAM_VERSION:
+            raise ValueError(f"{directory} is not a version {STREAM_VERSION} {STREAM_FORMAT} recording")
+        self.directory = directory
+        self.complete = index["complete"]
+        self._length = index["ticks"]
+        self._size = index["size"]
+        self._layout = {name: (offset, tuple(shape)) for name, (offset, shape) in index["layout"].items()}
+        self._chunks = index["chunks"]
+        self._maps = [None] * len(self._chunks)
+        self._groups = {group: ChannelGroup(self, {field: f"{group}.{field}" for field in fields})
+                        for group, fields in self.GROUPS.items()}
+
+    def __len__(self):
+        return self._length
+
+    def _chunk(self, chunk):
+        if self._maps[chunk] is None:
+            self._maps[chunk] = np.load(os.path.join(self.directory, self._chunks[chunk]["file"]), mmap_mode="r")
+        return self._maps[chunk]
+
+    def channel(self, path):
+        """ recorded values of a channel of the layout ("engine_w", "x_a.vx", "x_rf.fx") """
+        offset, shape = self._layout[path]
+        columns = int(np.prod(shape, dtype=int))
+        values = np.empty((columns, self._length))
+        for chunk, entry in enumerate(self._chunks):
+            values[:, entry["start"]:entry["start"] + entry["ticks"]] = self._chunk(chunk)[offset:offset + columns]
+        values = values.T.reshape((self._length,) + shape)
+        return values.astype(int) if path in self.INTEGER_CHANNELS else values
+
+    def rows(self, start=0, stop=None):
+        """ (T, L) rows of the ticks [start, stop) """
+        start, stop, _ = slice(start, stop).indices(self._length)
+        rows = np.empty((max(stop - start, 0), self._size))
+        for chunk, entry in enumerate(self._chunks):
+            first, last = max(start, entry["start"]), min(stop, entry["start"] + entry["ticks"])
+            if first < last:
+                rows[first - start:last - start] = self._chunk(chunk)[:, first - entry["start"]:last - entry["start"]].T
+        return rows
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in self._groups:
+            return self._groups[name]
+        if name in self._layout:
+            return self.channel(name)
+        raise AttributeError(name)
+
+
+def main():
+    import resource
+    import tempfile
+    from vehicle_dynamics.VehicleDynamics import VehicleDynamics
+    from vehicle_dynamics.structures.Manoeuvre import Manoeuvre
+    from vehicle_dynamics.structures.StateVector import StateVector
+
+    from vehicle_dynamics.utils.columnar_data import open_data
+
+    data = open_data("../../example_data/Braking.pickle")
+    manoeuvre = Manoeuvre(data["steering"], data["throttle"], data["brake"], data["time"])
+    initial_state = StateVector(x=data["Rel_pos_x"][0], y=data["Rel_pos_y"][0], vx=data["Velocity_X"][0], yaw=data["Yaw"][0])
+    vehicle_dynamics = VehicleDynamics(initial_state=initial_state, initial_gear=1, frequency=1000, car_parameters_path="../../bmw_m8.yaml")
+    directory = tempfile.mkdtemp()
+    with StreamingRecorder(directory, chunk_size=2000) as recorder:
+        vehicle_dynamics.simulate(manoeuvre, recorder=recorder)
+    reader = StreamReader(directory)
+    print(f"{len(reader)} ticks in {directory}, final vx {reader.x_a.vx[-1]:.3f} m/s, "
+          f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,12 @@
+from vehicle_dynamics.structures.StateLayout import BufferedStructure
 import numpy as np
 
 
-class StrutForce(object):
-    def __init__(self, f_za=np.zeros(4), f_za_dot=np.zeros(4), spring_force = np.zeros(4), dumper_force = np.zeros(4)):  # TODO calculate forces on the strut
+class StrutForce(BufferedStructure):
+    FIELDS = (("f_za", (4,)), ("f_za_dot", (4,)), ("spring_force", (4, 1)), ("dumper_force", (4, 1)))
+
+    def __init__(self, f_za=np.zeros(4), f_za_dot=np.zeros(4), spring_force = np.zeros((4, 1)), dumper_force = np.zeros((4, 1))):  # TODO calculate forces on the strut
+        super(StrutForce, self).__init__()
         self.f_za = f_za
         self.f_za_dot = f_za_dot
         self.dumper_force = dumper_force 
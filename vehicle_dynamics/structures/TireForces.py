@@ -1,8 +1,12 @@
+from vehicle_dynamics.structures.StateLayout import BufferedStructure
 import numpy as np
 
 
-class TireForces(object):
+class TireForces(BufferedStructure):
+    FIELDS = (("fx", (4,)), ("fy", (4,)), ("wheel_forces_transformed_force2vehicle_sys", (3, 4)))
+
     def __init__(self, fx =np.zeros(4), fy =np.zeros(4), wheel_forces_transformed_force2vehicle_sys = np.zeros((3, 4), dtype=float)):        
+        super(TireForces, self).__init__()
         # Dynamic forces on the tires
         # pag 272 eq.54
         self.fx = fx
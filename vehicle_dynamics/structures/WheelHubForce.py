@@ -1,8 +1,12 @@
+from vehicle_dynamics.structures.StateLayout import BufferedStructure
 import numpy as np
 
 
-class WheelHubForce(object):
+class WheelHubForce(BufferedStructure):
+    FIELDS = (("f_zr_dot", (4,)), ("wheel_load_z", (4,)))
+
     def __init__(self, f_zr_dot=np.zeros(4), wheel_load_z =np.array([2000., 3000., 2000., 3000.])):
+        super(WheelHubForce, self).__init__()
         self.f_zr_dot = f_zr_dot
         self.wheel_load_z = wheel_load_z
 
@@ -1 +1 @@
-__all__ = ["AngularWheelPosition", "Displacement", "StateVector", "StrutForce", "TireForces", "WheelHubForce","CurrentStates","OutputStates"]
+__all__ = ["AngularWheelPosition", "Displacement", "StateVector", "StrutForce", "TireForces", "WheelHubForce","CurrentStates","OutputStates","OutputRecorder","StreamingRecorder","BatchCurrentStates","BatchStaticParameters","StateLayout"]
@@ -0,0 +1,173 @@
+"""
+Vehicle Dynamic Model - LookupTable
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+import numpy as np
+
+
+class LookupTable(object):
+    """
+    Piecewise linear lookup table with O(1) evaluation, replacing scipy interp1d(kind="linear").
+
+    The breakpoints are indexed once on a uniform grid of bins narrower than the shortest
+    segment; every bin stores the segment of its left edge. Evaluating x is then one index
+    computation, a table read and at most one comparison with each neighbouring breakpoint.
+    The interpolation uses the same segment choice and arithmetic as interp1d (which delegates
+    to numpy.interp for 1D tables), so the results match interp1d exactly (tolerance 0, bit for bit).
+
+    x and y can be 1D, a single table, or 2D (N, K), one table per batch member: then
+    table(x) evaluates x[i] in row i. Rows of different length must be padded beforehand
+    by repeating the last entry.
+
+    Required Arguments:
+        1. x: increasing breakpoints
+        2. y: values at the breakpoints
+        3. bounds_error: raise a ValueError, as interp1d, when x is outside the table;
+           otherwise values outside are extrapolated from the first/last segment and
+           out_of_range(x) tells which ones they were
+        4. oversampling: bins per shortest segment
+    """
+
+    def __init__(self, x, y, bounds_error=True, oversampling=2):
+        super(LookupTable, self).__init__()
+        x = np.array(x, dtype=float)
+        y = np.array(y, dtype=float)
+        if x.shape != y.shape or x.shape[-1] < 2:
+            raise ValueError(f"x and y must have the same shape with at least 2 points, got {x.shape} and {y.shape}")
+
+        self.batched = x.ndim == 2
+        self.x = np.atleast_2d(x)
+        self.y = np.atleast_2d(y)
+        self.bounds_error = bounds_error
+        self.oversampling = oversampling
+
+        widths = np.diff(self.x, axis=1)
+        if (widths < 0).any():
+            raise ValueError("x must be increasing")
+        span = self.x[:, -1] - self.x[:, 0]
+        shortest = np.array([row[row > 0].min() if (row > 0).any() else 1. for row in widths])
+        bins = np.maximum(np.ceil(oversampling * span / shortest).astype(int), 1)
+
+        self.x0 = self.x[:, 0].copy()
+        self.inv_width = np.where(span > 0, bins / np.where(span > 0, span, 1.), 0.)
+        self.last_bin = bins - 1
+        self.last_segment = self.x.shape[1] - 2
+
+        # segment of the left edge of every bin: the last breakpoint at or below the edge
+        self.segments = np.zeros((len(self.x), bins.max()), dtype=np.intp)
+        for row in range(len(self.x)):
+            edges = self.x0[row] + np.arange(bins[row]) * (span[row] / bins[row])
+            self.segments[row, :bins[row]] = np.clip(np.searchsorted(self.x[row], edges, side="right") - 1, 0, self.last_segment)
+
+        # precomputed slopes in the interp1d order of operations, padding segments have no width
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.slopes = (self.y[:, 1:] - self.y[:, :-1]) / (self.x[:, 1:] - self.x[:, :-1])
+
+        # plain float copies for the scalar path
+        self._x = self.x[0].tolist()
+        self._y = self.y[0].tolist()
+        self._slopes = self.slopes[0].tolist()
+        self._segments = self.segments[0].tolist()
+        self._x0 = float(self.x0[0])
+        self._inv_width = float(self.inv_width[0])
+        self._last_bin = int(self.last_bin[0])
+
+    def __len__(self):
+        return len(self.x)
+
+    def __call__(self, x):
+        if not self.batched and isinstance(x, (float, int)):
+            return self._scalar(x)
+        return self._vector(np.asarray(x, dtype=float))
+
+    def _scalar(self, x):
+        table_x = self._x
+        if x != x:
+            return float("nan")
+        if x < table_x[0] or x > table_x[-1]:
+            if self.bounds_error:
+                self._raise(x)
+        position = int((x - self._x0) * self._inv_width)
+        position = 0 if position < 0 else self._last_bin if position > self._last_bin else position
+        segment = self._segments[position]
+        while segment < self.last_segment and x >= table_x[segment + 1]:
+            segment += 1
+        while segment > 0 and x < table_x[segment]:
+            segment -= 1
+        if x == table_x[segment]:
+            return self._y[segment]
+        if x == table_x[segment + 1]:
+            return self._y[segment + 1]
+        return self._slopes[segment] * (x - table_x[segment]) + self._y[segment]
+
+    def _vector(self, x):
+        if self.batched:
+            if x.shape != self.x0.shape:
+                raise ValueError(f"expected one value per table, shape {self.x0.shape}, got {x.shape}")
+            rows = np.arange(len(x))
+        else:
+            rows = np.zeros(x.shape, dtype=np.intp)
+        x0 = self.x0[rows]
+        if self.bounds_error:
+            out = self.out_of_range(x)
+            if out.any():
+                self._raise(x[out].flat[0])
+
+        with np.errstate(invalid="ignore"):
+            position = np.nan_to_num((x - x0) * self.inv_width[rows]).astype(np.intp)
+        position = np.clip(position, 0, self.last_bin[rows])
+        segment = self.segments[rows, position]
+        while True:
+            move = (segment < self.last_segment) & (x >= self.x[rows, segment + 1])
+            if not move.any():
+                break
+            segment = segment + move
+        while True:
+            move = (segment > 0) & (x < self.x[rows, segment])
+            if not move.any():
+                break
+            segment = segment - move
+        x_lo = self.x[rows, segment]
+        y_lo = self.y[rows, segment]
+        with np.errstate(invalid="ignore"):
+            values = self.slopes[rows, segment] * (x - x_lo) + y_lo
+        values = np.where(x == x_lo, y_lo, values)
+        return np.where(x == self.x[rows, segment + 1], self.y[rows, segment + 1], values)
+
+    def out_of_range(self, x):
+        """ mask of the values outside of the table, where interp1d raises a ValueError """
+        x = np.asarray(x, dtype=float)
+        rows = np.arange(len(x)) if self.batched else 0
+        return (x < self.x[rows, 0]) | (x > self.x[rows, -1])
+
+    def take(self, index):
+        """ returns a LookupTable holding only the rows (batch members) in index """
+        subset = object.__new__(LookupTable)
+        subset.__dict__.update(self.__dict__)
+        for name in ("x", "y", "x0", "inv_width", "last_bin", "segments", "slopes"):
+            setattr(subset, name, getattr(self, name)[index])
+        return subset
+
+    def _raise(self, x):
+        if x < self.x.min():
+            raise ValueError(f"A value ({x}) in x_new is below the interpolation range's minimum value ({self.x[0, 0]}).")
+        raise ValueError(f"A value ({x}) in x_new is above the interpolation range's maximum value ({self.x[0, -1]}).")
+
+
+def main():
+    from scipy.interpolate import interp1d
+    x = np.array([600.0, 1821, 5837, 6835, 7324]) * np.pi / 30
+    y = np.array([290, 750, 750, 640, 516])
+    table = LookupTable(x, y)
+    reference = interp1d(x, y)
+    samples = np.concatenate([x, np.linspace(x[0], x[-1], 100001)])
+    error = np.abs(table(samples) - reference(samples)).max()
+    scalar_error = max(abs(table(float(value)) - float(reference(value))) for value in samples[::97])
+    print(f"maximum deviation from interp1d: vector {error}, scalar {scalar_error}")
+
+
+if __name__ == '__main__':
+    main()
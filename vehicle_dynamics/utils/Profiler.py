@@ -0,0 +1,75 @@
+"""
+Vehicle Dynamic Model - Profiler
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from array import array
+import json
+import time
+
+import numpy as np
+
+
+class Profiler(object):
+    """
+    Per-stage timing of the simulation loop.
+
+    wrap(stage, function) returns function timed with time.perf_counter; the duration of every
+    call is appended to the samples of the stage, so besides the total time and call count the
+    summary has the p50/p99/max latency of each stage. The samples are kept as 8 byte doubles
+    (8 MB per stage for a million ticks); reset() drops them.
+
+    VehicleDynamics.enable_profiling() wraps tick, the powertrain, wheels and body calls (or
+    integrate) and the recorder; nothing is wrapped, so nothing is paid, while it is disabled.
+    """
+
+    def __init__(self):
+        super(Profiler, self).__init__()
+        self.samples = {}
+
+    def wrap(self, stage, function):
+        samples = self.samples.setdefault(stage, array('d'))
+        append = samples.append
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            result = function(*args, **kwargs)
+            append(perf_counter() - start)
+            return result
+        timed.__wrapped__ = function
+        return timed
+
+    def reset(self):
+        for samples in self.samples.values():
+            del samples[:]
+
+    def summary(self, reference="tick"):
+        """ {stage: {calls, total_s, mean_us, p50_us, p99_us, max_us, share}}, share being the fraction of the reference stage time """
+        reference_total = sum(self.samples.get(reference, ())) or None
+        summary = {}
+        for stage, samples in self.samples.items():
+            values = np.frombuffer(samples, dtype=float) if len(samples) else np.zeros(1)
+            total = float(values.sum())
+            summary[stage] = {"calls": len(samples), "total_s": total, "mean_us": 1e6 * total / max(len(samples), 1),
+                              "p50_us": 1e6 * float(np.percentile(values, 50)), "p99_us": 1e6 * float(np.percentile(values, 99)),
+                              "max_us": 1e6 * float(values.max()), "share": None if reference_total is None else total / reference_total}
+        return summary
+
+    def table(self, reference="tick"):
+        lines = [f"{'stage':12s} {'calls':>9s} {'total s':>9s} {'mean us':>9s} {'p50 us':>9s} {'p99 us':>9s} {'max us':>9s} {'share':>6s}"]
+        for stage, row in self.summary(reference).items():
+            share = "" if row["share"] is None else f"{100 * row['share']:5.1f}%"
+            lines.append(f"{stage:12s} {row['calls']:9d} {row['total_s']:9.3f} {row['mean_us']:9.1f} {row['p50_us']:9.1f} "
+                         f"{row['p99_us']:9.1f} {row['max_us']:9.1f} {share:>6s}")
+        return "\n".join(lines)
+
+    def to_json(self, path=None, reference="tick"):
+        """ summary as a JSON string, also written to path if given """
+        text = json.dumps(self.summary(reference), indent=2)
+        if path is not None:
+            with open(path, "w") as file:
+                file.write(text)
+        return text
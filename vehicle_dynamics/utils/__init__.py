@@ -1 +1 @@
-__all__ = ["plot_function"]
+__all__ = ["plot_function", "LookupTable", "Profiler"]
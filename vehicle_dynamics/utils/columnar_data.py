@@ -0,0 +1,145 @@
+"""
+Vehicle Dynamic Model - Columnar Data
+
+@author:   Maikol Funk Drechsler, Yuri Poledna
+
+Recordings (Braking.pickle, CarMaker and REHEARSE exports) stored as one .npy file per channel
+and a manifest.json, opened memory mapped: only the channels used are read, without copying,
+and opening a recording never unpickles anything. Pickles are converted once with convert_data.
+
+Funded by the European Union (grant no. 101069576). Views and opinions expressed are however those of the author(s) only and do not necessarily reflect those of the European Union or the European Climate, Infrastructure and Environment Executive Agency (CINEA). Neither the European Union nor the granting authority can be held responsible for them.
+"""
+from collections.abc import Mapping
+import json
+import os
+import re
+
+import numpy as np
+
+COLUMNAR_FORMAT = "vehicle_dynamics.columnar"
+COLUMNAR_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _attribute(name, values):
+    """ a value that is not an array of numbers as the JSON value of an attribute """
+    try:
+        return json.loads(json.dumps(values, default=_json_default))
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"channel {name} can be stored neither as numbers nor as JSON: {error}") from error
+
+
+def convert_data(data, directory):
+    """
+        writes a recording as a columnar directory, returns it opened as ColumnarData
+
+        Required Arguments:
+            1. data: dict of channel name -> array or list of numbers, or the path of a pickle
+               of one, which is loaded here: only convert pickles from a trusted source. The
+               other values (strings, numbers, None, string arrays, nested dicts and lists) are
+               kept in the manifest as JSON attributes
+            2. directory: created if missing
+    """
+    if isinstance(data, (str, os.PathLike)):
+        import pickle
+        with open(data, "rb") as handle:
+            data = pickle.load(handle)
+    os.makedirs(directory, exist_ok=True)
+    channels, attributes, files = {}, {}, set()
+    for name, values in data.items():
+        if values is None or isinstance(values, (str, bool, int, float)):
+            attributes[name] = values
+            continue
+        try:
+            array = np.asarray(values)
+        except ValueError:
+            # ragged nested lists
+            array = None
+        if array is None or array.dtype.kind not in "biuf":
+            attributes[name] = _attribute(name, values)
+            continue
+        values = array
+        file = re.sub(r"[^\w.-]", "_", str(name)) + ".npy"
+        while file in files:
+            file = "_" + file
+        files.add(file)
+        np.save(os.path.join(directory, file), values, allow_pickle=False)
+        channels[name] = {"file": file, "dtype": values.dtype.str, "shape": list(values.shape)}
+    with open(os.path.join(directory, MANIFEST_FILE), "w") as file:
+        json.dump({"format": COLUMNAR_FORMAT, "version": COLUMNAR_VERSION, "channels": channels, "attributes": attributes}, file, indent=1)
+    return ColumnarData(directory)
+
+
+class ColumnarData(Mapping):
+    """
+        Read-only dict-like view of a columnar recording: data["steering"] memory maps the file
+        of the channel on first access (mode "r", so it cannot be modified by accident) and
+        keeps it open; keys() lists the channels and the attributes.
+
+        Required Arguments:
+            1. directory: written by convert_data
+    """
+
+    def __init__(self, directory):
+        super(ColumnarData, self).__init__()
+        with open(os.path.join(directory, MANIFEST_FILE)) as file:
+            manifest = json.load(file)
+        if manifest.get("format") != COLUMNAR_FORMAT or manifest.get("version") != COLUMNAR_VERSION:
+            raise ValueError(f"{directory} is not a version {COLUMNAR_VERSION} {COLUMNAR_FORMAT} directory")
+        self.directory = directory
+        self.channels = manifest["channels"]
+        self.attributes = manifest["attributes"]
+        self._maps = {}
+
+    def __getitem__(self, name):
+        if name in self.attributes:
+            return self.attributes[name]
+        if name not in self._maps:
+            if name not in self.channels:
+                raise KeyError(name)
+            self._maps[name] = np.load(os.path.join(self.directory, self.channels[name]["file"]), mmap_mode="r", allow_pickle=False)
+        return self._maps[name]
+
+    def __iter__(self):
+        yield from self.channels
+        yield from self.attributes
+
+    def __len__(self):
+        return len(self.channels) + len(self.attributes)
+
+
+def open_data(path):
+    """
+        opens a recording lazily: a columnar directory as it is, a pickle (trusted, e.g. the
+        bundled Braking.pickle) through the columnar directory next to it ("Braking.pickle" ->
+        "Braking"), converted on first use and again whenever the pickle is newer
+    """
+    if os.path.isdir(path):
+        return ColumnarData(path)
+    directory = os.path.splitext(path)[0]
+    manifest = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(manifest) or os.path.getmtime(manifest) < os.path.getmtime(path):
+        return convert_data(path, directory)
+    return ColumnarData(directory)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="converts a pickled recording to the columnar format")
+    parser.add_argument("pickle", nargs="?", default="../../example_data/Braking.pickle")
+    parser.add_argument("directory", nargs="?", help="defaults to the pickle path without extension")
+    arguments = parser.parse_args()
+    data = convert_data(arguments.pickle, arguments.directory or os.path.splitext(arguments.pickle)[0])
+    print(f"{len(data.channels)} channels and {len(data.attributes)} attributes written to {data.directory}")
+
+
+if __name__ == '__main__':
+    main()
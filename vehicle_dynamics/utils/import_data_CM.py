@@ -7,10 +7,11 @@ Created on Fri Jul  7 11:34:11 2023
 
 
 def import_data_CM(path):
-    import pickle 
+    """ unpickled recording at path, a mutable dict; columnar_data.open_data opens it lazily and read-only instead """
+    import pickle
     with open(path, "rb") as handle:
         data = pickle.load(handle)
-        return data 
+        return data
 
 
 def main():